@@ -0,0 +1,322 @@
+"""
+Micro and macro benchmarks for the RefAgent pipeline.
+
+Benchmarks (all offline - a stub LLM and a stub Maven build are used):
+- detect:   Detector.detect_god_classes on a synthetic project
+- graph:    JavaClassDependencyAnalyzer.analyze_project for one god class
+- prompt:   planner + generator prompt construction through the agents
+- loop:     end-to-end refactor_god_class loop for every detected god class
+
+Each run is appended to `benchmarks/results/results.jsonl` together with the
+git revision, so throughput can be compared across versions.
+
+Usage:
+    python benchmarks/run_benchmarks.py --size small
+    python benchmarks/run_benchmarks.py --size medium --only detect graph --compare
+"""
+import sys
+import os
+
+# Add repository root to path so `refAgent`, `settings` and `utilities` import
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+import json
+import platform
+import re
+import statistics
+import subprocess
+import tempfile
+import time
+from contextlib import contextmanager
+
+from synthetic_corpus import generate_project
+
+SIZES = {
+    "small": {"classes": 60, "methods": 8, "coupling": 0.05, "god_classes": 2},
+    "medium": {"classes": 300, "methods": 12, "coupling": 0.03, "god_classes": 4},
+    "large": {"classes": 1500, "methods": 15, "coupling": 0.01, "god_classes": 8},
+}
+
+RESULTS_PATH = os.path.join(ROOT_DIR, "benchmarks", "results", "results.jsonl")
+
+
+# ----------------------------------------------------------------------
+# Stubs
+# ----------------------------------------------------------------------
+def make_stub_llm_class(latency=0.0):
+    """Build a BaseLLM subclass that answers like the real agents expect, offline."""
+    from refAgent.BaseLLM import BaseLLM
+
+    class StubLLM(BaseLLM):
+        provider = "stub"
+        default_model = "stub"
+
+        def query_llm(self, prompt, query, model=None, max_tokens=4096, **kwargs):
+            return super().query_llm(prompt, query, model=model, max_tokens=max_tokens, **kwargs)
+
+        def _complete(self, messages, model, max_tokens):
+            if latency:
+                time.sleep(latency)
+            last = messages[-1]["content"]
+            if "need improvement" in last:
+                reply = "True"
+            elif "refactoring the Java class:" in last:
+                match = re.search(r"refactoring the Java class:\n(.*)\n\nReturn ONLY", last, re.S)
+                reply = f"```java\n{match.group(1) if match else ''}\n```"
+            else:
+                reply = '{"compute0": "(yes, extract helper method)"}'
+            prompt_tokens = sum(len(m["content"]) for m in messages) // 4
+            return reply, {"prompt_tokens": prompt_tokens, "completion_tokens": len(reply) // 4}
+
+    return StubLLM
+
+
+@contextmanager
+def stubbed_pipeline(llm_latency=0.0, build_latency=0.0):
+    """Replace provider clients and Maven calls with in-process stubs."""
+    import refAgent.agents as agents
+    import refAgent.RefAgent_main as main
+    from refAgent.maven import MavenResult
+
+    stub_llm = make_stub_llm_class(llm_latency)
+
+    def stub_compile(project_dir='.', *args, **kwargs):
+        if build_latency:
+            time.sleep(build_latency)
+        return True, " "
+
+    def stub_test(class_name, method_name=None, project_dir='.', verify=False, *args, **kwargs):
+        if build_latency:
+            time.sleep(build_latency)
+        return subprocess.CompletedProcess(f"mvn -Dtest={class_name} test", 0, "", "")
+
+    def stub_tests(class_names, project_dir='.', *args, **kwargs):
+        if build_latency:
+            time.sleep(build_latency)
+        return MavenResult(["mvn", f"-Dtest={','.join(class_names)}", "test"], 0, "", "")
+
+    saved = {
+        (agents, "GroqLLM"): agents.GroqLLM,
+        (agents, "OpenAILLM"): agents.OpenAILLM,
+        (agents, "compile_project_with_maven"): agents.compile_project_with_maven,
+        (agents, "run_maven_test"): agents.run_maven_test,
+        (agents, "run_maven_tests"): agents.run_maven_tests,
+        (main, "commit_file_to_github"): main.commit_file_to_github,
+    }
+    agents.GroqLLM = stub_llm
+    agents.OpenAILLM = stub_llm
+    agents.compile_project_with_maven = stub_compile
+    agents.run_maven_test = stub_test
+    agents.run_maven_tests = stub_tests
+    main.commit_file_to_github = lambda *args, **kwargs: None
+    try:
+        yield
+    finally:
+        for (module, name), value in saved.items():
+            setattr(module, name, value)
+
+
+# ----------------------------------------------------------------------
+# Benchmarks
+# ----------------------------------------------------------------------
+def timed(fn, repeat):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - started)
+    return samples, result
+
+
+def summarize(samples, units=None):
+    summary = {
+        "repeat": len(samples),
+        "min_s": round(min(samples), 6),
+        "median_s": round(statistics.median(samples), 6),
+        "mean_s": round(statistics.mean(samples), 6),
+    }
+    if units:
+        summary["units"] = units
+        summary["throughput_per_s"] = round(units / statistics.median(samples), 3) if statistics.median(samples) else None
+    return summary
+
+
+def bench_detect(project_dir, info, config, repeat):
+    from refAgent.detector import Detector
+
+    detector = Detector(config)
+    samples, found = timed(lambda: detector.detect_god_classes(project_dir, top_n=len(info["god_classes"])), repeat)
+    result = summarize(samples, units=info["files"])
+    result["found_god_classes"] = sorted(found or []) == sorted(info["god_classes"])
+    return result
+
+
+def bench_graph(project_dir, info, config, repeat):
+    from refAgent.dependency_graph import JavaClassDependencyAnalyzer
+
+    target = info["god_classes"][0]
+
+    def run():
+        analyzer = JavaClassDependencyAnalyzer(target)
+        analyzer.analyze_project(project_dir)
+        return analyzer
+
+    samples, analyzer = timed(run, repeat)
+    result = summarize(samples, units=info["files"])
+    result["edges"] = analyzer.dependencies.number_of_edges()
+    return result
+
+
+def bench_prompt(project_dir, info, config, repeat):
+    from refAgent.agents import PlannerAgent, RefactoringGeneratorAgent
+    from utilities import parse_java_code
+    from refAgent.detector import Detector
+
+    target_file = Detector(config).find_file_for_class(project_dir, info["god_classes"][0])
+    code = parse_java_code(target_file)
+
+    def run():
+        with stubbed_pipeline():
+            planner = PlannerAgent("stub", model="stub", provider="groq")
+            generator = RefactoringGeneratorAgent("stub", model="stub", provider="groq")
+            plan = planner.analyze_methods(code, "WMC: 100")
+            for _ in range(5):
+                generator.run(f"Plan: {plan}\n\nTask: Apply the plan by refactoring the Java class:\n{code}\n\nReturn ONLY the code.")
+
+    samples, _ = timed(run, repeat)
+    return summarize(samples, units=6)
+
+
+def bench_loop(project_dir, info, config, repeat, llm_latency=0.0, build_latency=0.0):
+    import refAgent.RefAgent_main as main
+    from refAgent.maven import MavenResult
+    from refAgent.detector import Detector
+
+    project_name = os.path.basename(project_dir)
+
+    def run():
+        with stubbed_pipeline(llm_latency, build_latency):
+            main.process_god_classes(project_name, Detector(config), config)
+
+    # the pipeline uses paths relative to the working directory
+    samples, _ = timed(run, repeat)
+    return summarize(samples, units=len(info["god_classes"]))
+
+
+BENCHMARKS = {
+    "detect": bench_detect,
+    "graph": bench_graph,
+    "prompt": bench_prompt,
+    "loop": bench_loop,
+}
+
+
+# ----------------------------------------------------------------------
+# Results
+# ----------------------------------------------------------------------
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def load_previous(size):
+    if not os.path.exists(RESULTS_PATH):
+        return None
+    previous = None
+    with open(RESULTS_PATH, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                entry = json.loads(line)
+                if entry.get("size") == size:
+                    previous = entry
+    return previous
+
+
+def compare(current, previous):
+    print(f"\nComparison against {previous.get('revision')} ({previous.get('timestamp')}):")
+    for name, result in current["benchmarks"].items():
+        before = previous["benchmarks"].get(name)
+        if not before:
+            continue
+        ratio = result["median_s"] / before["median_s"] if before["median_s"] else float("inf")
+        print(f"  {name:<8} median {before['median_s']:.4f}s -> {result['median_s']:.4f}s  ({ratio:.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run RefAgent benchmarks")
+    parser.add_argument("--size", choices=sorted(SIZES), default="small")
+    parser.add_argument("--only", nargs="*", choices=sorted(BENCHMARKS), default=None)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Seconds each stub LLM call sleeps (loop benchmark)")
+    parser.add_argument("--build-latency", type=float, default=0.0, help="Seconds each stub compile/test sleeps (loop benchmark)")
+    parser.add_argument("--compare", action="store_true", help="Compare with the last stored run of the same size")
+    parser.add_argument("--no-save", action="store_true", help="Do not append results to the results file")
+    args = parser.parse_args()
+
+    # repeated loop runs must reach the stub LLM, not the on-disk response cache
+    os.environ["LLM_CACHE_ENABLED"] = "false"
+    # the 'stub' model has no context limit; real models are budgeted as configured
+    os.environ["DEFAULT_CONTEXT_WINDOW"] = "1000000"
+    # the stub answers instantly; provider rate limits would only measure throttling
+    os.environ["LLM_RATE_LIMITS"] = "{}"
+    # the stub build has no JaCoCo; tests are selected by name
+    os.environ["COVERAGE_SELECTION_ENABLED"] = "false"
+    # stub test runs always pass, so there is no baseline to measure
+    os.environ["TEST_HEALTH_ENABLED"] = "false"
+    from settings import Settings
+
+    previous = load_previous(args.size) if args.compare else None
+    size = SIZES[args.size]
+
+    # keep benchmark runs self-contained: no tracing, cassettes or persisted build times
+    config = Settings(DETECTOR_TOOL="heuristic", DETECTOR_TOP_N=size["god_classes"], TRACE_ENABLED=False,
+                      CASSETTE_MODE="off", BUDGET_BUILD_TIMES_PATH="", LLM_PROVIDER="groq")
+    from refAgent.tracing import tracer
+    tracer.enabled = False
+    names = args.only or list(BENCHMARKS)
+
+    original_cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="refagent-bench-") as workdir:
+        project_dir = os.path.join("projects", "before", f"synth-{args.size}")
+        os.chdir(workdir)
+        try:
+            info = generate_project(project_dir, **size)
+            results = {}
+            for name in names:
+                print(f"Running benchmark '{name}' ({args.size})...")
+                if name == "loop":
+                    results[name] = bench_loop(project_dir, info, config, args.repeat, args.llm_latency, args.build_latency)
+                else:
+                    results[name] = BENCHMARKS[name](project_dir, info, config, args.repeat)
+        finally:
+            os.chdir(original_cwd)
+
+    current = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "size": args.size,
+        "corpus": size,
+        "benchmarks": results,
+    }
+    print(json.dumps(current, indent=4))
+
+    if previous:
+        compare(current, previous)
+
+    if not args.no_save:
+        os.makedirs(os.path.dirname(RESULTS_PATH), exist_ok=True)
+        with open(RESULTS_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(current) + "\n")
+        print(f"Results appended to {RESULTS_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Synthetic Maven project generator for RefAgent benchmarks.
+
+Generates a compilable-looking Maven layout (`pom.xml`, `src/main/java`,
+`src/test/java`) with a configurable number of classes, methods per class,
+cross-package coupling density and a number of oversized "god" classes.
+
+Usage:
+    python benchmarks/synthetic_corpus.py out/synth --classes 200 --methods 12 --coupling 0.05 --god-classes 3
+"""
+import argparse
+import os
+import random
+
+POM_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<project xmlns="http://maven.apache.org/POM/4.0.0"
+         xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"
+         xsi:schemaLocation="http://maven.apache.org/POM/4.0.0 http://maven.apache.org/xsd/maven-4.0.0.xsd">
+  <modelVersion>4.0.0</modelVersion>
+  <groupId>com.synth</groupId>
+  <artifactId>{artifact}</artifactId>
+  <version>1.0-SNAPSHOT</version>
+  <properties>
+    <maven.compiler.source>1.8</maven.compiler.source>
+    <maven.compiler.target>1.8</maven.compiler.target>
+  </properties>
+  <dependencies>
+    <dependency>
+      <groupId>junit</groupId>
+      <artifactId>junit</artifactId>
+      <version>4.13.2</version>
+      <scope>test</scope>
+    </dependency>
+  </dependencies>
+</project>
+"""
+
+
+def _class_name(index):
+    return f"Synth{index:05d}"
+
+
+def _package(index, packages):
+    return f"com.synth.p{index % packages}"
+
+
+def _method(name, field, callee=None):
+    call = f"\n        total += {callee}.helper{name[-1]}(value);" if callee else ""
+    return (
+        f"    public int {name}(int value) {{\n"
+        f"        int total = this.{field};\n"
+        f"        for (int i = 0; i < value; i++) {{\n"
+        f"            if (i % 3 == 0) {{\n"
+        f"                total += i;\n"
+        f"            }} else {{\n"
+        f"                total -= 1;\n"
+        f"            }}\n"
+        f"        }}{call}\n"
+        f"        return total;\n"
+        f"    }}\n"
+    )
+
+
+def generate_class(index, n_classes, methods, coupling, packages, rng, god=False):
+    """Return (package, class name, source) for one synthetic class."""
+    name = _class_name(index)
+    package = _package(index, packages)
+    if god:
+        methods *= 8
+
+    # classes referenced from this one, chosen with probability `coupling`
+    callees = [j for j in range(n_classes) if j != index and rng.random() < coupling]
+    imports = sorted({f"import {_package(j, packages)}.{_class_name(j)};" for j in callees if _package(j, packages) != package})
+
+    fields = max(2, methods // 2)
+    lines = [f"package {package};", ""]
+    lines.extend(imports)
+    if imports:
+        lines.append("")
+    lines.append(f"public class {name} {{")
+    for f in range(fields):
+        lines.append(f"    private int field{f};")
+    lines.append("")
+    for d in range(10):
+        lines.append(f"    public static int helper{d}(int value) {{\n        return value * {d + 1};\n    }}\n")
+    for m in range(methods):
+        callee = _class_name(callees[m % len(callees)]) if callees else None
+        lines.append(_method(f"compute{m}", f"field{m % fields}", callee))
+    lines.append("}")
+    return package, name, "\n".join(lines) + "\n"
+
+
+def generate_test(package, name, methods):
+    lines = [
+        f"package {package};",
+        "",
+        "import org.junit.Test;",
+        "import static org.junit.Assert.assertTrue;",
+        "",
+        f"public class {name}Test {{",
+    ]
+    for m in range(min(methods, 5)):
+        lines.append(
+            f"    @Test\n    public void testCompute{m}() {{\n"
+            f"        assertTrue(new {name}().compute{m}(3) > -100);\n    }}\n"
+        )
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def generate_project(root, classes=100, methods=10, coupling=0.05, god_classes=2, packages=8, test_ratio=0.3, seed=42):
+    """Write a synthetic Maven project under `root`.
+
+    Args:
+        root: Output directory (the project root; created if missing).
+        classes: Number of production classes.
+        methods: Methods per regular class (god classes get 8x as many).
+        coupling: Probability that a class references any other given class.
+        god_classes: Number of oversized classes, placed at the first indices.
+        packages: Number of packages classes are spread over.
+        test_ratio: Fraction of classes that get a JUnit test class.
+        seed: Random seed, so the same arguments always give the same project.
+
+    Returns:
+        dict describing the generated project (class names, god classes, file count).
+    """
+    rng = random.Random(seed)
+    main_root = os.path.join(root, "src", "main", "java")
+    test_root = os.path.join(root, "src", "test", "java")
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, "pom.xml"), "w", encoding="utf-8") as f:
+        f.write(POM_TEMPLATE.format(artifact=os.path.basename(os.path.abspath(root))))
+
+    names = []
+    gods = []
+    files = 0
+    for index in range(classes):
+        god = index < god_classes
+        package, name, source = generate_class(index, classes, methods, coupling, packages, rng, god=god)
+        package_dir = package.replace(".", os.sep)
+        os.makedirs(os.path.join(main_root, package_dir), exist_ok=True)
+        with open(os.path.join(main_root, package_dir, f"{name}.java"), "w", encoding="utf-8") as f:
+            f.write(source)
+        files += 1
+        names.append(name)
+        if god:
+            gods.append(name)
+
+        if god or rng.random() < test_ratio:
+            os.makedirs(os.path.join(test_root, package_dir), exist_ok=True)
+            with open(os.path.join(test_root, package_dir, f"{name}Test.java"), "w", encoding="utf-8") as f:
+                f.write(generate_test(package, name, methods))
+            files += 1
+
+    return {"root": root, "classes": names, "god_classes": gods, "files": files}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic Maven project")
+    parser.add_argument("root", help="Output project directory")
+    parser.add_argument("--classes", type=int, default=100)
+    parser.add_argument("--methods", type=int, default=10)
+    parser.add_argument("--coupling", type=float, default=0.05)
+    parser.add_argument("--god-classes", type=int, default=2)
+    parser.add_argument("--packages", type=int, default=8)
+    parser.add_argument("--test-ratio", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    info = generate_project(args.root, args.classes, args.methods, args.coupling, args.god_classes,
+                            args.packages, args.test_ratio, args.seed)
+    print(f"Generated {info['files']} files in {info['root']} (god classes: {', '.join(info['god_classes'])})")
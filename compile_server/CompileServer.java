@@ -0,0 +1,219 @@
+import javax.tools.Diagnostic;
+import javax.tools.DiagnosticCollector;
+import javax.tools.JavaCompiler;
+import javax.tools.JavaFileObject;
+import javax.tools.StandardJavaFileManager;
+import javax.tools.StandardLocation;
+import javax.tools.ToolProvider;
+import java.io.BufferedReader;
+import java.io.BufferedWriter;
+import java.io.File;
+import java.io.IOException;
+import java.io.InputStreamReader;
+import java.io.OutputStreamWriter;
+import java.io.Writer;
+import java.net.InetAddress;
+import java.net.ServerSocket;
+import java.net.Socket;
+import java.nio.charset.StandardCharsets;
+import java.util.ArrayList;
+import java.util.Iterator;
+import java.util.LinkedHashMap;
+import java.util.List;
+import java.util.Locale;
+import java.util.Map;
+import java.util.concurrent.ExecutorService;
+import java.util.concurrent.Executors;
+
+/**
+ * Warm javac for RefAgent: compiles single rewritten files against an existing
+ * target/classes and a cached dependency classpath, without starting Maven.
+ *
+ * Run with a JDK 11+ (single-file launch): java CompileServer.java [port] [maxFileManagers]
+ * and read the chosen port from the first stdout line ("PORT <n>").
+ *
+ * Protocol (UTF-8 lines over a loopback socket, one request per connection):
+ *
+ *   COMPILE                      PING            SHUTDOWN
+ *   output <dir>                 -> PONG
+ *   classpath <path-separated entries>
+ *   option <javac option>        (repeatable)
+ *   source <file>                (repeatable)
+ *   END
+ *
+ *   -> OK <millis> | FAILED <millis>
+ *      DIAG <kind>\t<file>\t<line>\t<column>\t<message with \n escaped>
+ *      END
+ *
+ * One file manager is kept per classpath so jar indexes stay warm between requests.
+ * At most maxFileManagers (default 8) are kept; the least recently used one is
+ * closed, once no request is using it, to release its open jars.
+ */
+public class CompileServer {
+
+    /** A cached file manager and the number of requests using it. */
+    private static final class CachedFileManager {
+        final StandardJavaFileManager manager;
+        int users;
+        boolean evicted;
+
+        CachedFileManager(StandardJavaFileManager manager) {
+            this.manager = manager;
+        }
+    }
+
+    // access-ordered: iteration starts at the least recently used classpath
+    private static final Map<String, CachedFileManager> FILE_MANAGERS = new LinkedHashMap<>(16, 0.75f, true);
+    private static int maxFileManagers = 8;
+
+    public static void main(String[] args) throws IOException {
+        int port = args.length > 0 ? Integer.parseInt(args[0]) : 0;
+        if (args.length > 1) {
+            maxFileManagers = Math.max(1, Integer.parseInt(args[1]));
+        }
+        JavaCompiler compiler = ToolProvider.getSystemJavaCompiler();
+        if (compiler == null) {
+            System.err.println("No system Java compiler available; run the server with a JDK, not a JRE");
+            System.exit(2);
+        }
+
+        ServerSocket server = new ServerSocket(port, 50, InetAddress.getLoopbackAddress());
+        System.out.println("PORT " + server.getLocalPort());
+        System.out.flush();
+
+        ExecutorService pool = Executors.newCachedThreadPool(runnable -> {
+            Thread thread = new Thread(runnable, "compile");
+            thread.setDaemon(true);
+            return thread;
+        });
+        while (true) {
+            Socket socket = server.accept();
+            pool.submit(() -> handle(compiler, socket));
+        }
+    }
+
+    private static void handle(JavaCompiler compiler, Socket socket) {
+        try (Socket s = socket;
+             BufferedReader in = new BufferedReader(new InputStreamReader(s.getInputStream(), StandardCharsets.UTF_8));
+             Writer out = new BufferedWriter(new OutputStreamWriter(s.getOutputStream(), StandardCharsets.UTF_8))) {
+            String command = in.readLine();
+            if ("PING".equals(command)) {
+                out.write("PONG\n");
+            } else if ("SHUTDOWN".equals(command)) {
+                out.write("BYE\n");
+                out.flush();
+                System.exit(0);
+            } else if ("COMPILE".equals(command)) {
+                compile(compiler, in, out);
+            } else {
+                out.write("ERROR unknown command\n");
+            }
+            out.flush();
+        } catch (IOException e) {
+            System.err.println("Request failed: " + e);
+        }
+    }
+
+    private static void compile(JavaCompiler compiler, BufferedReader in, Writer out) throws IOException {
+        String output = null;
+        String classpath = "";
+        List<String> options = new ArrayList<>();
+        List<File> sources = new ArrayList<>();
+        String line;
+        while ((line = in.readLine()) != null && !line.equals("END")) {
+            int space = line.indexOf(' ');
+            String key = space < 0 ? line : line.substring(0, space);
+            String value = space < 0 ? "" : line.substring(space + 1);
+            switch (key) {
+                case "output": output = value; break;
+                case "classpath": classpath = value; break;
+                case "option": options.add(value); break;
+                case "source": sources.add(new File(value)); break;
+                default: break;
+            }
+        }
+        if (output == null || sources.isEmpty()) {
+            out.write("ERROR output and at least one source are required\n");
+            return;
+        }
+
+        long started = System.nanoTime();
+        DiagnosticCollector<JavaFileObject> diagnostics = new DiagnosticCollector<>();
+        CachedFileManager cached = acquire(compiler, classpath);
+        StandardJavaFileManager fileManager = cached.manager;
+        boolean ok;
+        try {
+            // a file manager is not thread-safe; requests sharing a classpath are serialised
+            synchronized (fileManager) {
+                File outputDir = new File(output);
+                outputDir.mkdirs();
+                fileManager.setLocation(StandardLocation.CLASS_OUTPUT, List.of(outputDir));
+                List<File> classpathFiles = new ArrayList<>();
+                for (String entry : classpath.split(File.pathSeparator)) {
+                    if (!entry.isEmpty()) {
+                        classpathFiles.add(new File(entry));
+                    }
+                }
+                fileManager.setLocation(StandardLocation.CLASS_PATH, classpathFiles);
+                Iterable<? extends JavaFileObject> units = fileManager.getJavaFileObjectsFromFiles(sources);
+                ok = compiler.getTask(null, fileManager, diagnostics, options, null, units).call();
+            }
+        } finally {
+            release(cached);
+        }
+        long millis = (System.nanoTime() - started) / 1_000_000;
+
+        out.write((ok ? "OK " : "FAILED ") + millis + "\n");
+        for (Diagnostic<? extends JavaFileObject> d : diagnostics.getDiagnostics()) {
+            String file = d.getSource() == null ? "" : d.getSource().getName();
+            String message = d.getMessage(Locale.ROOT).replace("\\", "\\\\").replace("\n", "\\n");
+            out.write("DIAG " + d.getKind() + "\t" + file + "\t" + d.getLineNumber() + "\t" + d.getColumnNumber() + "\t" + message + "\n");
+        }
+        out.write("END\n");
+    }
+
+    private static CachedFileManager acquire(JavaCompiler compiler, String classpath) {
+        List<CachedFileManager> unused = new ArrayList<>();
+        CachedFileManager cached;
+        synchronized (FILE_MANAGERS) {
+            cached = FILE_MANAGERS.computeIfAbsent(classpath,
+                    cp -> new CachedFileManager(compiler.getStandardFileManager(null, Locale.ROOT, StandardCharsets.UTF_8)));
+            cached.users++;
+            Iterator<CachedFileManager> oldest = FILE_MANAGERS.values().iterator();
+            while (FILE_MANAGERS.size() > maxFileManagers && oldest.hasNext()) {
+                CachedFileManager candidate = oldest.next();
+                if (candidate == cached) {
+                    continue;
+                }
+                oldest.remove();
+                candidate.evicted = true;
+                if (candidate.users == 0) {
+                    unused.add(candidate);
+                }
+            }
+        }
+        for (CachedFileManager evicted : unused) {
+            close(evicted);
+        }
+        return cached;
+    }
+
+    private static void release(CachedFileManager cached) {
+        boolean close;
+        synchronized (FILE_MANAGERS) {
+            cached.users--;
+            close = cached.evicted && cached.users == 0;
+        }
+        if (close) {
+            close(cached);
+        }
+    }
+
+    private static void close(CachedFileManager cached) {
+        try {
+            cached.manager.close();
+        } catch (IOException e) {
+            System.err.println("Closing a file manager failed: " + e);
+        }
+    }
+}
@@ -0,0 +1,398 @@
+"""
+Shared conversation handling for the provider wrappers (`GroqLLM`, `OpenAILLM`).
+
+Subclasses only implement `_complete` / `_acomplete`, the provider call itself;
+message history, query normalisation, usage tracking, record/replay, the
+on-disk response cache, the bounded conversation memory, prompt budgeting, rate limiting with retries and the per-provider async
+concurrency limit live here. Streamed calls (`query_llm(..., validator=...)`)
+are checked chunk by chunk and re-requested as soon as the reply is invalid.
+With a `hedge` (refAgent.hedging.Hedger) slow replies are raced against a
+secondary provider.
+
+Failures raise typed `refAgent.errors.LLMError`s after retries are exhausted.
+"""
+import asyncio
+import threading
+import time
+import weakref
+
+from refAgent.cassette import get_cassette
+from refAgent.errors import RateLimitError, RequestCancelled, StreamAborted, classify_error
+from refAgent.llm_cache import get_response_cache
+from refAgent.prompt_budget import PromptBudget, count_message_tokens, count_tokens
+from refAgent.rate_limit import get_rate_limiter, backoff_delay
+from settings import Settings
+
+_config = Settings()
+
+# One asyncio.Semaphore per (event loop, provider)
+_semaphores = weakref.WeakKeyDictionary()
+_semaphores_lock = threading.Lock()
+
+
+def provider_semaphore(provider, limit=None):
+    """Return the semaphore limiting in-flight async requests to `provider` on the running loop.
+
+    `limit` overrides `LLM_MAX_CONCURRENCY[provider]` (e.g. a local server's slot count).
+    """
+    loop = asyncio.get_running_loop()
+    with _semaphores_lock:
+        per_loop = _semaphores.setdefault(loop, {})
+        if provider not in per_loop:
+            if limit is None:
+                limit = _config.LLM_MAX_CONCURRENCY.get(provider, _config.LLM_DEFAULT_MAX_CONCURRENCY)
+            per_loop[provider] = asyncio.Semaphore(max(1, limit))
+        return per_loop[provider]
+
+
+class BaseLLM:
+    provider = None
+    default_model = None
+    temperature = 0.7
+    # in-flight async requests per event loop (None = LLM_MAX_CONCURRENCY[provider])
+    max_concurrency = None
+
+    def __init__(self, api_key, prompt=None):
+        """Initialize the LLM wrapper.
+
+        Args:
+            api_key (str): Provider API key.
+            prompt (str|None): Optional system prompt to set once at initialization.
+        """
+        self.api_key = api_key
+        self.message_history = []
+        self.prompt = None
+        self.last_usage = None
+        # set to False to always ask the provider (e.g. for fresh generator samples)
+        self.use_cache = True
+        self.last_cache_hit = False
+        # optional refAgent.memory.ConversationMemory bounding what each request sends
+        self.memory = None
+        self.last_stream_aborts = 0
+        # optional refAgent.hedging.Hedger racing slow replies against a secondary provider
+        self.hedge = None
+        self.last_hedge = None
+        # model that produced the last reply (the hedge secondary when it won)
+        self.last_model = None
+
+        # If a prompt is provided at creation, set it once at the start of history
+        if prompt is not None:
+            self.prompt = prompt
+            self.message_history.append({"role": "system", "content": prompt})
+
+    def _complete(self, messages, model, max_tokens):
+        """Send `messages` to the provider.
+
+        Returns:
+            tuple: (reply text, usage dict with `prompt_tokens`/`completion_tokens` or None)
+        """
+        raise NotImplementedError
+
+    async def _acomplete(self, messages, model, max_tokens):
+        """Async variant of `_complete`; defaults to running `_complete` in a worker thread."""
+        return await asyncio.to_thread(self._complete, messages, model, max_tokens)
+
+    def _stream(self, messages, model, max_tokens, cancel=None):
+        """Stream the reply as (text delta, usage or None) pairs.
+
+        Providers without streaming yield the whole `_complete` reply as one chunk.
+        Closing the generator must close the underlying response, and so must
+        `cancel` (a `refAgent.hedging.Cancellation`): register the response's
+        `close` with `cancel.on_cancel` so another thread can interrupt a blocked read.
+        """
+        reply, usage = self._complete(messages, model, max_tokens)
+        yield reply, usage
+
+    def _stream_complete(self, messages, model, max_tokens, validator, started=None, cancel=None):
+        """Consume `_stream`, aborting as soon as `validator` rejects the partial reply
+        and stopping as soon as it reports the reply `done`.
+
+        `started` (an Event) is set on the first chunk; setting `cancel` closes the
+        response at once and raises `RequestCancelled`.
+        """
+        if cancel is not None and cancel.is_set():
+            raise RequestCancelled(f"{self.provider} {model}: request cancelled")
+        parts = []
+        usage = None
+        if cancel is not None:
+            cancel.requests += 1
+        stream = self._stream(messages, model, max_tokens, cancel=cancel)
+        try:
+            for text, chunk_usage in stream:
+                if cancel is not None and cancel.is_set():
+                    raise RequestCancelled(f"{self.provider} {model}: request cancelled")
+                if chunk_usage:
+                    usage = chunk_usage
+                if not text:
+                    continue
+                if started is not None:
+                    started.set()
+                if cancel is not None:
+                    cancel.streamed.append(text)
+                parts.append(text)
+                reason = validator.feed(text)
+                if reason:
+                    raise StreamAborted(f"{reason} after {sum(len(p) for p in parts)} chars")
+                if validator.done:
+                    # the reply is complete; whatever follows the code block is not needed
+                    break
+            reason = validator.finish()
+            if reason:
+                raise StreamAborted(reason)
+        except Exception as e:
+            # a response closed by the winner of a hedge fails with a transport error
+            if cancel is not None and cancel.is_set() and not isinstance(e, RequestCancelled):
+                raise RequestCancelled(f"{self.provider} {model}: request cancelled") from e
+            raise
+        finally:
+            stream.close()
+        reply = "".join(parts)
+        if usage is None and validator.done:
+            # providers report usage in the last chunk, which a stream closed early never gets
+            usage = {"prompt_tokens": count_message_tokens(messages, model), "completion_tokens": count_tokens(reply, model)}
+        return reply, usage
+
+    def _stream_with_restarts(self, messages, model, max_tokens, validator, started=None, cancel=None):
+        """Stream under the rate limiter, re-requesting aborted replies up to `LLM_STREAM_MAX_RESTARTS` times."""
+        def _complete(m, mo, mt):
+            return self._stream_complete(m, mo, mt, validator(), started=started, cancel=cancel)
+
+        while True:
+            try:
+                return self._complete_with_retries(messages, model, max_tokens, complete=_complete)
+            except StreamAborted as e:
+                self.last_stream_aborts += 1
+                if self.last_stream_aborts > _config.LLM_STREAM_MAX_RESTARTS or (cancel is not None and cancel.is_set()):
+                    raise
+                print(f"{self.provider} {model}: stream aborted ({e}) - re-requesting ({self.last_stream_aborts}/{_config.LLM_STREAM_MAX_RESTARTS})")
+
+    def _add_queries(self, prompt, query):
+        # Accept either a single string or a list of strings for queries
+        queries = query
+        if isinstance(queries, str):
+            queries = [queries]
+        elif queries is None:
+            queries = []
+        elif not isinstance(queries, list):
+            raise TypeError("`query` must be a string or list of strings")
+
+        # Build messages: append system prompt only if not already set in history
+        if prompt is not None and not any(m.get("role") == "system" for m in self.message_history):
+            # set prompt once and ensure the system message is first
+            self.prompt = prompt
+            self.message_history.insert(0, {"role": "system", "content": prompt})
+
+        for q in queries:
+            self.message_history.append({"role": "user", "content": q})
+
+        # Fallback: if no user messages provided, keep at least the system prompt
+        if not self.message_history:
+            raise ValueError("No prompt or queries provided to send to the LLM")
+
+    def _observe_headers(self, model, headers):
+        """Feed provider rate-limit response headers to the model's limiter."""
+        get_rate_limiter(self.provider, model).observe_headers(headers)
+
+    def _complete_with_retries(self, messages, model, max_tokens, complete=None):
+        """Call `_complete` (or `complete`) under the rate limiter, retrying transient failures."""
+        complete = complete or self._complete
+        limiter = get_rate_limiter(self.provider, model)
+        estimated = count_message_tokens(messages, model)
+        attempt = 0
+        while True:
+            wait = limiter.reserve(estimated)
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                reply, usage = complete(messages, model, max_tokens)
+                limiter.settle(estimated, usage)
+                return reply, usage
+            except Exception as e:
+                error = classify_error(e)
+                limiter.settle(estimated, {"prompt_tokens": 0})
+                if isinstance(error, RateLimitError):
+                    limiter.pause(error.retry_after)
+                if not error.retryable or attempt >= _config.LLM_MAX_RETRIES:
+                    raise error from e
+                delay = backoff_delay(attempt, error.retry_after)
+                print(f"{self.provider} {model}: {error} - retrying in {delay:.1f}s ({attempt + 1}/{_config.LLM_MAX_RETRIES})")
+                time.sleep(delay)
+                attempt += 1
+
+    async def _acomplete_with_retries(self, messages, model, max_tokens):
+        limiter = get_rate_limiter(self.provider, model)
+        estimated = count_message_tokens(messages, model)
+        attempt = 0
+        while True:
+            wait = limiter.reserve(estimated)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                async with provider_semaphore(self.provider, self.max_concurrency):
+                    reply, usage = await self._acomplete(messages, model, max_tokens)
+                limiter.settle(estimated, usage)
+                return reply, usage
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error = classify_error(e)
+                limiter.settle(estimated, {"prompt_tokens": 0})
+                if isinstance(error, RateLimitError):
+                    limiter.pause(error.retry_after)
+                if not error.retryable or attempt >= _config.LLM_MAX_RETRIES:
+                    raise error from e
+                delay = backoff_delay(attempt, error.retry_after)
+                print(f"{self.provider} {model}: {error} - retrying in {delay:.1f}s ({attempt + 1}/{_config.LLM_MAX_RETRIES})")
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    def _messages(self, model=None, max_tokens=0):
+        """Messages to send for the next request: the full history or the memory's selection.
+
+        The selection leaves `max_tokens` of `model`'s window for the reply.
+        """
+        if self.memory is None:
+            return list(self.message_history)
+        room = PromptBudget(model).limit - max_tokens if model else None
+        return self.memory.select(self.message_history, max_tokens=room if room and room > 0 else None)
+
+    def _request(self, messages, model, max_tokens):
+        return {
+            "provider": self.provider,
+            "model": model,
+            "messages": messages,
+            "temperature": self.temperature,
+            "max_tokens": max_tokens,
+        }
+
+    def _cached(self, request, validator=None):
+        """Return the cached response for `request` (usage dropped, nothing was spent) or None."""
+        cache = get_response_cache() if self.use_cache else None
+        if cache is None:
+            return None
+        response = cache.get(request)
+        if response is None:
+            return None
+        if validator is not None:
+            check = validator()
+            if check.feed(response["reply"] or "") or check.finish():
+                return None
+        self.last_cache_hit = True
+        return {"reply": response["reply"], "usage": None}
+
+    def _store(self, request, response):
+        cache = get_response_cache() if self.use_cache else None
+        if cache is not None:
+            cache.put(request, response)
+
+    def _call(self, model, max_tokens, validator=None):
+        """Run `_complete` for the current history through the cassette and response cache.
+
+        With a `validator` factory the reply is streamed and validated incrementally.
+        """
+        messages = self._messages(model, max_tokens)
+        # shrink max_tokens to the room left in the model's window (PromptTooLarge if none)
+        max_tokens = PromptBudget(model).fit_max_tokens(messages, max_tokens)
+        request = self._request(messages, model, max_tokens)
+
+        def _live():
+            cached = self._cached(request, validator)
+            if cached is not None:
+                return cached
+            if self.hedge is not None:
+                reply, usage, self.last_hedge = self.hedge.run(self, messages, model, max_tokens, validator)
+            elif validator is not None:
+                reply, usage = self._stream_with_restarts(messages, model, max_tokens, validator)
+            else:
+                reply, usage = self._complete_with_retries(messages, model, max_tokens)
+            response = {"reply": reply, "usage": usage}
+            if self.last_hedge:
+                # the secondary of a hedge may have answered; usage is billed to it
+                response["model"] = self.last_hedge["model"]
+            self._store(request, response)
+            return response
+
+        response = get_cassette().interact("llm", request, _live)
+        self.last_model = response.get("model", model)
+        return response["reply"], response.get("usage")
+
+    async def _acall(self, model, max_tokens):
+        messages = self._messages(model, max_tokens)
+        max_tokens = PromptBudget(model).fit_max_tokens(messages, max_tokens)
+        request = self._request(messages, model, max_tokens)
+
+        async def _live():
+            cached = self._cached(request)
+            if cached is not None:
+                return cached
+            reply, usage = await self._acomplete_with_retries(messages, model, max_tokens)
+            response = {"reply": reply, "usage": usage}
+            self._store(request, response)
+            return response
+
+        response = await get_cassette().ainteract("llm", request, _live)
+        self.last_model = response.get("model", model)
+        return response["reply"], response.get("usage")
+
+    def query_llm(self, prompt, query, model=None, max_tokens=4096, validator=None):
+        """Query the LLM.
+
+        Args:
+            prompt (str): System prompt / context.
+            query (str | list[str]): Either a single user query string or a list of user query strings.
+            model (str): Model name to use (defaults to the provider's default model).
+            max_tokens (int): Maximum tokens for the response.
+            validator (callable|None): Factory of `refAgent.stream_validators.StreamValidator`s;
+                when given the reply is streamed and re-requested as soon as it is invalid.
+
+        Returns:
+            str: Assistant reply.
+
+        Raises:
+            LLMError: (RateLimitError, TransientLLMError, PermanentLLMError, StreamAborted) once
+                retries are exhausted. The queries of the failed call are removed from the history.
+        """
+        self.last_usage = None
+        self.last_cache_hit = False
+        self.last_stream_aborts = 0
+        self.last_hedge = None
+        self.last_model = None
+        model = model or self.default_model
+        history_length = len(self.message_history)
+        try:
+            self._add_queries(prompt, query)
+            reply, usage = self._call(model, max_tokens, validator)
+        except Exception as e:
+            del self.message_history[history_length:]
+            raise classify_error(e) from e
+        reply = (reply or "").strip()
+        self.last_usage = usage
+        self.message_history.append({"role": "assistant", "content": reply})
+        return reply
+
+    async def aquery_llm(self, prompt, query, model=None, max_tokens=4096):
+        """Async variant of `query_llm`.
+
+        At most `LLM_MAX_CONCURRENCY[provider]` requests per provider are in flight on
+        one event loop. If the awaiting task is cancelled, the queries added for this
+        call are removed from the history again and `CancelledError` propagates.
+        `last_model` names the model that answered, as for `query_llm`.
+        """
+        self.last_usage = None
+        self.last_cache_hit = False
+        self.last_model = None
+        model = model or self.default_model
+        history_length = len(self.message_history)
+        try:
+            self._add_queries(prompt, query)
+            reply, usage = await self._acall(model, max_tokens)
+        except asyncio.CancelledError:
+            del self.message_history[history_length:]
+            raise
+        except Exception as e:
+            del self.message_history[history_length:]
+            raise classify_error(e) from e
+        reply = (reply or "").strip()
+        self.last_usage = usage
+        self.message_history.append({"role": "assistant", "content": reply})
+        return reply
@@ -1,8 +1,14 @@
 """
 Groq LLM wrapper - uses Groq API for fast, cost-effective LLM inference.
 """
+from refAgent.BaseLLM import BaseLLM
+from refAgent.clients import get_client, get_async_client
+
+
+class GroqLLM(BaseLLM):
+    provider = "groq"
+    default_model = "llama-3.1-8b-instant"
 
-class GroqLLM:
     def __init__(self, api_key, prompt=None):
         """Initialize the Groq LLM wrapper.
 
@@ -10,16 +16,10 @@ class GroqLLM:
             api_key (str): Groq API key.
             prompt (str|None): Optional system prompt to set once at initialization.
         """
-        self.api_key = api_key
-        self.message_history = []
-        self.prompt = None
+        super().__init__(api_key, prompt=prompt)
         self.base_url = "https://api.groq.com/openai/v1"
-        
-        if prompt is not None:
-            self.prompt = prompt
-            self.message_history.append({"role": "system", "content": prompt})
 
-    def query_llm(self, prompt, query, model="llama-3.1-8b-instant", max_tokens=4096):
+    def query_llm(self, prompt, query, model="llama-3.1-8b-instant", max_tokens=4096, validator=None):
         """Query the Groq LLM.
 
         Args:
@@ -31,51 +31,80 @@ class GroqLLM:
                        - mixtral-8x7b-32768 (larger but slower)
                        - llama-3.1-70b-versatile (largest)
             max_tokens (int): Maximum tokens for the response (reduced for RPM).
+            validator (callable|None): Stream validator factory; streams and re-requests invalid replies.
 
         Returns:
-            str: Assistant reply or an error message.
+            str: Assistant reply.
+
+        Raises:
+            LLMError: when the request fails after rate limiting and retries.
         """
-        try:
-            from groq import Groq
-            
-            # Initialize Groq client
-            client = Groq(api_key=self.api_key)
-            
-            # Accept either a single string or a list of strings for queries
-            queries = query
-            if isinstance(queries, str):
-                queries = [queries]
-            elif queries is None:
-                queries = []
-            elif not isinstance(queries, list):
-                raise TypeError("`query` must be a string or list of strings")
+        return super().query_llm(prompt, query, model=model, max_tokens=max_tokens, validator=validator)
+
+    def _complete(self, messages, model, max_tokens):
+        # Shared, pooled Groq client (one per API key for the whole process)
+        client = get_client(self.provider, self.api_key)
 
-            # Build messages: append system prompt only if not already set in history
-            if prompt is not None and not any(m.get("role") == "system" for m in self.message_history):
-                self.prompt = prompt
-                self.message_history.insert(0, {"role": "system", "content": prompt})
+        # Call Groq API
+        raw = client.chat.completions.with_raw_response.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=self.temperature,
+        )
+        self._observe_headers(model, raw.headers)
+        return self._parse_response(raw.parse())
 
-            for q in queries:
-                self.message_history.append({"role": "user", "content": q})
+    async def _acomplete(self, messages, model, max_tokens):
+        # Shared, pooled AsyncGroq client for the running event loop
+        client = get_async_client(self.provider, self.api_key)
 
-            # Fallback: if no user messages provided, keep at least the system prompt
-            if not self.message_history:
-                raise ValueError("No prompt or queries provided to send to the LLM")
+        raw = await client.chat.completions.with_raw_response.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=self.temperature,
+        )
+        self._observe_headers(model, raw.headers)
+        return self._parse_response(raw.parse())
 
-            # Call Groq API
-            response = client.chat.completions.create(
-                model=model,
-                messages=self.message_history,
-                max_tokens=max_tokens,
-                temperature=0.7,
-            )
+    def _stream(self, messages, model, max_tokens, cancel=None):
+        client = get_client(self.provider, self.api_key)
 
-            # Extract response text
-            reply = response.choices[0].message.content.strip()
-            self.message_history.append({"role": "assistant", "content": reply})
-            return reply
+        raw = client.chat.completions.with_raw_response.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=self.temperature,
+            stream=True,
+        )
+        self._observe_headers(model, raw.headers)
+        stream = raw.parse()
+        if cancel is not None:
+            # lets the winner of a hedge close this response while we wait for a chunk
+            cancel.on_cancel(stream.close)
+        try:
+            for chunk in stream:
+                text = chunk.choices[0].delta.content if chunk.choices else None
+                # Groq reports usage on the last chunk under `x_groq`
+                usage = getattr(getattr(chunk, "x_groq", None), "usage", None)
+                if usage is not None:
+                    usage = {
+                        "prompt_tokens": getattr(usage, "prompt_tokens", 0),
+                        "completion_tokens": getattr(usage, "completion_tokens", 0),
+                    }
+                yield text, usage
+        finally:
+            stream.close()
 
-        except ImportError:
-            return "Error: groq package not installed. Install with: pip install groq"
-        except Exception as e:
-            return f"An error occurred: {str(e)}"
+    @staticmethod
+    def _parse_response(response):
+        # Extract response text and token usage
+        reply = response.choices[0].message.content
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            usage = {
+                "prompt_tokens": getattr(usage, "prompt_tokens", 0),
+                "completion_tokens": getattr(usage, "completion_tokens", 0),
+            }
+        return reply, usage
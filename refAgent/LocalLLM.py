@@ -0,0 +1,47 @@
+"""
+Local LLM wrapper - any OpenAI-compatible server (llama.cpp server, vLLM, Ollama)
+running next to the build machines, configured with `LOCAL_LLM_*` settings.
+
+A local server has no rate limits but only a fixed number of parallel slots;
+requests beyond `LOCAL_LLM_PARALLEL_SLOTS` wait here instead of queueing on
+the server. `python -m refAgent.local_stub_server` serves a stub model for tests.
+"""
+import threading
+
+from refAgent.OpenaiLLM import OpenAILLM
+from refAgent.BaseLLM import BaseLLM
+from settings import Settings
+
+_config = Settings()
+
+# Sync requests in flight to the local server, shared by every LocalLLM in the process
+_slots = threading.BoundedSemaphore(max(1, _config.LOCAL_LLM_PARALLEL_SLOTS))
+
+
+class LocalLLM(OpenAILLM):
+    provider = "local"
+    default_model = _config.LOCAL_LLM_MODEL
+    base_url = _config.LOCAL_LLM_BASE_URL
+    max_concurrency = _config.LOCAL_LLM_PARALLEL_SLOTS
+
+    def __init__(self, api_key=None, prompt=None):
+        """Initialize the local LLM wrapper.
+
+        Args:
+            api_key (str|None): Key expected by the server, if any (default: `LOCAL_LLM_API_KEY`).
+            prompt (str|None): Optional system prompt to set once at initialization.
+        """
+        # skip OpenAILLM.__init__, which sets the global openai.api_key
+        BaseLLM.__init__(self, api_key or _config.LOCAL_LLM_API_KEY, prompt=prompt)
+
+    def query_llm(self, prompt, query, model=None, max_tokens=4096, validator=None):
+        """Query the local model (default: `LOCAL_LLM_MODEL`); see `BaseLLM.query_llm`."""
+        return BaseLLM.query_llm(self, prompt, query, model=model, max_tokens=max_tokens, validator=validator)
+
+    def _complete(self, messages, model, max_tokens):
+        with _slots:
+            return super()._complete(messages, model, max_tokens)
+
+    def _stream(self, messages, model, max_tokens, cancel=None):
+        with _slots:
+            yield from super()._stream(messages, model, max_tokens, cancel=cancel)
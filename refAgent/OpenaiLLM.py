@@ -1,6 +1,15 @@
 import openai
 
-class OpenAILLM:
+from refAgent.BaseLLM import BaseLLM
+from refAgent.clients import get_client, get_async_client
+
+
+class OpenAILLM(BaseLLM):
+    provider = "openai"
+    default_model = "gpt-4"
+    # None = the SDK's default endpoint
+    base_url = None
+
     def __init__(self, api_key, prompt=None):
         """Initialize the OpenAI LLM wrapper.
 
@@ -9,14 +18,9 @@ class OpenAILLM:
             prompt (str|None): Optional system prompt to set once at initialization.
         """
         openai.api_key = api_key
-        self.message_history = []
-        self.prompt = None
-        # If a prompt is provided at creation, set it once at the start of history
-        if prompt is not None:
-            self.prompt = prompt
-            self.message_history.append({"role": "system", "content": prompt})
-    
-    def query_llm(self, prompt, query, model="gpt-4", max_tokens=4096):
+        super().__init__(api_key, prompt=prompt)
+
+    def query_llm(self, prompt, query, model="gpt-4", max_tokens=4096, validator=None):
         """Query the LLM.
 
         Args:
@@ -24,47 +28,113 @@ class OpenAILLM:
             query (str | list[str]): Either a single user query string or a list of user query strings.
             model (str): Model name to use.
             max_tokens (int): Maximum tokens for the response.
-            temperature (float): Sampling temperature.
+            validator (callable|None): Stream validator factory; streams and re-requests invalid replies.
 
         Returns:
-            str: Assistant reply or an error message.
+            str: Assistant reply.
+
+        Raises:
+            LLMError: when the request fails after rate limiting and retries.
         """
-        try:
-            # Accept either a single string or a list of strings for queries
-            queries = query
-            if isinstance(queries, str):
-                queries = [queries]
-            elif queries is None:
-                queries = []
-            elif not isinstance(queries, list):
-                raise TypeError("`query` must be a string or list of strings")
-
-            # Build messages: append system prompt only if not already set in history
-            if prompt is not None and not any(m.get("role") == "system" for m in self.message_history):
-                # set prompt once and append as the first message
-                self.prompt = prompt
-                # ensure system message is first
-                self.message_history.insert(0, {"role": "system", "content": prompt})
-
-            for q in queries:
-                self.message_history.append({"role": "user", "content": q})
-
-            # Fallback: if no user messages provided, keep at least the system prompt
-            if not self.message_history:
-                raise ValueError("No prompt or queries provided to send to the LLM")
-
-            # Call OpenAI API
-            response = openai.ChatCompletion.create(
+        return super().query_llm(prompt, query, model=model, max_tokens=max_tokens, validator=validator)
+
+    def _complete(self, messages, model, max_tokens):
+        # Shared, pooled client (None for openai<1.0, which pools via a shared session)
+        client = get_client(self.provider, self.api_key, self.base_url)
+
+        if client is not None:
+            raw = client.chat.completions.with_raw_response.create(
+                model=model,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=self.temperature,
+            )
+            self._observe_headers(model, raw.headers)
+            return self._parse_response(raw.parse())
+
+        # Call OpenAI API (legacy SDK)
+        response = openai.ChatCompletion.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=self.temperature,
+        )
+        return self._parse_legacy_response(response)
+
+    async def _acomplete(self, messages, model, max_tokens):
+        client = get_async_client(self.provider, self.api_key, self.base_url)
+
+        if client is not None:
+            raw = await client.chat.completions.with_raw_response.create(
                 model=model,
-                messages=self.message_history,
+                messages=messages,
                 max_tokens=max_tokens,
-                temperature=0.7,
+                temperature=self.temperature,
             )
+            self._observe_headers(model, raw.headers)
+            return self._parse_response(raw.parse())
+
+        response = await openai.ChatCompletion.acreate(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=self.temperature,
+        )
+        return self._parse_legacy_response(response)
+
+    def _stream(self, messages, model, max_tokens, cancel=None):
+        client = get_client(self.provider, self.api_key, self.base_url)
+        if client is None:
+            # legacy SDK: no streaming, the whole reply is validated at once
+            yield from super()._stream(messages, model, max_tokens, cancel=cancel)
+            return
+
+        raw = client.chat.completions.with_raw_response.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=self.temperature,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        self._observe_headers(model, raw.headers)
+        stream = raw.parse()
+        if cancel is not None:
+            # lets the winner of a hedge close this response while we wait for a chunk
+            cancel.on_cancel(stream.close)
+        try:
+            for chunk in stream:
+                text = chunk.choices[0].delta.content if chunk.choices else None
+                # the final chunk carries the usage and no choices
+                usage = getattr(chunk, "usage", None)
+                if usage is not None:
+                    usage = {
+                        "prompt_tokens": getattr(usage, "prompt_tokens", 0),
+                        "completion_tokens": getattr(usage, "completion_tokens", 0),
+                    }
+                yield text, usage
+        finally:
+            stream.close()
 
-            # Extract response text
-            reply = response['choices'][0]['message']['content'].strip()
-            self.message_history.append({"role": "assistant", "content": reply})
-            return reply
+    @staticmethod
+    def _parse_response(response):
+        reply = response.choices[0].message.content
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            usage = {
+                "prompt_tokens": getattr(usage, "prompt_tokens", 0),
+                "completion_tokens": getattr(usage, "completion_tokens", 0),
+            }
+        return reply, usage
 
-        except Exception as e:
-            return f"An error occurred: {str(e)}"
\ No newline at end of file
+    @staticmethod
+    def _parse_legacy_response(response):
+        # Extract response text and token usage
+        reply = response['choices'][0]['message']['content']
+        usage = response.get('usage')
+        if usage:
+            usage = {
+                "prompt_tokens": usage.get('prompt_tokens', 0),
+                "completion_tokens": usage.get('completion_tokens', 0),
+            }
+        return reply, usage
@@ -1,5 +1,7 @@
 import sys
 import os
+import threading
+import time
 
 # Add parent directory to path so relative imports work
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -10,189 +12,429 @@ from utilities import *
 from settings import Settings
 import argparse
 from refAgent.agents import PlannerAgent, RefactoringGeneratorAgent, CompilerAgent, TestAgent
-
-# === Parse project name argument ===
-parser = argparse.ArgumentParser(description="Refactor Java Project")
-parser.add_argument("project_name", type=str, help="Name of the project folder (e.g. accumulo-2.1)")
-args = parser.parse_args()
-
-protject_name = args.project_name
-
-config = Settings()
-
-# Example usage
-if __name__ == "__main__":
-    print("Starting RefAgent pipeline...")
-    
-    #Prepare needed folders
-    results = {}
-    os.makedirs(f"results/{protject_name}", exist_ok=True)
-    os.makedirs(f"data/paths/{protject_name}", exist_ok=True)
-    print(f"Created result directories for project: {protject_name}")
-
-    # Use detector-based workflow: detect god classes and process only god class + neighbors
-    import sys
+from refAgent.budget import BudgetScheduler
+from refAgent.tracing import tracer
+from refAgent.clients import client_manager
+from refAgent.errors import LLMError, StreamAborted
+from refAgent.llm_cache import get_response_cache
+from refAgent.prompt_budget import PromptBudget
+from refAgent.prompt import REFACTORING_GENERATOR_PROMPT
+from refAgent.routing import ModelRouter
+from refAgent.hedging import hedge_stats
+from refAgent import surefire
+from refAgent.coverage import get_coverage_map, changed_methods
+from refAgent.preflight import validate_candidate
+from refAgent.workspace import Workspace, create_workspace
+from refAgent.maven import module_for
+from refAgent.test_health import TestHealth, test_id
+
+
+def llm_settings(config):
+    """Return (api_key, model, provider) for the configured LLM provider."""
+    if config.LLM_PROVIDER == 'groq':
+        return config.GROQ_API_KEY, config.GROQ_MODEL, 'groq'
+    if config.LLM_PROVIDER == 'local':
+        return config.LOCAL_LLM_API_KEY, config.LOCAL_LLM_MODEL, 'local'
+    return config.API_KEY, config.MODEL_NAME, 'openai'
+
+
+def to_after_path(path):
+    """Path of a `projects/before/...` file in the working copy under `projects/after/`."""
+    return path.replace("projects/before/", "projects/after/") if path else path
+
+
+_project_locks = {}
+_project_locks_lock = threading.Lock()
+
+
+def project_lock(protject_name):
+    """Lock serialising writes and commits to `projects/after/<project>` across class workspaces."""
+    with _project_locks_lock:
+        return _project_locks.setdefault(protject_name, threading.Lock())
+
+
+def open_workspace(protject_name, target_class, config):
+    """Workspace for one class: `projects/after/<project>` itself, or a copy-on-write tree of it."""
+    after_dir = f"projects/after/{protject_name}"
+    if not config.WORKSPACE_PER_CLASS:
+        return Workspace(after_dir)
+    workspace = create_workspace(after_dir, os.path.join(config.WORKSPACE_DIR, protject_name, target_class), config=config)
+    print(f"Workspace for {target_class}: {workspace.path} ({workspace.strategy})")
+    return workspace
+
+
+def test_files_for(tests, prepared, workspace):
+    """Workspace source path of each test class (None when unknown)."""
+    test_files = {t: workspace.path_for(to_after_path(prepared["test_files"].get(t))) for t in tests}
+    coverage = prepared.get("coverage")
+    if coverage is not None:
+        for t in tests:
+            if not test_files[t] and t in coverage.test_files:
+                test_files[t] = os.path.join(workspace.path, coverage.test_files[t])
+    return test_files
+
+
+def build_module(protject_name, target_file):
+    """Build-time key of the Maven module owning `target_file` (the module `-pl` builds)."""
+    module = module_for(f"projects/before/{protject_name}", target_file)
+    return f"{protject_name}/{module}" if module else protject_name
+
+
+def refactor_god_class(protject_name, target_class, prepared, config, scheduler):
+    """Run the planner -> generator -> compile/test loop for one prepared god class.
+
+    Spans recorded while the class is processed are exported as a per-class timing
+    breakdown to `results/<project>/<class>/timings.json`.
+    """
+    # classes run on worker threads, which do not inherit the project scope
+    with tracer.class_scope(target_class, protject_name):
+        _refactor_god_class(protject_name, target_class, prepared, config, scheduler)
+    if tracer.enabled:
+        tracer.export_class_timings(target_class, f"results/{protject_name}/{target_class}/timings.json", project=protject_name)
+
+
+def _refactor_god_class(protject_name, target_class, prepared, config, scheduler):
+    if scheduler.exhausted():
+        print(f"Budget exhausted ({scheduler.exhausted()}), skipping {target_class}")
+        return
     try:
-        from refAgent.detector import Detector
-        detector = Detector(config)
-    except Exception as e:
-        print("Detector not available:", e)
-        detector = None
-
-    if detector:
-        project_directory = f"projects/before/{protject_name}"
-        god_classes = detector.detect_god_classes(project_directory, top_n=config.DETECTOR_TOP_N)
-        print(f"Detected god classes: {god_classes}")
-
-        for target_class in god_classes:
+        results = {}
+        graph_dep = prepared["graph_dep"]
+        neighbor_classes = prepared["neighbor_classes"]
+        bundle_files = prepared["bundle_files"]
+        target_file = prepared["target_file"]
+        before_code = prepared["before_code"]
+        module = prepared["module"]
+
+        print(f"\n=== Processing god class: {target_class} ===")
+        print(f"Target file: {target_file}")
+        print(f"Code size: {len(before_code)} chars, {len(bundle_files)} neighbor files")
+
+        # Initialize agents with the configured provider
+        api_key, model, provider = llm_settings(config)
+
+        # each task gets the model tier routed to it (MODEL_ROUTES / MODEL_TIERS)
+        router = ModelRouter(config, provider)
+        print(f"Using provider: {provider}, model: {model}")
+        planner = PlannerAgent(api_key, model=router.model_for("planner"), provider=provider)
+        # every iteration needs a fresh candidate: a cached reply would repeat the one that just failed
+        refactoring_generator = RefactoringGeneratorAgent(api_key, model=router.model_for("generator"), provider=provider, use_cache=False)
+        compiler = CompilerAgent(api_key, model=router.model_for("compile_summary"), provider=provider)
+        test_agent = TestAgent(api_key, model=router.model_for("test_summary"), provider=provider)
+        for agent in (planner, refactoring_generator, compiler, test_agent):
+            agent.budget = scheduler
+
+        # Send ONLY target class to planner (neighbors can be referenced by name)
+        neighbor_names = ", ".join([f for f in neighbor_classes[:5]])
+        instruction_input = f"Target class code:\n{before_code}\n\nNeighboring classes: {neighbor_names}"
+        print(f"Calling planner.analyze_methods()...")
+        Instruction = planner.analyze_methods(before_code, instruction_input)
+        print(f"Got instructions: {Instruction[:100] if Instruction else 'None'}...")
+        results["Instruction"] = Instruction
+
+        query_decision = f"Output: True or False\nFrom this set of instruction: {Instruction} does at least one method need improvement?\nReturn True or False only."
+        do_instruct = planner.send(None, query_decision, model=router.model_for("decision"))
+
+        if do_instruct and str(do_instruct).strip().lower() in ("true","yes","1"):
+            workspace = open_workspace(protject_name, target_class, config)
+            target_after_path = workspace.path_for(to_after_path(target_file))
+            project_after_dir = workspace.path
+            failed_iterations = 0
+            name_tests = [t for t in find_test_files(extract_ids(graph_dep)) if t != "TestCase"]
+            coverage = prepared.get("coverage")
+            health = prepared.get("health") if config.TEST_BATCH_ENABLED else None
             try:
-                if not target_class:
-                    continue
-                os.makedirs(f"results/{protject_name}/{target_class}", exist_ok=True)
-                graph_path = f"data/graphs/{protject_name}/{target_class}_dependency_graph.json"
-                analyzer = JavaClassDependencyAnalyzer(target_class)
-                analyzer.analyze_project(project_directory)
-                analyzer.export_to_json(graph_path)
-                draw_dependency_graph(analyzer.dependencies, filename=f"data/graphs/{protject_name}/{target_class}_dependency_graph.png")
-
-                graph_dep = read_json_file(graph_path)
-                neighbor_classes = extract_ids(graph_dep)
-
-                # Map class names to file paths and build a compact code bundle
-                all_files = get_all_java_files(project_directory)
-                class_to_file = {}
-                for fpath in all_files:
-                    cname = extract_class_name(fpath)
-                    if cname:
-                        class_to_file[cname] = fpath
-
-                bundle_files = [class_to_file.get(c) for c in neighbor_classes if class_to_file.get(c)]
-                bundle_code = "\n// ----- SEPARATOR -----\n".join([parse_java_code(fp) for fp in bundle_files])
-
-                target_file = class_to_file.get(target_class)
-                if not target_file:
-                    print(f"Could not locate source file for {target_class}, skipping")
-                    continue
-
-                before_code = parse_java_code(target_file)
-                
-                # Truncate very large files to avoid token overflow
-                MAX_CODE_SIZE = 50000  # ~12.5K tokens
-                if len(before_code) > MAX_CODE_SIZE:
-                    # Keep only the class declaration and first N methods
-                    lines = before_code.split('\n')
-                    truncated = '\n'.join(lines[:min(len(lines), 1500)])  # Keep first 1500 lines
-                    before_code = truncated + "\n// ... (file truncated for analysis) ..."
-                
-                print(f"\n=== Processing god class: {target_class} ===")
-                print(f"Target file: {target_file}")
-                print(f"Code size: {len(before_code)} chars, {len(bundle_files)} neighbor files")
-
-                # Initialize agents with Groq provider
-                if config.LLM_PROVIDER == 'groq':
-                    api_key = config.GROQ_API_KEY
-                    model = config.GROQ_MODEL
-                    provider = 'groq'
-                else:
-                    api_key = config.API_KEY
-                    model = config.MODEL_NAME
-                    provider = 'openai'
-                
-                print(f"Using provider: {provider}, model: {model}")
-                planner = PlannerAgent(api_key, model=model, provider=provider)
-                refactoring_generator = RefactoringGeneratorAgent(api_key, model=model, provider=provider)
-                compiler = CompilerAgent(api_key, model=model, provider=provider)
-                test_agent = TestAgent(api_key, model=model, provider=provider)
-
-                # Send ONLY target class to planner (neighbors can be referenced by name)
-                neighbor_names = ", ".join([f for f in neighbor_classes[:5]])
-                instruction_input = f"Target class code:\n{before_code}\n\nNeighboring classes: {neighbor_names}"
-                print(f"Calling planner.analyze_methods()...")
-                Instruction = planner.analyze_methods(before_code, instruction_input)
-                print(f"Got instructions: {Instruction[:100] if Instruction else 'None'}...")
-                results["Instruction"] = Instruction
-
-                query_decision = f"Output: True or False\nFrom this set of instruction: {Instruction} does at least one method need improvement?\nReturn True or False only."
-                do_instruct = planner.send(None, query_decision)
-
-                if do_instruct and str(do_instruct).strip().lower() in ("true","yes","1"):
-                    for i in range(20):
-                        # Use target class code, not full bundle for refactoring
-                        gen_query = f"Plan: {Instruction}\n\nTask: Apply the plan by refactoring the Java class:\n{before_code}\n\nReturn ONLY the full Java source of the refactored class in a single fenced `java` code block."
-                        improvement = refactoring_generator.run(gen_query, use_refactoring_generator_prompt=True)
-
-                        target_after_path = target_file.replace("projects/before/", "projects/after/")
-                        write_to_java_file(file_path=target_after_path, java_code=improvement)
-
-                        write_to_java_file(file_path=f"results/{protject_name}/{target_class}/original_java_code.java", java_code=before_code)
-                        write_to_java_file(file_path=f"results/{protject_name}/{target_class}/improved_java_code.java", java_code=improvement)
-
-                        project_after_dir = f"projects_after/{protject_name}"
-                        is_compiled, compile_summary = compiler.compile_and_summarize(project_after_dir, before_code, improvement)
-                        if not is_compiled:
+                if health is not None:
+                    # every test an iteration may select, measured on the still untouched workspace
+                    candidates = coverage.select(target_class, None, name_tests) if coverage is not None else name_tests
+                    candidate_files = test_files_for(candidates, prepared, workspace)
+                    with tracer.span("test_health.baseline", "maven", tests=len(candidates)):
+                        health.ensure(candidates, project_after_dir,
+                                      list(candidate_files.values()) if all(candidate_files.values()) else None)
+                while scheduler.next_iteration(target_class):
+                    # escalate the generator to a stronger model after repeated failures, skipping
+                    # models whose window cannot hold the whole class
+                    escalation = router.escalation("generator", failures=failed_iterations)
+                    generator_model = next((m for m in escalation if m in prepared["generator_models"]), prepared["generator_models"][-1])
+                    if generator_model != refactoring_generator.model:
+                        print(f"Escalating generator for {target_class} to {generator_model} after {failed_iterations} failed iterations")
+                        refactoring_generator.model = generator_model
+                    results["Generator model"] = generator_model
+                    # the reply repeats the whole class, so size max_tokens from the class instead of a fixed cap
+                    generator_max_tokens = PromptBudget(generator_model).output_tokens_for(before_code, cap=config.REFRACTORING_GENERATOR_MAX_TOKENS)
+                    # Use target class code, not full bundle for refactoring
+                    gen_query = f"Plan: {Instruction}\n\nTask: Apply the plan by refactoring the Java class:\n{before_code}\n\nReturn ONLY the full Java source of the refactored class in a single fenced `java` code block."
+                    try:
+                        improvement = refactoring_generator.run(gen_query, use_refactoring_generator_prompt=True, max_tokens=generator_max_tokens, class_name=target_class)
+                    except StreamAborted as e:
+                        # every re-request came back malformed: a failed iteration, not a failed class
+                        results["Compilation"] = False
+                        results["Test passed"] = False
+                        results["is improved"] = False
+                        results["Stream aborted"] = str(e)
+                        print(f"Refactoring generator reply for {target_class} rejected while streaming: {e}")
+                        refactoring_generator.llm.message_history.append({"role": "user", "content": (
+                            f"Your previous reply was rejected ({e}). Return ONLY the full Java source of the "
+                            f"refactored class {target_class} in a single fenced `java` code block.")})
+                        failed_iterations += 1
+                        continue
+                    except LLMError as e:
+                        # Never write an error message to disk or hand it to Maven
+                        print(f"Refactoring generator failed for {target_class}: {e}")
+                        results["LLM error"] = str(e)
+                        break
+                    # the hedge secondary may have written this candidate
+                    results["Generator model"] = refactoring_generator.llm.last_model or generator_model
+
+                    if config.PREFLIGHT_ENABLED:
+                        # reject unusable replies in-process instead of paying for a build
+                        with tracer.span("preflight", "parse"):
+                            preflight = validate_candidate(improvement, before_code, target_class, check_api=config.PREFLIGHT_CHECK_API)
+                        if not preflight.ok:
                             results["Compilation"] = False
                             results["Test passed"] = False
                             results["is improved"] = False
-                            write_to_java_file(file_path=target_after_path, java_code=before_code)
-                            try:
-                                refactoring_generator.llm.message_history.append({"role": "user", "content": compile_summary})
-                            except Exception:
-                                pass
-                            print("Compilation summary (LLM):")
-                            print(compile_summary)
+                            results["Preflight problems"] = preflight.problems
+                            print(f"Candidate for {target_class} rejected before compilation: {preflight.problems}")
+                            refactoring_generator.llm.message_history.append({"role": "user", "content": preflight.feedback()})
+                            failed_iterations += 1
                             continue
+                        improvement = preflight.code
 
-                        files = extract_ids(graph_dep)
-                        tests = find_test_files(files)
+                    workspace.write(target_after_path, improvement)
 
+                    write_to_java_file(file_path=f"results/{protject_name}/{target_class}/original_java_code.java", java_code=before_code)
+                    write_to_java_file(file_path=f"results/{protject_name}/{target_class}/improved_java_code.java", java_code=improvement)
+
+                    is_compiled, compile_summary = compiler.compile_and_summarize(
+                        project_after_dir, before_code, improvement,
+                        changed_file=target_after_path,
+                        related_files=[workspace.path_for(to_after_path(f)) for f in bundle_files],
+                    )
+                    scheduler.record_build(module, compiler.last_build[1], compiler=compiler.last_build[0])
+                    if not is_compiled:
+                        results["Compilation"] = False
+                        results["Test passed"] = False
+                        results["is improved"] = False
+                        workspace.rollback()
+                        try:
+                            refactoring_generator.llm.message_history.append({"role": "user", "content": compile_summary})
+                        except Exception:
+                            pass
+                        print("Compilation feedback:")
+                        print(compile_summary)
+                        failed_iterations += 1
+                        continue
+
+                    scheduler.mark_progress(target_class, compiled=True)
+                    tests = name_tests
+                    if coverage is not None:
+                        # only the tests covering the methods the generator touched
+                        methods = changed_methods(before_code, improvement)
+                        tests = coverage.select(target_class, methods, tests)
+                        print(f"Coverage selected {len(tests)} tests for changed methods {sorted(methods) if methods is not None else 'unknown'}")
+                    test_files = test_files_for(tests, prepared, workspace)
+
+                    tests_started = time.monotonic()
+                    combined_summary = None
+                    if tests and config.TEST_BATCH_ENABLED:
+                        # one Maven run for every selected test class, outcomes from the Surefire reports
+                        process, test_summary = test_agent.run_tests_and_summarize(
+                            tests,
+                            project_dir=project_after_dir,
+                            original_code=before_code,
+                            refactored_code=improvement,
+                            test_files=list(test_files.values()) if all(test_files.values()) else None,
+                            health=health,
+                        )
+                        failed_tests = surefire.failures(process.collected)
+                        new_failures = health.new_failures(failed_tests) if health is not None else failed_tests
+                        if len(new_failures) < len(failed_tests):
+                            results["Baseline failures ignored"] = sorted({test_id(t) for t in failed_tests} - {test_id(t) for t in new_failures})
+                            print(f"Ignoring failures that predate the refactoring: {results['Baseline failures ignored']}")
+                        # a failed run without failing tests did not build or run the tests
+                        if new_failures or (process.returncode != 0 and not failed_tests):
+                            results["Failed tests"] = [test_id(t) for t in new_failures]
+                            combined_summary = test_summary or process.error_text()
+                    else:
                         test_summaries = []
                         for test in tests:
-                            if test != "TestCase":
-                                rcode, test_summary = test_agent.run_test_and_summarize(
-                                    test,
-                                    project_dir=project_after_dir,
-                                    verify=False,
-                                    original_code=before_code,
-                                    refactored_code=improvement,
-                                )
-                                if rcode.returncode != 0:
-                                    test_summaries.append(test_summary or rcode.stderr)
-                                    continue
-
+                            rcode, test_summary = test_agent.run_test_and_summarize(
+                                test,
+                                project_dir=project_after_dir,
+                                test_file=test_files[test],
+                                verify=False,
+                                original_code=before_code,
+                                refactored_code=improvement,
+                            )
+                            if rcode.returncode != 0:
+                                test_summaries.append(test_summary or rcode.stderr)
                         if test_summaries:
                             combined_summary = test_agent.combine_summaries(test_summaries, original_code=before_code, refactored_code=improvement)
-                            results["Compilation"] = True
-                            results["Test passed"] = False
-                            results["is improved"] = False
-                            try:
-                                refactoring_generator.llm.message_history.append({"role": "user", "content": combined_summary})
-                            except Exception:
-                                pass
-                            print("Combined test failure summary (LLM):")
-                            print(combined_summary)
-                            continue
+                    scheduler.record_tests(module, time.monotonic() - tests_started, len(tests))
 
+                    if combined_summary:
                         results["Compilation"] = True
-                        results["Test passed"] = True
-                        results["is improved"] = True
+                        results["Test passed"] = False
+                        results["is improved"] = False
+                        try:
+                            refactoring_generator.llm.message_history.append({"role": "user", "content": combined_summary})
+                        except Exception:
+                            pass
+                        print("Test failure feedback:")
+                        print(combined_summary)
+                        failed_iterations += 1
+                        continue
 
-                        repo_path = f'projects/after/{protject_name}'
-                        file_path = target_file.replace(f"projects/before/{protject_name}/", "")
-                        commit_message = f'Refactored {file_path} using RefAgent'
+                    scheduler.mark_progress(target_class, compiled=True, tests_passed=True)
+                    results["Compilation"] = True
+                    results["Test passed"] = True
+                    results["is improved"] = True
+
+                    repo_path = f'projects/after/{protject_name}'
+                    file_path = target_file.replace(f"projects/before/{protject_name}/", "")
+                    commit_message = f'Refactored {file_path} using RefAgent'
+                    if workspace.source is None:
                         commit_file_to_github(repo_path, file_path, commit_message)
+                    else:
+                        # commit the accepted class from projects/after, as an in-place run does
+                        with project_lock(protject_name):
+                            after_tree = Workspace(repo_path)
+                            after_tree.write(to_after_path(target_file), improvement)
+                            commit_file_to_github(repo_path, file_path, commit_message)
+                            after_tree.rollback()
 
-                        break
+                    break
 
-                    write_to_java_file(file_path=target_after_path, java_code=before_code)
-                    export_dict_to_json(results, f"results/{protject_name}/{target_class}/metrics")
+            finally:
+                # restores the original bytes or drops the workspace
+                workspace.remove()
+            results["Budget"] = {"iterations": scheduler.used.get(target_class, 0)}
+            export_dict_to_json(results, f"results/{protject_name}/{target_class}/metrics")
+
+    except Exception as e:
+        print(f"Error while processing {target_class}: {e}")
+    finally:
+        scheduler.finish_class(target_class)
+
+
+def process_god_classes(protject_name, detector, config, runtime=None, budget=None):
+    """Detect god classes in `projects/before/<project>` and refactor them cheapest-first.
+
+    Args:
+        protject_name: Project folder name under `projects/before`.
+        detector: `refAgent.detector.Detector` instance.
+        config: Settings for this run.
+        runtime: Optional `refAgent.batch.BatchRuntime`; when given, classes run on its
+            shared worker pool within the project's concurrency limit.
+        budget: Optional run-wide `BudgetScheduler` (e.g. of a batch) charged with this
+            project's usage; by default the project gets a budget of its own.
+    """
+    project_directory = f"projects/before/{protject_name}"
+    with tracer.span("detect", "detection", project=protject_name):
+        god_classes = detector.detect_god_classes(project_directory, top_n=config.DETECTOR_TOP_N)
+    print(f"Detected god classes: {god_classes}")
+
+    scheduler = budget.for_project(protject_name) if budget is not None else BudgetScheduler(config, project=protject_name)
+    # built on the untouched after tree before any class is rewritten
+    with tracer.span("coverage.map", "maven", project=protject_name):
+        coverage = get_coverage_map(protject_name, config)
+    # baseline statuses are measured lazily, per test class, when a class first selects it
+    health = TestHealth.for_project(protject_name, config)
+    router = ModelRouter(config, llm_settings(config)[2])
+    generator_budgets = [PromptBudget(m, config) for m in router.escalation("generator")]
+
+    # Map class names to file paths once for all detected classes
+    with tracer.span("index.class_map", "parse", project=protject_name):
+        all_files = get_all_java_files(project_directory)
+        class_to_file = {}
+        for fpath in all_files:
+            cname = extract_class_name(fpath)
+            if cname:
+                class_to_file[cname] = fpath
+
+    # Prepare every class first so they can be ordered by estimated cost
+    prepared = {}
+    estimates = []
+    for target_class in god_classes:
+        try:
+            if not target_class:
+                continue
+            os.makedirs(f"results/{protject_name}/{target_class}", exist_ok=True)
+            graph_path = f"data/graphs/{protject_name}/{target_class}_dependency_graph.json"
+            with tracer.class_scope(target_class, protject_name):
+                with tracer.span("graph.build", "graph"):
+                    analyzer = JavaClassDependencyAnalyzer(target_class)
+                    analyzer.analyze_project(project_directory)
+                    analyzer.export_to_json(graph_path)
+                with tracer.span("graph.draw", "graph"):
+                    draw_dependency_graph(analyzer.dependencies, filename=f"data/graphs/{protject_name}/{target_class}_dependency_graph.png")
+
+            graph_dep = read_json_file(graph_path)
+            neighbor_classes = extract_ids(graph_dep)
+
+            bundle_files = [class_to_file.get(c) for c in neighbor_classes if class_to_file.get(c)]
+
+            target_file = class_to_file.get(target_class)
+            if not target_file:
+                print(f"Could not locate source file for {target_class}, skipping")
+                continue
 
-            except Exception as e:
-                print(f"Error while processing {target_class}: {e}")
+            before_code = parse_java_code(target_file)
+
+            # The rewrite replaces the whole file, so the class is never trimmed: only generator
+            # models whose window holds it, a carried candidate and a full rewrite are used
+            generator_models = [
+                b.model for b in generator_budgets
+                if b.fits(before_code, overhead_tokens=b.count(REFACTORING_GENERATOR_PROMPT) + config.PROMPT_RESERVE_TOKENS)
+            ]
+            if not generator_models:
+                limits = ", ".join(f"{b.model}: {b.limit}" for b in generator_budgets)
+                print(f"Skipping {target_class}: {generator_budgets[0].count(before_code)} tokens do not fit whole in any generator model ({limits} tokens)")
                 continue
 
-        # We've processed detected classes. Exit to avoid double-processing the original file-based loop.
-        sys.exit(0)
+            tests = [t for t in find_test_files(neighbor_classes) if t != "TestCase"]
+            prepared[target_class] = {
+                "graph_dep": graph_dep,
+                "neighbor_classes": neighbor_classes,
+                "bundle_files": bundle_files,
+                "target_file": target_file,
+                "before_code": before_code,
+                "generator_models": generator_models,
+                "module": build_module(protject_name, target_file),
+                "test_files": {t: class_to_file.get(t) for t in tests},
+                "coverage": coverage,
+                "health": health,
+            }
+            if coverage is not None:
+                tests = coverage.select(target_class, None, tests)
+            estimates.append(scheduler.estimate(target_class, before_code, test_count=len(tests), module=prepared[target_class]["module"]))
+        except Exception as e:
+            print(f"Error while preparing {target_class}: {e}")
+            continue
+
+    ordered = scheduler.order(estimates)
+    print(f"Processing order (cheapest first): {[e['class'] for e in ordered]}")
+
+    if runtime is None:
+        for estimate in ordered:
+            refactor_god_class(protject_name, estimate["class"], prepared[estimate["class"]], config, scheduler)
+    else:
+        futures = [
+            runtime.submit_class(protject_name, refactor_god_class, protject_name, e["class"], prepared[e["class"]], config, scheduler)
+            for e in ordered
+        ]
+        for future in futures:
+            future.result()
+
+    scheduler.save_build_times()
+    print(f"Run budget summary: {scheduler.summary()}")
+    export_dict_to_json(scheduler.summary(), f"results/{protject_name}/budget_summary.json")
+
 
+def process_all_files(protject_name, config):
+    """Legacy file-by-file workflow used when the detector is not available."""
+    results = {}
     #Identify the .java files in  REPO
     export_java_files_to_json(f"projects/before/{protject_name}", f"data/paths/{protject_name}/{protject_name}_files.json")
     files = read_json_file(f"data/paths/{protject_name}/{protject_name}_files.json")
@@ -237,7 +479,7 @@ if __name__ == "__main__":
             # Example usage with agents:
             api_key = config.API_KEY
             planner = PlannerAgent(api_key, model=config.MODEL_NAME)
-            refactoring_generator = RefactoringGeneratorAgent(api_key, model=config.MODEL_NAME)
+            refactoring_generator = RefactoringGeneratorAgent(api_key, model=config.MODEL_NAME, use_cache=False)
             compiler = CompilerAgent(api_key, model=config.MODEL_NAME)
             test_agent = TestAgent(api_key, model=config.MODEL_NAME)
 
@@ -281,7 +523,7 @@ if __name__ == "__main__":
 
                     print("-------------------- Compile the improved code ---------------------------------------")
 
-                    project_directory = f"projects_after/{protject_name}"
+                    project_directory = f"projects/after/{protject_name}"
                     # Use CompilerAgent to compile and (on failure) generate an LLM summary of the error.
                     is_compiled, compile_summary = compiler.compile_and_summarize(project_directory, Before_java_code, improvement)
                     if not is_compiled:
@@ -296,7 +538,7 @@ if __name__ == "__main__":
                         except Exception:
                             pass
                         # Print the summary for the user, but do not persist it to disk.
-                        print("Compilation summary (LLM):")
+                        print("Compilation feedback:")
                         print(compile_summary)
                         continue
 
@@ -334,7 +576,7 @@ if __name__ == "__main__":
                         except Exception:
                             pass
                         # Print the combined summary for visibility
-                        print("Combined test failure summary (LLM):")
+                        print("Test failure feedback:")
                         print(combined_summary)
                         continue
                     print("------------- Commit the code changes to github-------------------")
@@ -396,13 +638,58 @@ if __name__ == "__main__":
                 export_dict_to_json(results, f"results/{protject_name}/{target_class}/metrics")
         except:
             continue
-            
 
 
+def run_project(protject_name, config=None, runtime=None, budget=None):
+    """Run the RefAgent pipeline for one project folder in `projects/before`.
 
+    `budget` is a run-wide `BudgetScheduler` shared with other projects (batch mode);
+    without it the project gets its own token, cost and wall-clock budget.
+    """
+    config = config or Settings()
+    print("Starting RefAgent pipeline...")
 
+    #Prepare needed folders
+    os.makedirs(f"results/{protject_name}", exist_ok=True)
+    os.makedirs(f"data/paths/{protject_name}", exist_ok=True)
+    print(f"Created result directories for project: {protject_name}")
+
+    # Use detector-based workflow: detect god classes and process only god class + neighbors
+    try:
+        from refAgent.detector import Detector
+        detector = Detector(config)
+    except Exception as e:
+        print("Detector not available:", e)
+        detector = None
 
+    try:
+        with tracer.project_scope(protject_name):
+            if detector:
+                process_god_classes(protject_name, detector, config, runtime=runtime, budget=budget)
+            else:
+                process_all_files(protject_name, config)
+
+        if tracer.enabled:
+            tracer.export_chrome_trace(f"results/{protject_name}/trace.json", project=protject_name)
+    finally:
+        # a long batch process would otherwise keep (and re-export) every earlier project's spans
+        tracer.drain(protject_name)
+
+    cache = get_response_cache()
+    if cache is not None:
+        print(f"LLM response cache: {cache.stats()}")
+    hedges = hedge_stats()
+    if hedges["requests"]:
+        print(f"Hedged LLM requests: {hedges}")
 
 
+if __name__ == "__main__":
+    # === Parse project name argument ===
+    parser = argparse.ArgumentParser(description="Refactor Java Project")
+    parser.add_argument("project_name", type=str, help="Name of the project folder (e.g. accumulo-2.1)")
+    args = parser.parse_args()
 
-        
+    try:
+        run_project(args.project_name, Settings())
+    finally:
+        client_manager.close_all()
@@ -1,9 +1,20 @@
 from refAgent.OpenaiLLM import OpenAILLM
 from refAgent.GroqLLM import GroqLLM
+from refAgent.LocalLLM import LocalLLM
 from refAgent.prompt import REFACTORING_GENERATOR_PROMPT, PLANNER_PROMPT, COMPILER_PROMPT, TEST_SUMMARY_PROMPT, MULTI_TEST_SUMMARY_PROMPT
-from utilities import compile_project_with_maven, run_maven_test
+from utilities import compile_project_with_maven, run_maven_test, run_maven_tests
+from refAgent import surefire
+from refAgent.feedback import compile_feedback, test_feedback
+from refAgent.maven import parse_errors
+from refAgent.compile_server import compile_changed_file
+import time
 from typing import Optional
 from settings import Settings
+from refAgent.tracing import tracer
+from refAgent.errors import LLMError
+from refAgent.memory import ConversationMemory
+from refAgent.stream_validators import JavaClassStreamValidator
+from refAgent.hedging import Hedger
 
 # Load settings once for default token limits
 _config = Settings()
@@ -15,26 +26,112 @@ class BaseAgent:
     Subclasses can reuse `send` to call the LLM and get a cleaned text reply.
     """
 
-    def __init__(self, api_key: str, model: str = "gpt-4", max_tokens: Optional[int] = None, provider: str = 'openai'):
+    # task name used for model routing and hedging (`MODEL_ROUTES`, `LLM_HEDGE_AGENTS`)
+    task = None
+
+    def __init__(self, api_key: str, model: str = "gpt-4", max_tokens: Optional[int] = None, provider: str = 'openai', use_cache: bool = True, hedge: Optional[bool] = None):
         if provider == 'groq':
             self.llm = GroqLLM(api_key)
             self.provider = 'groq'
+        elif provider == 'local':
+            self.llm = LocalLLM(api_key)
+            self.provider = 'local'
         else:
             self.llm = OpenAILLM(api_key)
             self.provider = 'openai'
+        # bypass the on-disk response cache (refAgent.llm_cache) when fresh samples are needed
+        self.llm.use_cache = use_cache
+        # also sizes the conversation memory for the model (see the `model` setter)
         self.model = model
+        # race slow replies against a secondary provider (default: task listed in LLM_HEDGE_AGENTS)
+        if hedge is None:
+            hedge = self.task in _config.LLM_HEDGE_AGENTS
+        if hedge:
+            self.llm.hedge = Hedger.from_settings(_config)
         # per-agent max tokens (fallback to global default)
         self.max_tokens = max_tokens if max_tokens is not None else _config.DEFAULT_MAX_TOKENS
+        # optional run budget (refAgent.budget.BudgetScheduler) charged with every call's token usage
+        self.budget = None
+
+    @property
+    def model(self) -> str:
+        return self._model
+
+    @model.setter
+    def model(self, model: str):
+        """Switch the agent's model, e.g. when the router escalates it.
+
+        The conversation memory (LLM_MEMORY_*) is rebuilt for the new model: its cap
+        and token counts depend on the model's window. The full history stays on
+        self.llm, so nothing of the conversation is lost.
+        """
+        if getattr(self, "_model", None) == model:
+            return
+        self._model = model
+        self.llm.memory = ConversationMemory.from_settings(_config, model=model)
 
-    def send(self, system_prompt: Optional[str], user_query: str, max_tokens: Optional[int] = None) -> str:
+    def send(self, system_prompt: Optional[str], user_query: str, max_tokens: Optional[int] = None, validator=None,
+             model: Optional[str] = None) -> str:
         """Call the underlying LLM and return a cleaned string reply.
 
         This method strips surrounding triple-backtick code fences if present.
+        With a `validator` factory the reply is streamed and re-requested as soon
+        as the validator rejects it. `model` overrides the agent's model for this
+        call (e.g. a fast model for a yes/no decision).
         """
         # prefer explicit call-time max_tokens, otherwise use agent default
         tokens = max_tokens if max_tokens is not None else self.max_tokens
-        reply = self.llm.query_llm(system_prompt, user_query, model=self.model, max_tokens=tokens)
-
+        model = model or self.model
+        with tracer.span(f"{type(self).__name__}.send", "llm", model=model, max_tokens=tokens) as span:
+            if validator is not None:
+                reply = self.llm.query_llm(system_prompt, user_query, model=model, max_tokens=tokens, validator=validator)
+                span["stream_aborts"] = getattr(self.llm, "last_stream_aborts", 0)
+            else:
+                reply = self.llm.query_llm(system_prompt, user_query, model=model, max_tokens=tokens)
+            usage = getattr(self.llm, "last_usage", None)
+            if usage:
+                span.update(usage)
+            span["cache_hit"] = getattr(self.llm, "last_cache_hit", False)
+            if getattr(self.llm, "last_hedge", None):
+                span.update({f"hedge_{k}": v for k, v in self.llm.last_hedge.items()})
+            # a hedged request may have been answered (and billed) by the secondary model
+            answered = getattr(self.llm, "last_model", None) or model
+            span["model"] = answered
+        if self.budget is not None:
+            self.budget.record_usage(answered, usage)
+            hedge = getattr(self.llm, "last_hedge", None) or {}
+            if hedge.get("loser_usage"):
+                # the cancelled duplicate of a hedged request was paid for as well
+                self.budget.record_usage(hedge["loser_model"], hedge["loser_usage"])
+
+        return self._clean_reply(reply)
+
+    async def asend(self, system_prompt: Optional[str], user_query: str, max_tokens: Optional[int] = None,
+                    model: Optional[str] = None) -> str:
+        """Async variant of `send` built on the wrapper's `aquery_llm`.
+
+        Requests to one provider are limited by its semaphore (`LLM_MAX_CONCURRENCY`);
+        cancelling the awaiting task cancels the request. An agent keeps a single
+        conversation, so run concurrent requests on separate agents. Usage is billed
+        to the model that answered, as in `send`.
+        """
+        tokens = max_tokens if max_tokens is not None else self.max_tokens
+        model = model or self.model
+        with tracer.span(f"{type(self).__name__}.asend", "llm", model=model, max_tokens=tokens) as span:
+            reply = await self.llm.aquery_llm(system_prompt, user_query, model=model, max_tokens=tokens)
+            usage = getattr(self.llm, "last_usage", None)
+            if usage:
+                span.update(usage)
+            span["cache_hit"] = getattr(self.llm, "last_cache_hit", False)
+            answered = getattr(self.llm, "last_model", None) or model
+            span["model"] = answered
+        if self.budget is not None:
+            self.budget.record_usage(answered, usage)
+
+        return self._clean_reply(reply)
+
+    @staticmethod
+    def _clean_reply(reply):
         if not isinstance(reply, str):
             return reply
 
@@ -55,14 +152,26 @@ class RefactoringGeneratorAgent(BaseAgent):
     can be provided per-call.
     """
 
-    def __init__(self, api_key: str, model: str = "gpt-4", max_tokens: Optional[int] = None, provider: str = 'groq'):
+    task = "generator"
+
+    def __init__(self, api_key: str, model: str = "gpt-4", max_tokens: Optional[int] = None, provider: str = 'groq', use_cache: bool = True, hedge: Optional[bool] = None):
         # default to configured refactoring generator max tokens
         default = _config.REFRACTORING_GENERATOR_MAX_TOKENS if max_tokens is None else max_tokens
-        super().__init__(api_key, model=model, max_tokens=default, provider=provider)
+        super().__init__(api_key, model=model, max_tokens=default, provider=provider, use_cache=use_cache, hedge=hedge)
+
+    def run(self, user_query: str, use_refactoring_generator_prompt: bool = True, prompt_override: Optional[str] = None, max_tokens: Optional[int] = None,
+            class_name: Optional[str] = None):
+        """Generate the refactored class.
 
-    def run(self, user_query: str, use_refactoring_generator_prompt: bool = True, prompt_override: Optional[str] = None, max_tokens: Optional[int] = None):
+        When `class_name` is given (and `LLM_STREAM_GENERATOR` is on) the reply is
+        streamed and abandoned early if it is not a fenced `java` block declaring
+        `class_name` with balanced braces.
+        """
         system_prompt = prompt_override if prompt_override is not None else (REFACTORING_GENERATOR_PROMPT if use_refactoring_generator_prompt else None)
-        return self.send(system_prompt, user_query, max_tokens=max_tokens)
+        validator = None
+        if class_name and _config.LLM_STREAM_GENERATOR:
+            validator = lambda: JavaClassStreamValidator(class_name)
+        return self.send(system_prompt, user_query, max_tokens=max_tokens, validator=validator)
 
 
 
@@ -73,9 +182,11 @@ class PlannerAgent(BaseAgent):
     This agent follows the planner prompt pattern used in `RefAgent_main.py`.
     """
 
-    def __init__(self, api_key: str, model: str = "gpt-4", max_tokens: Optional[int] = None, provider: str = 'groq'):
+    task = "planner"
+
+    def __init__(self, api_key: str, model: str = "gpt-4", max_tokens: Optional[int] = None, provider: str = 'groq', use_cache: bool = True, hedge: Optional[bool] = None):
         default = _config.PLANNER_MAX_TOKENS if max_tokens is None else max_tokens
-        super().__init__(api_key, model=model, max_tokens=default, provider=provider)
+        super().__init__(api_key, model=model, max_tokens=default, provider=provider, use_cache=use_cache, hedge=hedge)
 
     def analyze_methods(self, java_code: str, cko_metrics: str, max_tokens: Optional[int] = None) -> str:
         """Return the planner instruction JSON as produced by the LLM.
@@ -111,8 +222,23 @@ class PlannerAgent(BaseAgent):
         return self.send(system_prompt, query, max_tokens=max_tokens)
 
 
+def _summarize_with_llm(feedback: str) -> bool:
+    """Whether a failure is summarized by the LLM (`LLM_FAILURE_SUMMARY`) given its parsed feedback."""
+    mode = (_config.LLM_FAILURE_SUMMARY or "off").lower()
+    return mode == "always" or (mode == "fallback" and not feedback)
+
+
+def _test_failure_feedback(process, failed: list) -> str:
+    """Parsed feedback for a failed test run: the failing tests, or the errors of tests that did not compile."""
+    if failed:
+        return test_feedback(failed)
+    if any(error["file"] for error in process.errors):
+        return compile_feedback(process.errors)
+    return ""
+
+
 class CompilerAgent(BaseAgent):
-    """Agent that compiles a Maven project and summarizes compilation errors using the LLM.
+    """Agent that compiles a Maven project and reports compilation errors (parsed, or summarized by the LLM).
 
     Usage:
         compiler = CompilerAgent(api_key)
@@ -120,41 +246,74 @@ class CompilerAgent(BaseAgent):
 
     Returns:
         (is_compiled: bool, summary: str) - when compilation fails, `summary` contains the
-        LLM-produced summary/suggestions; when compilation succeeds, `summary` is an empty string.
+        parsed errors (see `refAgent.feedback`) or, per `LLM_FAILURE_SUMMARY`, an LLM-produced
+        summary/suggestions; when compilation succeeds, `summary` is an empty string.
     """
 
-    def __init__(self, api_key: str, model: str = "gpt-4", max_tokens: Optional[int] = None, provider: str = 'groq'):
+    task = "compile_summary"
+
+    def __init__(self, api_key: str, model: str = "gpt-4", max_tokens: Optional[int] = None, provider: str = 'groq', use_cache: bool = True, hedge: Optional[bool] = None):
         default = _config.COMPILER_MAX_TOKENS if max_tokens is None else max_tokens
-        super().__init__(api_key, model=model, max_tokens=default, provider=provider)
+        super().__init__(api_key, model=model, max_tokens=default, provider=provider, use_cache=use_cache, hedge=hedge)
+        # ('server' or 'maven', seconds) of the last compile, without the summary
+        self.last_build = None
 
-    def compile_and_summarize(self, project_directory: str, original_code: str, refactored_code: str, max_tokens: Optional[int] = None):
-        """Compile the project and if compilation fails, ask the LLM to summarize the error.
+    def compile_and_summarize(self, project_directory: str, original_code: str, refactored_code: str, max_tokens: Optional[int] = None,
+                              changed_file: Optional[str] = None, related_files: Optional[list] = None):
+        """Compile the project and if compilation fails, describe the errors.
 
         Args:
             project_directory: Path to the Maven project to compile.
             original_code: The original Java source (or relevant files) to attach to the prompt.
             max_tokens: Max tokens to request from the LLM when summarizing.
+            changed_file: The rewritten file; when given (and `COMPILE_SERVER_ENABLED`) only it and
+                `related_files` are compiled by the warm compile server, falling back to a Maven
+                build of their modules.
+            related_files: Sources using the changed class, recompiled with it.
 
         Returns:
             (is_compiled: bool, summary: str)
         """
-        is_compiled, stderr = compile_project_with_maven(project_directory)
+        started = time.monotonic()
+        fast = None
+        if changed_file and _config.COMPILE_SERVER_ENABLED:
+            with tracer.span("compile.server", "maven", file=changed_file):
+                fast = compile_changed_file(changed_file, related_files)
+        if fast is not None:
+            is_compiled, stderr = fast
+        else:
+            # only the modules of the changed class and its neighbours (plus upstream modules) are built
+            is_compiled, stderr = compile_project_with_maven(
+                project_directory, changed_files=[changed_file] + list(related_files or []) if changed_file else None,
+            )
+        self.last_build = ("server" if fast is not None else "maven", time.monotonic() - started)
 
         if is_compiled:
             return True, ""
 
+        errors = parse_errors(stderr or "")
+        # a bare "Failed to execute goal" (e.g. unresolvable dependencies) is not something to parse
+        feedback = compile_feedback(errors, changed_file=changed_file, code=refactored_code) if any(e["file"] for e in errors) else ""
+        if not _summarize_with_llm(feedback):
+            return False, feedback or stderr
+
         # Use the shared compiler prompt from prompt.py
         system_prompt = COMPILER_PROMPT
 
-        user_query = f"Compilation stderr:\n{stderr}\n\nOriginal Java code :\n{original_code}.\n\nRefactored Relevant Java code:\n{refactored_code}"
+        user_query = f"Compilation stderr:\n{feedback or stderr}\n\nOriginal Java code :\n{original_code}.\n\nRefactored Relevant Java code:\n{refactored_code}"
 
-        summary = self.send(system_prompt, user_query, max_tokens=max_tokens)
+        try:
+            summary = self.send(system_prompt, user_query, max_tokens=max_tokens)
+        except LLMError as e:
+            # Summaries are best effort: fall back to the parsed errors or the raw compiler output
+            print(f"Compiler summary unavailable ({e}), using the compiler errors")
+            summary = feedback or stderr
 
         return False, summary
 
 
 class TestAgent(BaseAgent):
-    """Agent that runs Maven tests and summarizes failures using the LLM.
+    """Agent that runs Maven tests and reports failures (parsed, or summarized by the LLM).
 
     Usage:
         tester = TestAgent(api_key)
@@ -162,24 +321,35 @@ class TestAgent(BaseAgent):
 
     Returns:
         (process: subprocess.CompletedProcess, summary: str) - when test fails, `summary` contains the
-        LLM-produced JSON summary/suggestions; when test passes, `summary` is an empty string.
+        parsed failures or, per `LLM_FAILURE_SUMMARY`, an LLM-produced JSON summary/suggestions;
+        when test passes, `summary` is an empty string.
     """
 
-    def __init__(self, api_key: str, model: str = "gpt-4", max_tokens: Optional[int] = None, provider: str = 'groq'):
+    task = "test_summary"
+
+    def __init__(self, api_key: str, model: str = "gpt-4", max_tokens: Optional[int] = None, provider: str = 'groq', use_cache: bool = True, hedge: Optional[bool] = None):
         default = _config.TEST_MAX_TOKENS if max_tokens is None else max_tokens
-        super().__init__(api_key, model=model, max_tokens=default, provider=provider)
+        super().__init__(api_key, model=model, max_tokens=default, provider=provider, use_cache=use_cache, hedge=hedge)
+
+    def run_test_and_summarize(self, class_name: str, project_dir: str = '.', method_name: str = None, original_code: str = '',refactored_code:str = '', verify: bool = False, max_tokens: Optional[int] = None,
+                               test_file: Optional[str] = None):
+        """Run `mvn test` (optionally for a single class/method). If the test process fails, describe the failures.
 
-    def run_test_and_summarize(self, class_name: str, project_dir: str = '.', method_name: str = None, original_code: str = '',refactored_code:str = '', verify: bool = False, max_tokens: Optional[int] = None):
-        """Run `mvn test` (optionally for a single class/method). If the test process fails, ask the LLM to summarize the failure.
+        `test_file` (the test's source file) limits the build to its reactor module.
 
         Returns:
-            (process: CompletedProcess, summary: str)
+            (process: MavenResult, summary: str)
         """
-        process = run_maven_test(class_name, method_name=method_name, project_dir=project_dir, verify=verify)
+        process = run_maven_test(class_name, method_name=method_name, project_dir=project_dir, verify=verify,
+                                 changed_files=[test_file] if test_file else None)
 
         if process.returncode == 0:
             return process, ""
 
+        feedback = _test_failure_feedback(process, surefire.failures(process.collected))
+        if not _summarize_with_llm(feedback):
+            return process, feedback or process.error_text()
+
         # Build prompt and call LLM to summarize the test failure
         # Include both original and refactored code in the prompt when available to help diagnose regressions
         code_block = ""
@@ -188,27 +358,65 @@ class TestAgent(BaseAgent):
         if refactored_code:
             code_block += f"Refactored Java code:\n{refactored_code}\n\n"
 
-        user_query = f"Test stderr:\n{process.stderr}\n\n{code_block}Respond in JSON as described."
+        user_query = f"Test stderr:\n{feedback or process.error_text()}\n\n{code_block}Respond in JSON as described."
 
         system_prompt = TEST_SUMMARY_PROMPT
 
-        summary = self.send(system_prompt, user_query, max_tokens=max_tokens)
+        try:
+            summary = self.send(system_prompt, user_query, max_tokens=max_tokens)
+        except LLMError as e:
+            print(f"Test summary unavailable ({e}), using the parsed failures")
+            summary = feedback or process.error_text()
         return process, summary
 
-    def combine_summaries(self, summaries: list, original_code: str = '', refactored_code: str = '', max_tokens: Optional[int] = None) -> str:
-        """Combine multiple test failure summaries into one using the LLM.
+    def run_tests_and_summarize(self, class_names: list, project_dir: str = '.', original_code: str = '', refactored_code: str = '',
+                                max_tokens: Optional[int] = None, test_files: Optional[list] = None, health=None):
+        """Run all `class_names` in one Maven invocation and describe the failures.
+
+        Failures are read from the Surefire XML reports; when the run failed without
+        any failing test (e.g. the tests did not compile) the Maven errors are used.
+        With a `refAgent.test_health.TestHealth`, failures of tests that already fail
+        or are flaky on the baseline are left out of the summary.
+
+        Returns:
+            (process: MavenResult with per-test outcomes in `collected`, summary: str)
+        """
+        process = run_maven_tests(class_names, project_dir=project_dir, changed_files=test_files,
+                                  fork_count=_config.TEST_FORK_COUNT)
+        failed = surefire.failures(process.collected)
+        broken = process.returncode != 0 and not failed
+        if health is not None:
+            failed = health.new_failures(failed)
+        if not failed and not broken:
+            return process, ""
+
+        feedback = _test_failure_feedback(process, failed)
+        if not _summarize_with_llm(feedback):
+            return process, feedback or process.error_text()
+        return process, self.combine_summaries([feedback or process.error_text()], original_code=original_code,
+                                               refactored_code=refactored_code, max_tokens=max_tokens, summarize=True)
+
+    def combine_summaries(self, summaries: list, original_code: str = '', refactored_code: str = '', max_tokens: Optional[int] = None,
+                          summarize: Optional[bool] = None) -> str:
+        """Combine multiple test failure summaries into one.
 
         Args:
             summaries: List of strings (individual summaries or stderr snippets).
             original_code: Optional original Java source for context.
             refactored_code: Optional refactored Java source for context.
+            summarize: Ask the LLM to synthesize them (default: only when `LLM_FAILURE_SUMMARY` is
+                'always'); otherwise they are joined as they are.
 
         Returns:
-            A single LLM-produced summary string (JSON-like) combining the inputs.
+            A single summary string combining the inputs (JSON-like when produced by the LLM).
         """
         system_prompt = MULTI_TEST_SUMMARY_PROMPT
 
         joined = "\n---\n".join([s for s in summaries if s])
+        if summarize is None:
+            summarize = (_config.LLM_FAILURE_SUMMARY or "off").lower() == "always"
+        if not summarize:
+            return joined
 
         code_block = ""
         if original_code:
@@ -218,5 +426,9 @@ class TestAgent(BaseAgent):
 
         user_query = f"Multiple test failure reports:\n{joined}\n\n{code_block}Respond in JSON as described."
 
-        combined = self.send(system_prompt, user_query, max_tokens=max_tokens)
+        try:
+            combined = self.send(system_prompt, user_query, max_tokens=max_tokens)
+        except LLMError as e:
+            print(f"Combined test summary unavailable ({e}), joining individual summaries")
+            combined = joined
         return combined
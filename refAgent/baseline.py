@@ -0,0 +1,142 @@
+"""
+Shared baseline build per project commit.
+
+Every fresh `projects/after/<project>` (and every workspace made from it) used
+to start with `mvn clean install`, which re-resolves dependencies and
+recompiles every module. `BaselineBuild` runs the cold build once per project
+commit:
+
+1. `dependency:go-offline` resolves plugins and dependencies into the shared
+   local repository (`MAVEN_LOCAL_REPO`, default `~/.m2/repository`).
+2. `install -DskipTests` builds every module and installs the artifacts there.
+3. Every module's `target/` is saved under `BUILD_CACHE_DIR/<project>/<commit>`.
+
+Later runs of the same commit restore the saved `target/` directories into the
+tree instead of building. Iteration compiles no longer `clean`
+(`MAVEN_CLEAN_COMPILE`), so only changed modules are recompiled.
+
+Usage:
+    python -m refAgent.baseline jclouds     # build or restore projects/after/jclouds
+"""
+import sys
+import os
+
+# Add parent directory to path so relative imports work
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import shutil
+import time
+from typing import List, Optional
+
+from refAgent.coverage import project_commit
+from refAgent.maven import MavenRunner
+from refAgent.tracing import tracer
+from settings import Settings
+
+_config = Settings()
+
+MARKER = "build.json"
+
+
+def build_dirs(project_dir: str) -> List[str]:
+    """`target/` directories of a tree, relative to it."""
+    found = []
+    for root, dirs, _ in os.walk(project_dir):
+        dirs[:] = [d for d in dirs if d != ".git"]
+        if "target" in dirs:
+            found.append(os.path.relpath(os.path.join(root, "target"), project_dir))
+            dirs.remove("target")
+    return sorted(found)
+
+
+class BaselineBuild:
+    """The cached baseline build of one project commit.
+
+    Args:
+        project_name: Folder name under `projects/before` / `projects/after`.
+        config: Settings with `BUILD_CACHE_DIR` and the Maven options.
+    """
+
+    def __init__(self, project_name: str, config: Optional[Settings] = None):
+        self.project_name = project_name
+        self.config = config or _config
+        self.commit = project_commit(f"projects/before/{project_name}")
+        self.cache_dir = os.path.join(self.config.BUILD_CACHE_DIR, project_name, self.commit) if self.commit else None
+
+    @property
+    def cached(self) -> bool:
+        return bool(self.cache_dir) and os.path.isfile(os.path.join(self.cache_dir, MARKER))
+
+    def restore(self, project_dir: str) -> int:
+        """Copy the saved `target/` directories into `project_dir`; returns how many were restored.
+
+        They are copied, not linked, because Maven rewrites class files in place.
+        """
+        with open(os.path.join(self.cache_dir, MARKER), "r", encoding="utf-8") as f:
+            marker = json.load(f)
+        for relative in marker["build_dirs"]:
+            dest = os.path.join(project_dir, relative)
+            shutil.rmtree(dest, ignore_errors=True)
+            shutil.copytree(os.path.join(self.cache_dir, "targets", relative), dest, symlinks=True)
+        return len(marker["build_dirs"])
+
+    def save(self, project_dir: str, seconds: float):
+        """Store the `target/` directories of a freshly built `project_dir`."""
+        if not self.cache_dir:
+            return
+        staging = f"{self.cache_dir}.tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        dirs = build_dirs(project_dir)
+        for relative in dirs:
+            shutil.copytree(os.path.join(project_dir, relative), os.path.join(staging, "targets", relative), symlinks=True)
+        with open(os.path.join(staging, MARKER), "w", encoding="utf-8") as f:
+            json.dump({"commit": self.commit, "build_seconds": round(seconds, 1), "build_dirs": dirs}, f, indent=2)
+        # publish the whole cache entry at once so a crash never leaves a half-saved build
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        os.makedirs(os.path.dirname(self.cache_dir), exist_ok=True)
+        os.replace(staging, self.cache_dir)
+
+    def ensure(self, project_dir: Optional[str] = None) -> bool:
+        """Make `project_dir` (default `projects/after/<project>`) a built baseline.
+
+        Returns False when the build failed.
+        """
+        project_dir = project_dir or f"projects/after/{self.project_name}"
+        if self.cached:
+            with tracer.span("baseline.restore", "maven", project=self.project_name):
+                restored = self.restore(project_dir)
+            print(f"Restored {restored} build directories of {self.project_name}@{self.commit[:12]} from {self.cache_dir}")
+            return True
+
+        runner = MavenRunner(project_dir, self.config)
+        started = time.monotonic()
+        with tracer.span("baseline.go_offline", "maven", project=self.project_name):
+            offline = runner.run("go-offline", ["dependency:go-offline"])
+        if not offline.ok:
+            # some plugins resolve lazily; the install below still resolves what it needs
+            print(f"dependency:go-offline failed for {self.project_name}: {offline.error_text(5)}")
+        with tracer.span("baseline.install", "maven", project=self.project_name):
+            build = runner.run("build", ["clean", "install"], properties={"skipTests": "true"})
+        if not build.ok:
+            print(f"Baseline build of {self.project_name} failed:\n{build.error_text()}")
+            return False
+        seconds = time.monotonic() - started
+        print(f"Baseline build of {self.project_name} took {seconds:.1f}s")
+        self.save(project_dir, seconds)
+        return True
+
+
+def ensure_baseline(project_name: str, project_dir: Optional[str] = None, config: Optional[Settings] = None) -> bool:
+    """Build `projects/after/<project>` once per commit, restoring the cached build afterwards."""
+    return BaselineBuild(project_name, config).ensure(project_dir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build (or restore the cached build of) projects/after/<project>")
+    parser.add_argument("project_name", help="Project folder name, e.g. jclouds")
+    parser.add_argument("--project-dir", default=None, help="Tree to build (default projects/after/<project>)")
+    args = parser.parse_args()
+
+    sys.exit(0 if ensure_baseline(args.project_name, args.project_dir) else 1)
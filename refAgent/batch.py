@@ -0,0 +1,204 @@
+"""
+Batch mode - refactor every project listed in `data/repositories.txt` from one
+long-lived process.
+
+Each line of the repositories file is `<org/repo> <tag>`. Projects are cloned
+into `projects/before/<repo>`, hardlinked to `projects/after/<repo>`, built once per commit and
+then handed to `RefAgent_main.run_project`. Python start-up, heavy imports, LLM
+clients and the Maven local repository are shared by every project.
+
+Usage:
+    python -m refAgent.batch
+    python -m refAgent.batch data/repositories.txt --only jclouds accumulo
+"""
+import sys
+import os
+
+# Add parent directory to path so relative imports work
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import git
+
+from settings import Settings
+from refAgent.baseline import ensure_baseline
+from refAgent.budget import BudgetScheduler
+from refAgent.RefAgent_main import run_project
+from refAgent.clients import client_manager
+from refAgent.workspace import create_workspace
+
+
+def read_repositories(file_path):
+    """Parse a repositories file into a list of (org/repo, tag) tuples.
+
+    Blank lines and lines starting with `#` are ignored.
+    """
+    repositories = []
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            parts = line.split()
+            org_repo = parts[0]
+            tag = parts[1] if len(parts) > 1 else None
+            repositories.append((org_repo, tag))
+    return repositories
+
+
+class BatchRuntime:
+    """Resources shared by every project processed in one batch run.
+
+    - a project pool running up to `BATCH_MAX_PROJECTS` projects at once
+    - a class worker pool (`BATCH_MAX_WORKERS`) shared by all projects
+    - a per-project queue: at most `BATCH_PER_PROJECT_CONCURRENCY` classes of a
+      project are on the worker pool at once, the next one is submitted when one
+      finishes, so a project's waiting classes never hold pool workers
+    - one run budget (`BUDGET_MAX_*`) for the whole batch, so token, cost and
+      wall-clock limits bound the batch rather than each repository
+    """
+
+    def __init__(self, config: Settings = None):
+        self.config = config or Settings()
+        self.project_pool = ThreadPoolExecutor(max_workers=max(1, self.config.BATCH_MAX_PROJECTS), thread_name_prefix="project")
+        self.worker_pool = ThreadPoolExecutor(max_workers=max(1, self.config.BATCH_MAX_WORKERS), thread_name_prefix="class")
+        self._running = {}
+        self._queued = {}
+        self._lock = threading.Lock()
+        self.budget = BudgetScheduler(self.config)
+
+        if self.config.MAVEN_LOCAL_REPO:
+            os.makedirs(self.config.MAVEN_LOCAL_REPO, exist_ok=True)
+
+    def submit_class(self, project_name, fn, *args, **kwargs):
+        """Run `fn` on the shared worker pool within the project's concurrency limit.
+
+        Returns a Future that completes with `fn`'s result once it has run.
+        """
+        future = Future()
+        with self._lock:
+            self._queued.setdefault(project_name, deque()).append((future, fn, args, kwargs))
+        self._dispatch(project_name)
+        return future
+
+    def _dispatch(self, project_name):
+        """Move queued classes of `project_name` to the worker pool while it is under its limit."""
+        limit = max(1, self.config.BATCH_PER_PROJECT_CONCURRENCY)
+        while True:
+            with self._lock:
+                queue = self._queued.get(project_name)
+                if not queue or self._running.get(project_name, 0) >= limit:
+                    return
+                future, fn, args, kwargs = queue.popleft()
+                if not future.set_running_or_notify_cancel():
+                    continue
+                self._running[project_name] = self._running.get(project_name, 0) + 1
+            self.worker_pool.submit(self._run_class, project_name, future, fn, args, kwargs)
+
+    def _run_class(self, project_name, future, fn, args, kwargs):
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._running[project_name] -= 1
+            self._dispatch(project_name)
+
+    def submit_project(self, fn, *args, **kwargs):
+        return self.project_pool.submit(fn, *args, **kwargs)
+
+    def shutdown(self):
+        self.project_pool.shutdown(wait=True)
+        self.worker_pool.shutdown(wait=True)
+
+
+def prepare_project(org_repo, tag, skip_build=False):
+    """Clone `org_repo` at `tag` (once), copy it to the `after` tree and build it.
+
+    Returns:
+        The project name (repository name) or None when preparation failed.
+    """
+    repo = org_repo.split("/")[-1]
+    before_path = f"projects/before/{repo}"
+    after_path = f"projects/after/{repo}"
+
+    if os.path.isdir(before_path):
+        print(f"Project already exists at {before_path}. Skipping clone.")
+    else:
+        print(f"Cloning tag '{tag}' from {org_repo} into {before_path}...")
+        os.makedirs(os.path.dirname(before_path), exist_ok=True)
+        try:
+            kwargs = {"depth": 1}
+            if tag:
+                kwargs["branch"] = tag
+            git.Repo.clone_from(f"https://github.com/{org_repo}.git", before_path, **kwargs)
+        except Exception as e:
+            print(f"Failed to clone {org_repo}@{tag}: {e}")
+            return None
+
+    print(f"Creating workspace {after_path}...")
+    # hardlinked, so the after tree survives the process (an overlay mount would not)
+    create_workspace(before_path, after_path, strategy="hardlink")
+
+    # built once per commit; later runs restore the cached target/ directories
+    if not skip_build and not ensure_baseline(repo, after_path):
+        return None
+    return repo
+
+
+def process_repository(org_repo, tag, config, runtime, skip_build=False):
+    project_name = prepare_project(org_repo, tag, skip_build=skip_build)
+    if not project_name:
+        return org_repo, False
+    try:
+        run_project(project_name, config, runtime=runtime, budget=runtime.budget)
+        return org_repo, True
+    except Exception as e:
+        print(f"Error while processing project {project_name}: {e}")
+        return org_repo, False
+
+
+def run_batch(repositories, config=None, skip_build=False):
+    """Process every (org/repo, tag) pair, sharing one `BatchRuntime`.
+
+    Returns:
+        dict mapping `org/repo` to True (processed) or False (failed).
+    """
+    config = config or Settings()
+    runtime = BatchRuntime(config)
+    outcomes = {}
+    try:
+        futures = [
+            runtime.submit_project(process_repository, org_repo, tag, config, runtime, skip_build)
+            for org_repo, tag in repositories
+        ]
+        for future in futures:
+            org_repo, ok = future.result()
+            outcomes[org_repo] = ok
+    finally:
+        runtime.shutdown()
+        client_manager.close_all()
+    print(f"Batch budget summary: {runtime.budget.summary()}")
+    return outcomes
+
+
+if __name__ == "__main__":
+    config = Settings()
+    parser = argparse.ArgumentParser(description="Refactor many Java projects in one process")
+    parser.add_argument("repositories", nargs="?", default=config.REPOSITORIES_FILE, help="File with one '<org/repo> <tag>' per line")
+    parser.add_argument("--only", nargs="*", default=None, help="Restrict to these repository names")
+    parser.add_argument("--skip-build", action="store_true", help="Do not build or restore the baseline build")
+    args = parser.parse_args()
+
+    repositories = read_repositories(args.repositories)
+    if args.only:
+        repositories = [r for r in repositories if r[0].split("/")[-1] in args.only]
+
+    outcomes = run_batch(repositories, config, skip_build=args.skip_build)
+    for org_repo, ok in outcomes.items():
+        print(f"{'OK    ' if ok else 'FAILED'} {org_repo}")
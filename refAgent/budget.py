@@ -0,0 +1,285 @@
+"""
+Run budget scheduler - enforces global token, cost and wall-clock budgets
+across all god classes processed in a run, orders classes by estimated cost
+and hands unused refinement iterations to classes that are making progress.
+"""
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+from refAgent.prompt_budget import count_tokens
+from settings import Settings
+
+# suffix of the build-time keys holding the average test time per test class
+_TEST_KEY = "#tests"
+
+
+class BudgetScheduler:
+    """Global budget and iteration scheduler for one RefAgent run.
+
+    Usage:
+        scheduler = BudgetScheduler(config, project="jclouds")
+        estimates = [scheduler.estimate(name, code, test_count=len(tests)) for ...]
+        for estimate in scheduler.order(estimates):
+            while scheduler.next_iteration(estimate["class"]):
+                ...
+                scheduler.mark_progress(estimate["class"], compiled=True)
+            scheduler.finish_class(estimate["class"])
+
+    A limit of 0 (or 0.0) disables the corresponding global budget. A batch of
+    projects shares one run budget: `for_project` returns the scheduler of one
+    project's classes, charging tokens, cost and wall-clock time to the run.
+    """
+
+    def __init__(self, config: Settings = None, project: Optional[str] = None, parent: Optional["BudgetScheduler"] = None):
+        self.config = config or (parent.config if parent else Settings())
+        self.project = project
+        # token, cost and wall-clock totals and the build times belong to the whole run
+        self._run = parent._run if parent else self
+        self._lock = parent._lock if parent else threading.Lock()
+        if parent is None:
+            self._started_at = time.monotonic()
+            self._tokens_used = 0
+            self._cost_used = 0.0
+            self.build_times = self._load_build_times()
+        else:
+            self.build_times = parent.build_times
+        self.iterations_used = 0
+        self.allowance = {}
+        self.used = {}
+        self.progress = {}
+        self.reserve = 0
+        self._estimates = {}
+
+    def for_project(self, project: str) -> "BudgetScheduler":
+        """Scheduler for the classes of `project`, sharing this run's budget and build times."""
+        return BudgetScheduler(project=project, parent=self)
+
+    @property
+    def started_at(self) -> float:
+        return self._run._started_at
+
+    @property
+    def tokens_used(self) -> int:
+        return self._run._tokens_used
+
+    @property
+    def cost_used(self) -> float:
+        return self._run._cost_used
+
+    # ------------------------------------------------------------------
+    # Estimation and ordering
+    # ------------------------------------------------------------------
+    def estimate(self, class_name: str, code: str, test_count: int = 0, module: Optional[str] = None) -> dict:
+        """Estimate the cost of refactoring one class from its index metrics.
+
+        Args:
+            class_name: Name of the target class.
+            code: Source of the target class (used for size).
+            test_count: Number of test classes that will run per iteration.
+            module: Build module key for the recorded build time (defaults to the project).
+
+        Returns:
+            dict with the class name, per-iteration token/USD/second estimates and
+            the totals for the base iteration allowance.
+        """
+        code_tokens = count_tokens(code or "", self._model())
+        # generator query + generator reply + one feedback summary per iteration
+        iteration_tokens = code_tokens * 3
+        input_tokens = code_tokens * 2
+        iteration_cost = self._price(self._model(), input_tokens, iteration_tokens - input_tokens)
+        # one compile plus the selected test classes, each at its measured average
+        iteration_seconds = self.build_seconds(module) + self.test_seconds(module) * test_count
+
+        iterations = self.config.BUDGET_BASE_ITERATIONS
+        estimate = {
+            "class": class_name,
+            "loc": len([l for l in (code or "").splitlines() if l.strip()]),
+            "tests": test_count,
+            "module": module or self.project,
+            "iteration_tokens": iteration_tokens,
+            "iteration_cost": iteration_cost,
+            "iteration_seconds": iteration_seconds,
+            "total_cost": iteration_cost * iterations,
+            "total_seconds": iteration_seconds * iterations,
+        }
+        with self._lock:
+            self._estimates[class_name] = estimate
+        return estimate
+
+    def order(self, estimates: list) -> list:
+        """Return the estimates cheapest-first so a budget cut drops the most expensive classes."""
+        ordered = sorted(estimates, key=lambda e: (e["total_cost"], e["total_seconds"], e["loc"]))
+        with self._lock:
+            for e in ordered:
+                self.allowance.setdefault(e["class"], self.config.BUDGET_BASE_ITERATIONS)
+                self.used.setdefault(e["class"], 0)
+        return ordered
+
+    # ------------------------------------------------------------------
+    # Iteration admission
+    # ------------------------------------------------------------------
+    def next_iteration(self, class_name: str) -> bool:
+        """Admit one more refinement iteration for `class_name` if budgets allow it."""
+        with self._lock:
+            reason = self._exhausted_locked(class_name)
+            if reason:
+                print(f"Budget: stopping {class_name}: {reason}")
+                return False
+
+            self.allowance.setdefault(class_name, self.config.BUDGET_BASE_ITERATIONS)
+            used = self.used.get(class_name, 0)
+
+            stall = self.config.BUDGET_STALL_ITERATIONS
+            if stall and used >= stall and not self.progress.get(class_name):
+                print(f"Budget: giving up on {class_name} after {used} iterations without a compiling candidate")
+                return False
+
+            if used >= self.allowance[class_name]:
+                # Only classes that already compiled may borrow released iterations
+                if not self.progress.get(class_name) or self.reserve <= 0:
+                    return False
+                if used >= self.config.BUDGET_MAX_ITERATIONS_PER_CLASS:
+                    return False
+                self.reserve -= 1
+                self.allowance[class_name] += 1
+
+            self.used[class_name] = used + 1
+            self.iterations_used += 1
+            return True
+
+    def mark_progress(self, class_name: str, compiled: bool = False, tests_passed: bool = False):
+        """Record that a class produced a compiling (or test-passing) candidate."""
+        with self._lock:
+            level = 2 if tests_passed else (1 if compiled else 0)
+            self.progress[class_name] = max(self.progress.get(class_name, 0), level)
+
+    def finish_class(self, class_name: str):
+        """Release the unused part of a class allowance to the shared reserve."""
+        with self._lock:
+            unused = self.allowance.get(class_name, 0) - self.used.get(class_name, 0)
+            if unused > 0:
+                self.reserve += unused
+                self.allowance[class_name] = self.used.get(class_name, 0)
+
+    # ------------------------------------------------------------------
+    # Accounting
+    # ------------------------------------------------------------------
+    def record_usage(self, model: str, usage: Optional[dict]):
+        """Add one LLM call's token usage (`prompt_tokens`/`completion_tokens`) to the run totals."""
+        if not usage:
+            return
+        prompt_tokens = int(usage.get("prompt_tokens") or 0)
+        completion_tokens = int(usage.get("completion_tokens") or 0)
+        with self._lock:
+            self._run._tokens_used += prompt_tokens + completion_tokens
+            self._run._cost_used += self._price(model, prompt_tokens, completion_tokens)
+
+    def record_build(self, module: Optional[str], seconds: float, compiler: str = "maven"):
+        """Record a compile duration so later runs can estimate per-module compile time.
+
+        Compile server ('server') and Maven ('maven') compiles are kept apart: one takes
+        well under a second, the other minutes.
+        """
+        key = module or self.project or "default"
+        self._record_time(key if compiler == "maven" else f"{key}#{compiler}", seconds)
+
+    def record_tests(self, module: Optional[str], seconds: float, test_count: int):
+        """Record the duration of a test step that ran `test_count` test classes."""
+        if test_count > 0:
+            self._record_time(f"{module or self.project or 'default'}{_TEST_KEY}", seconds / test_count)
+
+    def build_seconds(self, module: Optional[str] = None) -> float:
+        """Compile time of `module`: the compile server's when it has compiled there, else Maven's."""
+        key = module or self.project or "default"
+        seconds = self.build_times.get(f"{key}#server", self.build_times.get(key, self.config.BUDGET_DEFAULT_BUILD_SECONDS))
+        return float(seconds)
+
+    def test_seconds(self, module: Optional[str] = None) -> float:
+        """Average seconds per test class; the Maven compile time until a test step was measured."""
+        key = module or self.project or "default"
+        return float(self.build_times.get(f"{key}{_TEST_KEY}", self.build_times.get(key, self.config.BUDGET_DEFAULT_BUILD_SECONDS)))
+
+    def _record_time(self, key: str, seconds: float):
+        with self._lock:
+            previous = self.build_times.get(key)
+            # exponential moving average keeps the estimate stable across runs
+            self.build_times[key] = seconds if previous is None else 0.7 * previous + 0.3 * seconds
+
+    def exhausted(self) -> Optional[str]:
+        """Return the reason the global budget is exhausted, or None."""
+        with self._lock:
+            return self._exhausted_locked()
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "tokens_used": self.tokens_used,
+                "cost_usd": round(self.cost_used, 6),
+                "wall_seconds": round(self.elapsed(), 3),
+                "iterations_used": self.iterations_used,
+                "iterations_per_class": dict(self.used),
+                "reserve_iterations": self.reserve,
+            }
+
+    def save_build_times(self):
+        path = self.config.BUDGET_BUILD_TIMES_PATH
+        if not path:
+            return
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            data = dict(self.build_times)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=4)
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+    def _exhausted_locked(self, class_name: Optional[str] = None) -> Optional[str]:
+        cfg = self.config
+        if cfg.BUDGET_MAX_TOKENS and self.tokens_used >= cfg.BUDGET_MAX_TOKENS:
+            return f"token budget exhausted ({self.tokens_used}/{cfg.BUDGET_MAX_TOKENS})"
+        if cfg.BUDGET_MAX_COST_USD and self.cost_used >= cfg.BUDGET_MAX_COST_USD:
+            return f"cost budget exhausted (${self.cost_used:.4f}/${cfg.BUDGET_MAX_COST_USD})"
+        if cfg.BUDGET_MAX_WALL_SECONDS and self.elapsed() >= cfg.BUDGET_MAX_WALL_SECONDS:
+            return f"wall-clock budget exhausted ({self.elapsed():.0f}s/{cfg.BUDGET_MAX_WALL_SECONDS}s)"
+
+        # Do not start an iteration whose estimate would overrun the remaining budget
+        estimate = self._estimates.get(class_name) if class_name else None
+        if estimate:
+            if cfg.BUDGET_MAX_TOKENS and self.tokens_used + estimate["iteration_tokens"] > cfg.BUDGET_MAX_TOKENS:
+                return "not enough token budget left for another iteration"
+            if cfg.BUDGET_MAX_COST_USD and self.cost_used + estimate["iteration_cost"] > cfg.BUDGET_MAX_COST_USD:
+                return "not enough cost budget left for another iteration"
+            if cfg.BUDGET_MAX_WALL_SECONDS and self.elapsed() + estimate["iteration_seconds"] > cfg.BUDGET_MAX_WALL_SECONDS:
+                return "not enough wall-clock budget left for another iteration"
+        return None
+
+    def _model(self) -> str:
+        if self.config.LLM_PROVIDER == 'local':
+            return self.config.LOCAL_LLM_MODEL
+        return self.config.GROQ_MODEL if self.config.LLM_PROVIDER == 'groq' else self.config.MODEL_NAME
+
+    def _price(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        prices = self.config.MODEL_PRICES.get(model)
+        if not prices:
+            return 0.0
+        input_price, output_price = prices[0], prices[1]
+        return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+    def _load_build_times(self) -> dict:
+        path = self.config.BUDGET_BUILD_TIMES_PATH
+        if not path or not os.path.exists(path):
+            return {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
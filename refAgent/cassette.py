@@ -0,0 +1,180 @@
+"""
+Offline record/replay of LLM and build interactions.
+
+In `record` mode every `query_llm` request/response and every Maven
+compile/test outcome is appended to a JSON-lines cassette file. In `replay`
+mode the same interactions are served from the cassette in recorded order,
+so a run needs neither network access nor a JVM.
+
+Configure with `CASSETTE_MODE` ('off', 'record', 'replay') and `CASSETTE_PATH`.
+"""
+import hashlib
+import json
+import os
+import re
+import shlex
+import subprocess
+import threading
+from collections import defaultdict
+from typing import Callable, List, Optional, Union
+
+from refAgent.processes import run_process
+from settings import Settings
+
+
+# flags naming machine-local paths that do not change a command's outcome
+_UNKEYED_FLAGS = ("-Dmaven.repo.local=",)
+_UNKEYED_PATTERN = re.compile(r"\s*(?:%s)\S+" % "|".join(re.escape(flag) for flag in _UNKEYED_FLAGS))
+
+
+class CassetteMiss(KeyError):
+    """Raised in replay mode when a request was never recorded."""
+
+
+class Cassette:
+    """Records or replays interactions keyed by a hash of their request.
+
+    Identical requests are replayed in the order they were recorded, so a
+    pipeline that repeats the same call (e.g. several compiles of the same
+    project) gets the same sequence of outcomes as the recorded run.
+    """
+
+    def __init__(self, path: str, mode: str = "off"):
+        self.path = path
+        self.mode = (mode or "off").lower()
+        self._recorded = defaultdict(list)
+        self._cursor = defaultdict(int)
+        self._lock = threading.Lock()
+
+        if self.mode == "replay":
+            self._load()
+        elif self.mode == "record":
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # start a fresh cassette for every recorded run
+            open(self.path, "w", encoding="utf-8").close()
+
+    @property
+    def active(self) -> bool:
+        return self.mode in ("record", "replay")
+
+    @staticmethod
+    def key(kind: str, request: dict) -> str:
+        payload = json.dumps({"kind": kind, "request": request}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def interact(self, kind: str, request: dict, fn: Callable[[], dict]) -> dict:
+        """Return the response for `request`, calling `fn` unless replaying.
+
+        Args:
+            kind: Interaction type ('llm', 'compile', 'test', 'build').
+            request: JSON-serialisable description of the request.
+            fn: Performs the live interaction and returns a JSON-serialisable dict.
+        """
+        if self.mode == "replay":
+            return self._replay(kind, request)
+
+        response = fn()
+        if self.mode == "record":
+            self._record(kind, request, response)
+        return response
+
+    async def ainteract(self, kind: str, request: dict, fn) -> dict:
+        """Async variant of `interact`; `fn` is a coroutine function."""
+        if self.mode == "replay":
+            return self._replay(kind, request)
+
+        response = await fn()
+        if self.mode == "record":
+            self._record(kind, request, response)
+        return response
+
+    def _record(self, kind: str, request: dict, response: dict):
+        entry = {"key": self.key(kind, request), "kind": kind, "request": request, "response": response}
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def _replay(self, kind: str, request: dict) -> dict:
+        key = self.key(kind, request)
+        with self._lock:
+            responses = self._recorded.get(key)
+            if not responses:
+                raise CassetteMiss(f"No recorded '{kind}' interaction for request {key[:12]} in {self.path}")
+            index = self._cursor[key]
+            # replay the last recorded response if the run asks more often than recorded
+            response = responses[min(index, len(responses) - 1)]
+            self._cursor[key] = index + 1
+            return response
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f"Cassette not found: {self.path}")
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                entry = json.loads(line)
+                self._recorded[entry["key"]].append(entry["response"])
+
+
+_cassette = None
+_cassette_lock = threading.Lock()
+
+
+def get_cassette(config: Optional[Settings] = None) -> Cassette:
+    """Return the process-wide cassette configured from Settings."""
+    global _cassette
+    with _cassette_lock:
+        if _cassette is None:
+            config = config or Settings()
+            _cassette = Cassette(config.CASSETTE_PATH, config.CASSETTE_MODE)
+        return _cassette
+
+
+def portable_command(command: Union[str, List[str]]) -> str:
+    """`command` as a cassette key: `_UNKEYED_FLAGS` dropped, absolute paths under the
+    working directory made relative and the home directory written as `~`."""
+    if isinstance(command, str):
+        text = _UNKEYED_PATTERN.sub("", command)
+    else:
+        text = shlex.join(arg for arg in command if not arg.startswith(_UNKEYED_FLAGS))
+    for prefix, replacement in ((os.getcwd(), "."), (os.path.expanduser("~"), "~")):
+        if prefix and prefix != os.sep:
+            text = text.replace(prefix + os.sep, replacement + os.sep)
+    return text
+
+
+def run_command(kind: str, command: Union[str, List[str]], cwd: str,
+                collect: Optional[Callable[[], object]] = None) -> subprocess.CompletedProcess:
+    """Run a build command through the cassette and return a CompletedProcess.
+
+    `command` is an argument list (run without a shell) or, for legacy callers, a
+    shell string. It runs through `refAgent.processes.run_process`, so stdout and
+    stderr are a bounded extract of its output. `collect` gathers JSON-serialisable results the command left on
+    disk (e.g. test reports) right after it ran; they are recorded with the
+    command and returned as the process's `collected` attribute.
+    """
+    def _live():
+        # bounded output, a timeout per kind and the full log under PROCESS_LOG_DIR
+        process = run_process(command, cwd=cwd, kind=kind)
+        response = {"returncode": process.returncode, "stdout": process.stdout, "stderr": process.stderr}
+        if process.timed_out:
+            response["timed_out"] = True
+        if collect is not None:
+            response["collected"] = collect()
+        return response
+
+    # the working directory and the command are stored without machine-specific paths
+    # so cassettes recorded on one machine replay on another
+    request = {
+        "command": portable_command(command),
+        "cwd": os.path.relpath(cwd) if cwd else cwd,
+    }
+    response = get_cassette().interact(kind, request, _live)
+    process = subprocess.CompletedProcess(command, response["returncode"], response["stdout"], response["stderr"])
+    process.collected = response.get("collected")
+    process.timed_out = response.get("timed_out", False)
+    return process
@@ -0,0 +1,172 @@
+"""
+Process-wide pool of provider SDK clients.
+
+Creating a `Groq(...)`/`OpenAI(...)` client per call throws away the HTTP
+connection pool (and its TLS sessions) every time. `ClientManager` keeps one
+client per (provider, api key, base url) with a keep-alive connection pool that
+every agent and every project in the process shares.
+
+Async clients (`AsyncGroq`/`AsyncOpenAI`) are pooled the same way, per event
+loop, because an async connection pool cannot be shared between loops.
+
+Pool size and timeouts come from Settings (`LLM_POOL_*`, `LLM_*TIMEOUT*`).
+"""
+import asyncio
+import threading
+import weakref
+from typing import Optional
+
+from settings import Settings
+
+
+class ClientManager:
+    """Thread-safe cache of pooled provider clients."""
+
+    def __init__(self, config: Settings = None):
+        self.config = config or Settings()
+        self._clients = {}
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _http_client(self, is_async: bool = False):
+        try:
+            import httpx
+        except ImportError:
+            # the SDK still pools connections with its default client as long as it is reused
+            return None
+
+        cfg = self.config
+        limits = httpx.Limits(
+            max_connections=cfg.LLM_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=cfg.LLM_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=cfg.LLM_POOL_KEEPALIVE_EXPIRY,
+        )
+        timeout = httpx.Timeout(cfg.LLM_TIMEOUT_SECONDS, connect=cfg.LLM_CONNECT_TIMEOUT_SECONDS)
+        if is_async:
+            return httpx.AsyncClient(limits=limits, timeout=timeout)
+        return httpx.Client(limits=limits, timeout=timeout)
+
+    def _client_kwargs(self, api_key: str, base_url: Optional[str], is_async: bool = False) -> dict:
+        kwargs = {"api_key": api_key, "max_retries": self.config.LLM_CLIENT_MAX_RETRIES}
+        http_client = self._http_client(is_async)
+        if http_client is not None:
+            kwargs["http_client"] = http_client
+        else:
+            kwargs["timeout"] = self.config.LLM_TIMEOUT_SECONDS
+        if base_url:
+            kwargs["base_url"] = base_url
+        return kwargs
+
+    def _create(self, provider: str, api_key: str, base_url: Optional[str]):
+        cfg = self.config
+        if provider == 'groq':
+            try:
+                from groq import Groq
+            except ImportError:
+                raise ImportError("groq package not installed. Install with: pip install groq")
+            kwargs = self._client_kwargs(api_key, base_url)
+            return Groq(**kwargs)
+
+        if provider == 'openai':
+            import openai
+            if not hasattr(openai, "OpenAI"):
+                # openai<1.0 has no client object; pool connections through a shared requests session
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=cfg.LLM_POOL_MAX_KEEPALIVE, pool_maxsize=cfg.LLM_POOL_MAX_CONNECTIONS)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                openai.requestssession = session
+                return None
+            kwargs = self._client_kwargs(api_key, base_url)
+            return openai.OpenAI(**kwargs)
+
+        if provider == 'local':
+            # any OpenAI-compatible server (llama.cpp, vLLM, Ollama) at `base_url`
+            import openai
+            if not hasattr(openai, "OpenAI"):
+                raise ImportError("The local provider needs openai>=1.0. Install with: pip install -U openai")
+            return openai.OpenAI(**self._client_kwargs(api_key, base_url))
+
+        raise ValueError(f"Unknown LLM provider: {provider}")
+
+    def _create_async(self, provider: str, api_key: str, base_url: Optional[str]):
+        if provider == 'groq':
+            try:
+                from groq import AsyncGroq
+            except ImportError:
+                raise ImportError("groq package not installed. Install with: pip install groq")
+            return AsyncGroq(**self._client_kwargs(api_key, base_url, is_async=True))
+
+        if provider == 'openai':
+            import openai
+            if not hasattr(openai, "AsyncOpenAI"):
+                # legacy SDK: callers use openai.ChatCompletion.acreate
+                return None
+            return openai.AsyncOpenAI(**self._client_kwargs(api_key, base_url, is_async=True))
+
+        if provider == 'local':
+            import openai
+            if not hasattr(openai, "AsyncOpenAI"):
+                raise ImportError("The local provider needs openai>=1.0. Install with: pip install -U openai")
+            return openai.AsyncOpenAI(**self._client_kwargs(api_key, base_url, is_async=True))
+
+        raise ValueError(f"Unknown LLM provider: {provider}")
+
+    def get(self, provider: str, api_key: str, base_url: Optional[str] = None):
+        """Return the shared client for `provider`/`api_key`, creating it on first use."""
+        key = (provider, api_key, base_url)
+        with self._lock:
+            if key not in self._clients:
+                self._clients[key] = self._create(provider, api_key, base_url)
+            return self._clients[key]
+
+    def get_async(self, provider: str, api_key: str, base_url: Optional[str] = None):
+        """Return the shared async client for the running event loop."""
+        loop = asyncio.get_running_loop()
+        key = (provider, api_key, base_url)
+        with self._lock:
+            clients = self._async_clients.setdefault(loop, {})
+            if key not in clients:
+                clients[key] = self._create_async(provider, api_key, base_url)
+            return clients[key]
+
+    async def aclose_all(self):
+        """Close every async client created for the running event loop."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = list(self._async_clients.pop(loop, {}).values())
+        for client in clients:
+            close = getattr(client, "close", None)
+            if close is not None:
+                try:
+                    await close()
+                except Exception:
+                    pass
+
+    def close_all(self):
+        """Close every pooled client (call once at process shutdown)."""
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients = {}
+        for client in clients:
+            close = getattr(client, "close", None)
+            if close is not None:
+                try:
+                    close()
+                except Exception:
+                    pass
+
+
+# Process-wide manager shared by every agent
+client_manager = ClientManager()
+
+
+def get_client(provider: str, api_key: str, base_url: Optional[str] = None):
+    return client_manager.get(provider, api_key, base_url)
+
+
+def get_async_client(provider: str, api_key: str, base_url: Optional[str] = None):
+    return client_manager.get_async(provider, api_key, base_url)
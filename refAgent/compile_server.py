@@ -0,0 +1,235 @@
+"""
+Client for the warm Java compile server (`compile_server/CompileServer.java`).
+
+`mvn clean compile` wipes `target/` and recompiles the whole project just to
+check one rewritten class. The compile server is a long-running JVM that
+compiles only the changed file with `javax.tools` against the module's existing
+`target/classes` and its dependency classpath. The classpath is resolved once
+per module with `mvn dependency:build-classpath -Dmdep.outputFile=...` and
+cached until `pom.xml` changes.
+
+`compile_changed_file` returns None when the fast path is not available (no
+JDK, module never built), and the caller falls back to Maven.
+"""
+import atexit
+import os
+import socket
+import subprocess
+import threading
+from typing import List, Optional, Tuple
+
+from refAgent.cassette import get_cassette
+from refAgent.maven import MavenRunner
+from settings import Settings
+
+_config = Settings()
+
+SERVER_SOURCE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "compile_server", "CompileServer.java")
+OUTPUT_DIR = os.path.join("target", "refagent-classes")
+# relative to the module, so the command (and its cassette key) is the same on every machine
+CLASSPATH_FILE = os.path.join("target", "refagent-classpath.txt")
+
+
+class CompileServerUnavailable(RuntimeError):
+    """The compile server could not be started or reached."""
+
+
+class CompileServer:
+    """Starts the Java helper on first use and sends it compile requests."""
+
+    def __init__(self, config: Settings = None):
+        self.config = config or _config
+        self.process = None
+        self.port = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self.process is not None and self.process.poll() is None:
+                return
+            try:
+                self.process = subprocess.Popen(
+                    [self.config.COMPILE_SERVER_JAVA, SERVER_SOURCE, "0", str(self.config.COMPILE_SERVER_MAX_FILE_MANAGERS)],
+                    stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+                )
+            except OSError as e:
+                raise CompileServerUnavailable(f"Cannot start {self.config.COMPILE_SERVER_JAVA}: {e}")
+            # the JVM may print warnings (e.g. JAVA_TOOL_OPTIONS) before the port
+            output = []
+            for line in self.process.stdout:
+                if line.startswith("PORT "):
+                    self.port = int(line.split()[1])
+                    break
+                output.append(line.strip())
+            else:
+                self.process = None
+                raise CompileServerUnavailable(f"Compile server did not start: {' '.join(output)[-500:]}")
+            # keep draining the server's output so it never blocks on a full pipe
+            threading.Thread(target=self.process.stdout.read, name="compile-server-output", daemon=True).start()
+
+    def _request(self, lines: List[str]) -> List[str]:
+        self.start()
+        try:
+            with socket.create_connection(("127.0.0.1", self.port), timeout=self.config.COMPILE_SERVER_TIMEOUT_SECONDS) as sock:
+                sock.sendall(("\n".join(lines) + "\n").encode("utf-8"))
+                with sock.makefile("r", encoding="utf-8") as reader:
+                    return [line.rstrip("\n") for line in reader]
+        except OSError as e:
+            raise CompileServerUnavailable(f"Compile server request failed: {e}")
+
+    def compile(self, sources: List[str], classpath: List[str], output: str, options: Optional[List[str]] = None) -> Tuple[bool, List[dict]]:
+        """Compile `sources` into `output`; return (ok, diagnostics)."""
+        lines = ["COMPILE", f"output {os.path.abspath(output)}", f"classpath {os.pathsep.join(classpath)}"]
+        lines += [f"option {option}" for option in (options or [])]
+        lines += [f"source {os.path.abspath(source)}" for source in sources]
+        lines.append("END")
+        reply = self._request(lines)
+        if not reply or reply[0].startswith("ERROR"):
+            raise CompileServerUnavailable(reply[0] if reply else "Empty reply from compile server")
+
+        diagnostics = []
+        for line in reply[1:]:
+            if not line.startswith("DIAG "):
+                continue
+            kind, file, line_number, column, message = (line[5:].split("\t", 4) + [""] * 5)[:5]
+            diagnostics.append({
+                "kind": kind,
+                "file": file,
+                "line": int(line_number) if line_number.lstrip("-").isdigit() else None,
+                "column": int(column) if column.lstrip("-").isdigit() else None,
+                "message": message.replace("\\n", "\n").replace("\\\\", "\\"),
+            })
+        return reply[0].startswith("OK"), diagnostics
+
+    def stop(self):
+        with self._lock:
+            if self.process is None:
+                return
+            if self.process.poll() is None:
+                self.process.terminate()
+                try:
+                    self.process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    self.process.kill()
+            self.process = None
+
+
+_server = None
+_server_lock = threading.Lock()
+_classpaths = {}
+_classpaths_lock = threading.Lock()
+
+
+def get_compile_server() -> CompileServer:
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = CompileServer()
+            atexit.register(_server.stop)
+        return _server
+
+
+def find_module_dir(file_path: str) -> Optional[str]:
+    """Nearest directory above `file_path` that contains a pom.xml."""
+    directory = os.path.dirname(os.path.abspath(file_path))
+    while True:
+        if os.path.isfile(os.path.join(directory, "pom.xml")):
+            return directory
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+
+def is_test_source(file_path: str) -> bool:
+    """Whether `file_path` lies under a Maven `src/test` directory."""
+    return f"{os.sep}src{os.sep}test{os.sep}" in os.path.abspath(file_path)
+
+
+def module_classpath(module_dir: str) -> List[str]:
+    """Dependency classpath of a Maven module, cached until its pom.xml changes."""
+    key = (module_dir, os.path.getmtime(os.path.join(module_dir, "pom.xml")))
+    with _classpaths_lock:
+        if key in _classpaths:
+            return _classpaths[key]
+
+    # written to a file: the console line can be longer than any log extract keeps
+    output = os.path.join(module_dir, CLASSPATH_FILE)
+    if os.path.exists(output):
+        os.remove(output)
+
+    def _read(modules):
+        try:
+            with open(output, "r", encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    process = MavenRunner(module_dir).run("classpath", ["dependency:build-classpath"],
+                                          properties={"mdep.outputFile": CLASSPATH_FILE}, collect=_read)
+    if not process.ok:
+        raise CompileServerUnavailable(f"dependency:build-classpath failed in {module_dir}")
+    classpath = [entry for entry in (process.collected or "").strip().split(os.pathsep) if entry]
+    if not classpath:
+        # a wrong classpath reports spurious missing packages; let Maven compile instead
+        raise CompileServerUnavailable(f"dependency:build-classpath wrote no classpath for {module_dir}")
+
+    with _classpaths_lock:
+        _classpaths[key] = classpath
+    return classpath
+
+
+def compile_changed_file(file_path: str, related_files: Optional[List[str]] = None) -> Optional[Tuple[bool, str]]:
+    """Compile one changed source file through the compile server.
+
+    Args:
+        file_path: The rewritten source file.
+        related_files: Sources that use the changed class (e.g. dependency graph
+            neighbours); those in the same module are recompiled with it so API
+            changes that break callers are caught too. Test sources are compiled
+            against `target/test-classes` and skipped when it does not exist.
+
+    Returns:
+        (is_compiled, error text) or None when the fast path is unavailable and
+        the caller should compile with Maven.
+    """
+    module_dir = find_module_dir(file_path)
+    if module_dir is None or not os.path.isdir(os.path.join(module_dir, "target", "classes")):
+        return None
+
+    sources = [file_path] + [
+        f for f in (related_files or [])
+        if f != file_path and os.path.isfile(f) and find_module_dir(f) == module_dir
+    ]
+    # test sources also need the compiled tests (shared fixtures, base classes); without
+    # target/test-classes they are left to the test run
+    classes_dirs = [os.path.join(module_dir, "target", "classes")]
+    test_classes = os.path.join(module_dir, "target", "test-classes")
+    if any(is_test_source(f) for f in sources):
+        if os.path.isdir(test_classes):
+            classes_dirs.append(test_classes)
+        else:
+            sources = [f for f in sources if f == file_path or not is_test_source(f)]
+
+    def _live():
+        try:
+            # build-classpath includes the test-scoped dependencies as well
+            classpath = classes_dirs + module_classpath(module_dir)
+            ok, diagnostics = get_compile_server().compile(
+                sources, classpath, os.path.join(module_dir, OUTPUT_DIR), _config.COMPILE_SERVER_JAVAC_OPTIONS,
+            )
+        except CompileServerUnavailable as e:
+            print(f"Compile server unavailable ({e}), falling back to Maven")
+            return {"available": False}
+        errors = [
+            f"{d['file']}:[{d['line']}{',' + str(d['column']) if (d['column'] or 0) > 0 else ''}] {d['message']}"
+            for d in diagnostics if d["kind"] == "ERROR"
+        ]
+        return {"available": True, "ok": ok, "stderr": "\n".join(errors)}
+
+    request = {"sources": [os.path.relpath(s) for s in sources], "module": os.path.relpath(module_dir),
+               "classes": [os.path.relpath(d) for d in classes_dirs]}
+    response = get_cassette().interact("fast-compile", request, _live)
+    if not response.get("available"):
+        return None
+    return response["ok"], response["stderr"]
@@ -0,0 +1,223 @@
+"""
+Coverage-based test selection.
+
+Selecting tests by graph node names that contain "Test" both misses tests that
+exercise a class and runs tests that never touch it. `CoverageMap` records,
+for every test class of a project, which production classes and methods it
+covers. The map is built once with JaCoCo on the unmodified `after` tree (one
+Maven run per test class) and stored per project commit under
+`COVERAGE_CACHE_DIR/<project>/<commit>.json`.
+
+Each iteration then runs only the tests covering the methods the generator
+changed (`changed_methods`). Tests that were never measured, e.g. past
+`COVERAGE_MAX_TEST_CLASSES` or because their run failed, are still selected
+by name so nothing is deselected without evidence.
+
+JaCoCo reports are per module: a test only maps to classes of its own module.
+Tests of other modules are picked up by name as before.
+"""
+import json
+import os
+import time
+import xml.etree.ElementTree as ET
+from typing import Dict, Iterable, List, Optional, Set
+
+import git
+import javalang
+
+from refAgent.maven import MavenRunner
+from settings import Settings
+
+_config = Settings()
+
+JACOCO_REPORT = os.path.join("target", "site", "jacoco", "jacoco.xml")
+
+
+def project_commit(project_dir: str) -> Optional[str]:
+    """HEAD commit of the project's git checkout, or None when it is not a repository."""
+    try:
+        return git.Repo(project_dir).head.commit.hexsha
+    except Exception:
+        return None
+
+
+def _method_name(name: str) -> str:
+    # lambda$bar$0 belongs to bar
+    if name.startswith("lambda$"):
+        return name.split("$")[1]
+    return name
+
+
+def parse_jacoco_report(path: str) -> Dict[str, Set[str]]:
+    """Covered methods per production class (qualified, nested classes folded into their outer class)."""
+    try:
+        root = ET.parse(path).getroot()
+    except (ET.ParseError, OSError):
+        return {}
+    covered = {}
+    for cls in root.iter("class"):
+        class_name = cls.get("name", "").split("$", 1)[0].replace("/", ".")
+        for method in cls.iter("method"):
+            hits = [c for c in method.iter("counter") if c.get("type") == "INSTRUCTION" and int(c.get("covered", "0")) > 0]
+            if hits:
+                covered.setdefault(class_name, set()).add(_method_name(method.get("name", "")))
+    return covered
+
+
+def changed_methods(before_code: str, after_code: str) -> Optional[Set[str]]:
+    """Names of methods/constructors (`<init>`) of `before_code` that differ or are gone in `after_code`.
+
+    Returns None when either version cannot be parsed.
+    """
+    def methods(code):
+        tree = javalang.parse.parse(code)
+        bodies = {}
+        for _, node in tree.filter(javalang.tree.MethodDeclaration):
+            bodies.setdefault(node.name, []).append(repr(node))
+        for _, node in tree.filter(javalang.tree.ConstructorDeclaration):
+            bodies.setdefault("<init>", []).append(repr(node))
+        return bodies
+
+    try:
+        before, after = methods(before_code), methods(after_code)
+    except (javalang.parser.JavaSyntaxError, javalang.tokenizer.LexerError, TypeError, IndexError):
+        return None
+    return {name for name, bodies in before.items() if sorted(bodies) != sorted(after.get(name, []))}
+
+
+def find_test_classes(project_dir: str) -> Dict[str, str]:
+    """Test classes (simple name -> path relative to `project_dir`) found under `src/test` directories."""
+    tests = {}
+    for root, dirs, files in os.walk(project_dir):
+        dirs[:] = [d for d in dirs if d not in ("target", ".git", "node_modules")]
+        if f"{os.sep}src{os.sep}test" not in f"{os.sep}{os.path.relpath(root, project_dir)}":
+            continue
+        for name in files:
+            if name.endswith(".java") and "Test" in name:
+                tests.setdefault(name[:-5], os.path.relpath(os.path.join(root, name), project_dir))
+    return tests
+
+
+class CoverageMap:
+    """Which production classes and methods each test class covers.
+
+    Args:
+        coverage: {test class: {qualified production class: [method names]}}.
+        test_files: {test class: source path relative to the project root}.
+        measured: Test classes whose coverage run produced a report.
+    """
+
+    def __init__(self, coverage: Dict[str, Dict[str, List[str]]], test_files: Dict[str, str], measured: Iterable[str]):
+        self.coverage = coverage
+        self.test_files = test_files
+        self.measured = set(measured)
+
+    @staticmethod
+    def _matches(covered_class: str, class_name: str) -> bool:
+        return covered_class == class_name or covered_class.rsplit(".", 1)[-1] == class_name
+
+    def tests_for(self, class_name: str, methods: Optional[Iterable[str]] = None) -> List[str]:
+        """Measured tests covering `class_name` (simple or qualified), or any of its `methods`."""
+        methods = set(methods) if methods else None
+        selected = []
+        for test, classes in self.coverage.items():
+            for covered_class, covered_methods in classes.items():
+                if self._matches(covered_class, class_name) and (methods is None or methods & set(covered_methods)):
+                    selected.append(test)
+                    break
+        return sorted(selected)
+
+    def select(self, class_name: str, methods: Optional[Iterable[str]], candidates: Iterable[str]) -> List[str]:
+        """Tests to run after `methods` of `class_name` changed.
+
+        Covering tests plus the name-based `candidates` that were never measured.
+        With no known changed methods the whole class is used.
+        """
+        selected = self.tests_for(class_name, methods or None)
+        selected += [t for t in candidates if t not in self.measured and t not in selected]
+        return selected
+
+    def to_dict(self) -> dict:
+        return {"coverage": self.coverage, "test_files": self.test_files, "measured": sorted(self.measured)}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "CoverageMap":
+        return cls(data.get("coverage", {}), data.get("test_files", {}), data.get("measured", []))
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "CoverageMap":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+    @classmethod
+    def build(cls, project_dir: str, config: Optional[Settings] = None) -> Optional["CoverageMap"]:
+        """Run every test class of `project_dir` under JaCoCo, one Maven invocation each.
+
+        Returns None when JaCoCo produced no report for the first test classes
+        (plugin unavailable, offline, build broken), so callers fall back to
+        name-based selection.
+        """
+        config = config or _config
+        plugin = f"org.jacoco:jacoco-maven-plugin:{config.JACOCO_VERSION}"
+        runner = MavenRunner(project_dir, config)
+        test_files = find_test_classes(project_dir)
+        names = sorted(test_files)[:config.COVERAGE_MAX_TEST_CLASSES]
+        print(f"Building coverage map for {len(names)} of {len(test_files)} test classes in {project_dir}")
+
+        coverage, measured = {}, []
+        for index, test in enumerate(names):
+            since = time.time()
+
+            def collect(modules):
+                covered = {}
+                for module in modules:
+                    path = os.path.join(project_dir, module, JACOCO_REPORT)
+                    if os.path.isfile(path) and os.path.getmtime(path) >= since - 1:
+                        for name, methods in parse_jacoco_report(path).items():
+                            covered.setdefault(name, set()).update(methods)
+                return {name: sorted(methods) for name, methods in covered.items()}
+
+            # tests were compiled by the baseline build; only run them under the agent
+            result = runner.run(
+                "coverage",
+                [f"{plugin}:prepare-agent", "surefire:test", f"{plugin}:report"],
+                changed_files=[os.path.join(project_dir, test_files[test])],
+                properties={"test": test, "jacoco.append": "false", "maven.test.failure.ignore": "true"},
+                collect=collect,
+            )
+            if result.collected:
+                coverage[test] = result.collected
+                measured.append(test)
+            elif index + 1 >= config.COVERAGE_PROBE_TESTS and not measured:
+                print(f"No JaCoCo report after {index + 1} test classes, giving up on coverage: {result.error_text(5)}")
+                return None
+        return cls(coverage, test_files, measured)
+
+
+def get_coverage_map(project_name: str, config: Optional[Settings] = None) -> Optional[CoverageMap]:
+    """Coverage map of `projects/after/<project>`, loaded from the per-commit cache or built once.
+
+    Returns None when coverage selection is disabled or unavailable.
+    """
+    config = config or _config
+    if not config.COVERAGE_SELECTION_ENABLED:
+        return None
+    commit = project_commit(f"projects/before/{project_name}")
+    path = os.path.join(config.COVERAGE_CACHE_DIR, project_name, f"{commit}.json") if commit else None
+    if path and os.path.exists(path):
+        try:
+            return CoverageMap.load(path)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable coverage map {path}: {e}")
+
+    coverage = CoverageMap.build(f"projects/after/{project_name}", config)
+    if coverage is not None and path:
+        coverage.save(path)
+    return coverage
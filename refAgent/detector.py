@@ -1,5 +1,6 @@
 import os
-import subprocess
+import tempfile
+from refAgent.processes import run_process
 from utilities import get_all_java_files, parse_java_code, extract_class_name
 from settings import Settings
 import javalang
@@ -49,9 +50,15 @@ class Detector:
         # Try PMD if configured
         if tool == 'pmd' and self.config.PMD_PATH:
             try:
-                cmd = [self.config.PMD_PATH, "-d", project_dir, "-f", "text", "-R", "category/java/design.xml"]
-                proc = subprocess.run(cmd, capture_output=True, text=True)
-                output = proc.stdout + proc.stderr
+                # the report goes to a file: the process output is only kept as a bounded tail
+                with tempfile.TemporaryDirectory() as tmp:
+                    report = os.path.join(tmp, "pmd.txt")
+                    cmd = [self.config.PMD_PATH, "-d", project_dir, "-f", "text", "-R", "category/java/design.xml", "-r", report]
+                    proc = run_process(cmd, kind="pmd")
+                    if proc.timed_out or not os.path.exists(report):
+                        raise RuntimeError(f"PMD failed: {proc.stderr[-500:]}")
+                    with open(report, "r", encoding="utf-8", errors="replace") as f:
+                        output = f.read()
                 # PMD text output contains lines like: path:line: rule: message
                 results = {}
                 for line in output.splitlines():
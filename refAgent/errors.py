@@ -0,0 +1,102 @@
+"""
+Typed errors raised by the LLM layer instead of "An error occurred: ..." strings.
+"""
+from typing import Optional
+
+
+class LLMError(Exception):
+    """Base class for failures talking to an LLM provider."""
+
+    retryable = False
+
+    def __init__(self, message: str, status_code: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class RateLimitError(LLMError):
+    """The provider rejected the request with HTTP 429 (requests or tokens per minute)."""
+
+    retryable = True
+
+
+class TransientLLMError(LLMError):
+    """Timeouts, connection failures and 5xx responses that are worth retrying."""
+
+    retryable = True
+
+
+class PermanentLLMError(LLMError):
+    """Errors that will not go away on retry (bad request, auth, missing SDK, ...)."""
+
+
+class StreamAborted(LLMError):
+    """A streamed reply was abandoned because it can no longer become valid output."""
+
+
+class RequestCancelled(LLMError):
+    """The request lost a hedge race and its stream was closed."""
+
+
+def parse_duration(value) -> Optional[float]:
+    """Parse a rate-limit duration such as '7.66s', '2m59.56s', '250ms' or '12' into seconds."""
+    if value is None:
+        return None
+    text = str(value).strip().lower()
+    if not text:
+        return None
+    try:
+        return float(text)
+    except ValueError:
+        pass
+
+    seconds = 0.0
+    number = ""
+    i = 0
+    while i < len(text):
+        ch = text[i]
+        if ch.isdigit() or ch == ".":
+            number += ch
+            i += 1
+            continue
+        unit = "ms" if text.startswith("ms", i) else ch
+        if not number:
+            return None
+        factor = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}.get(unit)
+        if factor is None:
+            return None
+        seconds += float(number) * factor
+        number = ""
+        i += len(unit)
+    if number:
+        seconds += float(number)
+    return seconds
+
+
+def _headers_of(exc):
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers is None:
+        headers = getattr(exc, "headers", None)
+    return headers or {}
+
+
+def classify_error(exc: Exception) -> LLMError:
+    """Map an SDK/transport exception to a typed `LLMError`."""
+    if isinstance(exc, LLMError):
+        return exc
+
+    status = getattr(exc, "status_code", None) or getattr(exc, "http_status", None)
+    headers = _headers_of(exc)
+    retry_after = parse_duration(headers.get("retry-after")) if hasattr(headers, "get") else None
+    name = type(exc).__name__
+    message = f"{name}: {exc}"
+
+    if status == 429 or "RateLimit" in name:
+        return RateLimitError(message, status_code=status, retry_after=retry_after)
+    if isinstance(exc, (TimeoutError, ConnectionError)) or any(k in name for k in ("Timeout", "Connection", "ServiceUnavailable")):
+        return TransientLLMError(message, status_code=status, retry_after=retry_after)
+    if status is not None and (status in (408, 409) or status >= 500):
+        return TransientLLMError(message, status_code=status, retry_after=retry_after)
+    return PermanentLLMError(message, status_code=status)
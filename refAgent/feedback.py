@@ -0,0 +1,164 @@
+"""
+Deterministic failure feedback for the generator.
+
+A failed iteration used to cost one or more LLM calls that only summarized
+raw Maven output, with both versions of the class attached. This module turns
+the parsed failures into compact, structured text instead:
+
+- `compile_feedback`: compiler errors from `refAgent.maven.parse_errors` as
+  `File.java:line:column`, the message, the symbol/location and the
+  expected/actual types, plus the offending line of the rewritten class.
+- `test_feedback`: failing Surefire outcomes from `refAgent.surefire`. Each has
+  its exception, the expected/actual values of an assertion and the top
+  frames outside the test frameworks. Tests that fail the same way are
+  grouped.
+
+The agents only fall back to an LLM summary when nothing could be parsed
+(`LLM_FAILURE_SUMMARY='fallback'`), always (`'always'`) or never (`'off'`).
+"""
+import os
+import re
+from typing import List, Optional
+
+from refAgent import surefire
+from settings import Settings
+
+_config = Settings()
+
+# JUnit 4/5, TestNG and AssertJ/Hamcrest style assertion messages
+_EXPECTED_ACTUAL = [
+    re.compile(r"expected:?\s*<(?P<expected>.*?)>\s*but was:?\s*<(?P<actual>.*?)>", re.S),
+    re.compile(r"expected \[(?P<expected>.*?)\] but found \[(?P<actual>.*?)\]", re.S),
+    re.compile(r"[Ee]xpected:\s*(?P<expected>.+?)\s+(?:but was|[Aa]ctual|but):\s*(?P<actual>.+)", re.S),
+    re.compile(r"[Ee]xpecting(?: actual)?:\s*(?P<actual>.+?)\s+to (?:be equal to|contain|be):\s*(?P<expected>.+?)(?:\n\s*(?:but|when)|$)", re.S),
+]
+# javac: "incompatible types: String cannot be converted to int"
+_INCOMPATIBLE = re.compile(r"incompatible types: (?P<actual>.+?) cannot be converted to (?P<expected>.+)")
+_DETAIL = re.compile(r"^\s*(?P<key>symbol|location|required|found|reason)\s*:\s*(?P<value>.+)$")
+# frames of the test frameworks, the JDK and Maven say nothing about the refactored code
+_FRAMEWORK_FRAMES = ("org.junit.", "junit.", "org.testng.", "org.assertj.", "org.hamcrest.", "org.mockito.",
+                     "org.apache.maven.", "java.", "javax.", "jdk.", "sun.", "com.sun.")
+_VALUE_LIMIT = 200
+
+
+def _clip(text: str, limit: int = _VALUE_LIMIT) -> str:
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+def expected_actual(message: Optional[str]):
+    """(expected, actual) from an assertion or type error message, or None."""
+    if not message:
+        return None
+    for pattern in _EXPECTED_ACTUAL + [_INCOMPATIBLE]:
+        match = pattern.search(message)
+        if match:
+            return _clip(match.group("expected")), _clip(match.group("actual"))
+    return None
+
+
+def top_frames(trace: Optional[str], limit: Optional[int] = None) -> List[str]:
+    """The first `limit` stack frames outside the test frameworks and the JDK (`Class.method(File.java:12)`)."""
+    limit = _config.FAILURE_FEEDBACK_FRAMES if limit is None else limit
+    frames, fallback = [], []
+    for line in (trace or "").splitlines():
+        line = line.strip()
+        if not line.startswith("at "):
+            continue
+        frame = line[3:]
+        fallback.append(frame)
+        if not frame.startswith(_FRAMEWORK_FRAMES):
+            frames.append(frame)
+    return (frames or fallback)[:limit]
+
+
+def _source_line(code: Optional[str], line: Optional[int]) -> Optional[str]:
+    if not code or not line or line < 1:
+        return None
+    lines = code.splitlines()
+    return lines[line - 1].strip() if line <= len(lines) and lines[line - 1].strip() else None
+
+
+def compile_feedback(errors: List[dict], changed_file: Optional[str] = None, code: Optional[str] = None,
+                     limit: Optional[int] = None) -> str:
+    """Compact description of compiler errors (see `refAgent.maven.parse_errors`).
+
+    Args:
+        errors: Parsed errors with `file`, `line`, `column` and `message`.
+        changed_file: The rewritten file; its errors quote the offending line of `code`.
+        code: Source of the rewritten class.
+        limit: Errors shown (default `FAILURE_FEEDBACK_MAX_ITEMS`).
+    """
+    limit = _config.FAILURE_FEEDBACK_MAX_ITEMS if limit is None else limit
+    # "Failed to execute goal" only repeats that compilation failed when file errors were found
+    located = [e for e in errors if e["file"]]
+    unique, seen = [], set()
+    for error in located or errors:
+        key = (error["file"], error["line"], error["message"])
+        if key not in seen:
+            seen.add(key)
+            unique.append(error)
+    # errors in the rewritten class first: they are the ones the generator can fix
+    changed = os.path.basename(changed_file) if changed_file else None
+    unique.sort(key=lambda e: not (changed and e["file"] and os.path.basename(e["file"]) == changed))
+
+    lines = [f"Compilation failed with {len(unique)} error{'s' if len(unique) != 1 else ''}"
+             + (f" ({limit} shown)" if len(unique) > limit else "") + ":"]
+    for error in unique[:limit]:
+        first, *rest = error["message"].splitlines() or [""]
+        if error["file"]:
+            column = f":{error['column']}" if error["column"] else ""
+            lines.append(f"- {os.path.basename(error['file'])}:{error['line']}{column}: {first.strip()}")
+        else:
+            lines.append(f"- {_clip(first, 300)}")
+        details = {}
+        for detail in rest:
+            match = _DETAIL.match(detail)
+            if match:
+                details[match.group("key")] = _clip(match.group("value"))
+        pair = expected_actual(first)
+        if pair:
+            details.setdefault("required", pair[0])
+            details.setdefault("found", pair[1])
+        if details:
+            lines.append("  " + "; ".join(f"{key}: {value}" for key, value in details.items()))
+        if changed and error["file"] and os.path.basename(error["file"]) == changed:
+            source = _source_line(code, error["line"])
+            if source:
+                lines.append(f"  line {error['line']}: {_clip(source)}")
+    lines.append("Fix these errors in the refactored class without changing its public API.")
+    return "\n".join(lines)
+
+
+def test_feedback(failures: List[dict], limit: Optional[int] = None) -> str:
+    """Compact description of failing tests (Surefire outcomes), grouping identical failures.
+
+    Args:
+        failures: Outcomes with status 'failed' or 'error' (see `refAgent.surefire.failures`).
+        limit: Distinct failures shown (default `FAILURE_FEEDBACK_MAX_ITEMS`).
+    """
+    limit = _config.FAILURE_FEEDBACK_MAX_ITEMS if limit is None else limit
+    groups = {}
+    for outcome in failures:
+        frames = top_frames(outcome.get("trace"))
+        key = (outcome.get("type"), _clip(outcome.get("message") or "", 300), frames[0] if frames else None)
+        groups.setdefault(key, {"tests": [], "outcome": outcome, "frames": frames})["tests"].append(
+            f"{surefire.simple_name(outcome['class'])}.{outcome['name']}")
+
+    lines = [f"{len(failures)} test{'s' if len(failures) != 1 else ''} failed"
+             + (f" ({len(groups)} distinct failures)" if len(groups) != len(failures) else "") + ":"]
+    for group in list(groups.values())[:limit]:
+        outcome, tests = group["outcome"], group["tests"]
+        others = f" (and {len(tests) - 1} more: {', '.join(tests[1:4])}{', ...' if len(tests) > 4 else ''})" if len(tests) > 1 else ""
+        lines.append(f"- {tests[0]}{others} {outcome['status']}: {outcome.get('type') or 'unknown error'}")
+        pair = expected_actual(outcome.get("message"))
+        if pair:
+            lines.append(f"  expected: {pair[0]}; actual: {pair[1]}")
+        elif outcome.get("message"):
+            lines.append(f"  message: {_clip(outcome['message'], 300)}")
+        for frame in group["frames"]:
+            lines.append(f"  at {frame}")
+    if len(groups) > limit:
+        lines.append(f"- ... {len(groups) - limit} more distinct failures")
+    lines.append("Keep the behaviour these tests check unchanged in the refactored class.")
+    return "\n".join(lines)
@@ -1,7 +1,7 @@
 import requests
 import random
 import json
-import subprocess
+from refAgent.processes import run_process
 import os
 from utilities import *
 from tqdm import tqdm  # Import tqdm for the progress bar
@@ -110,12 +110,13 @@ class GitHubAPI:
                 output_file
             ]
             
-            try:
-                print(f"Running RefactoringMiner for commit {commit_id}...")
-                subprocess.run(command, check=True)
+            print(f"Running RefactoringMiner for commit {commit_id}...")
+            process = run_process(command, kind="refactoringminer")
+            if process.returncode == 0:
                 print(f"RefactoringMiner completed for commit {commit_id}, output saved to {output_file}")
-            except subprocess.CalledProcessError as e:
-                print(f"Error running RefactoringMiner for commit {commit_id}: {e}")
+            else:
+                print(f"Error running RefactoringMiner for commit {commit_id} (return code {process.returncode}): "
+                      f"{process.stderr[-1000:] or process.stdout[-1000:]}")
 
 # Example usage:
 tokens = config.GITHUB_API_KEY
@@ -0,0 +1,236 @@
+"""
+Hedged LLM requests.
+
+A hedged request is streamed from the primary provider. If no reply has
+started within a deadline, or the primary fails, the same messages are sent to
+a secondary provider/model, and the first reply to complete wins. The loser's
+stream is closed at once through its `Cancellation`, even while it is blocked
+waiting for a chunk. The hedge info names the model that answered, so usage is
+billed to it, and the loser's estimated usage (its prompts plus the chunks it
+streamed before it was closed), so the duplicate is billed too.
+
+The deadline is the `LLM_HEDGE_PERCENTILE` of the primary model's recent
+time-to-first-token. Until `LLM_HEDGE_MIN_SAMPLES` are known,
+`LLM_HEDGE_INITIAL_DEADLINE_SECONDS` is used.
+
+`hedge_stats()` reports how often hedges fired and how often the secondary won.
+"""
+import queue
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+from refAgent.errors import RequestCancelled
+from refAgent.prompt_budget import PromptBudget, PromptTooLarge, count_message_tokens, count_tokens
+from refAgent.stream_validators import StreamValidator
+from settings import Settings
+
+_config = Settings()
+
+
+class LatencyTracker:
+    """Sliding window of time-to-first-token samples for one provider model."""
+
+    def __init__(self, size: int = 200):
+        self.samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def deadline(self, percentile: float, min_samples: int, initial: float) -> float:
+        with self._lock:
+            samples = sorted(self.samples)
+        if len(samples) < max(1, min_samples):
+            return initial
+        index = min(len(samples) - 1, int(round(percentile / 100.0 * (len(samples) - 1))))
+        return samples[index]
+
+
+class _FirstToken(threading.Event):
+    """Event set by the primary stream on its first chunk (remembering when), or when it fails."""
+
+    at = None
+
+    def set(self):
+        if self.at is None:
+            self.at = time.monotonic()
+        super().set()
+
+    def fail(self):
+        super().set()
+
+
+class Cancellation(threading.Event):
+    """Event that, when set, also closes the streams registered with `on_cancel`.
+
+    It also counts the requests sent and the text streamed under it, to bill a cancelled request.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._callbacks = []
+        self._callbacks_lock = threading.Lock()
+        self.requests = 0
+        self.streamed = []
+
+    def usage(self, messages, model) -> Optional[dict]:
+        """Estimated usage of the requests made under this cancellation, or None if none was sent."""
+        if not self.requests:
+            return None
+        return {"prompt_tokens": count_message_tokens(messages, model) * self.requests,
+                "completion_tokens": count_tokens("".join(self.streamed), model)}
+
+    def on_cancel(self, callback):
+        """Call `callback` when the request is cancelled (at once if it already was)."""
+        with self._callbacks_lock:
+            if not self.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def set(self):
+        with self._callbacks_lock:
+            super().set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+
+_trackers = {}
+_stats = {"requests": 0, "fired": 0, "won": 0}
+_lock = threading.Lock()
+
+
+def _tracker(provider: str, model: str) -> LatencyTracker:
+    with _lock:
+        return _trackers.setdefault((provider, model), LatencyTracker())
+
+
+def _count(key: str):
+    with _lock:
+        _stats[key] += 1
+
+
+def hedge_stats() -> dict:
+    """Process-wide counts of hedged requests, hedges fired and hedges won by the secondary."""
+    with _lock:
+        stats = dict(_stats)
+    stats["fired_rate"] = round(stats["fired"] / stats["requests"], 3) if stats["requests"] else 0.0
+    stats["won_rate"] = round(stats["won"] / stats["fired"], 3) if stats["fired"] else 0.0
+    return stats
+
+
+def _make_llm(provider: str):
+    if provider == 'groq':
+        from refAgent.GroqLLM import GroqLLM
+        return GroqLLM(_config.GROQ_API_KEY)
+    if provider == 'local':
+        from refAgent.LocalLLM import LocalLLM
+        return LocalLLM(_config.LOCAL_LLM_API_KEY)
+    from refAgent.OpenaiLLM import OpenAILLM
+    return OpenAILLM(_config.API_KEY)
+
+
+class Hedger:
+    """Hedges requests of one LLM wrapper against `provider`/`model`.
+
+    Args:
+        provider: Secondary provider ('groq', 'openai' or 'local').
+        model: Secondary model name.
+        config: Settings with the `LLM_HEDGE_*` deadline parameters.
+    """
+
+    def __init__(self, provider: str, model: str, config: Optional[Settings] = None):
+        self.provider = provider
+        self.model = model
+        self.config = config or _config
+
+    @classmethod
+    def from_settings(cls, config: Optional[Settings] = None) -> Optional["Hedger"]:
+        config = config or _config
+        if not config.LLM_HEDGE_PROVIDER or not config.LLM_HEDGE_MODEL:
+            return None
+        return cls(config.LLM_HEDGE_PROVIDER, config.LLM_HEDGE_MODEL, config)
+
+    def run(self, primary, messages, model, max_tokens, validator=None):
+        """Return (reply, usage, hedge info) from whichever of primary/secondary completes first.
+
+        The hedge info holds `fired`, `won` and the `provider`/`model` that produced the reply;
+        when the hedge fired, also the `loser_model` and its estimated `loser_usage`.
+        """
+        cfg = self.config
+        validator = validator or StreamValidator
+        tracker = _tracker(primary.provider, model)
+        deadline = tracker.deadline(cfg.LLM_HEDGE_PERCENTILE, cfg.LLM_HEDGE_MIN_SAMPLES, cfg.LLM_HEDGE_INITIAL_DEADLINE_SECONDS)
+        _count("requests")
+
+        results = queue.Queue()
+        started = _FirstToken()
+        cancels = {"primary": Cancellation(), "secondary": Cancellation()}
+        began = time.monotonic()
+
+        def attempt(name, llm, attempt_model, attempt_max_tokens, first_token):
+            try:
+                reply = llm._stream_with_restarts(messages, attempt_model, attempt_max_tokens, validator,
+                                                  started=first_token, cancel=cancels[name])
+                results.put((name, reply, None))
+            except BaseException as e:
+                # wake the deadline wait so a primary failing early is hedged at once
+                if first_token is not None:
+                    first_token.fail()
+                results.put((name, None, e))
+
+        def hedge(reason):
+            try:
+                secondary_max_tokens = PromptBudget(self.model, cfg).fit_max_tokens(messages, max_tokens)
+            except PromptTooLarge:
+                return False
+            _count("fired")
+            print(f"{primary.provider} {model}: {reason}, hedging with {self.provider} {self.model}")
+            threading.Thread(target=attempt, args=("secondary", _make_llm(self.provider), self.model, secondary_max_tokens, None),
+                             daemon=True).start()
+            return True
+
+        threading.Thread(target=attempt, args=("primary", primary, model, max_tokens, started), daemon=True).start()
+        running = 1
+        fired = False
+        if not started.wait(deadline):
+            fired = hedge(f"no reply after {deadline:.1f}s")
+            running += fired
+
+        error = None
+        primary_failed = False
+        while running:
+            name, reply, exc = results.get()
+            running -= 1
+            if exc is None:
+                for other, cancel in cancels.items():
+                    if other != name:
+                        cancel.set()
+                if name == "secondary":
+                    _count("won")
+                if not primary_failed:
+                    # a primary cancelled before its first token still tells us it took at least this long
+                    tracker.observe((started.at if started.at is not None else time.monotonic()) - began)
+                provider, answered = (primary.provider, model) if name == "primary" else (self.provider, self.model)
+                info = {"fired": fired, "won": name == "secondary", "provider": provider, "model": answered}
+                if fired:
+                    # the duplicate request was paid for up to the moment it was closed
+                    loser, loser_model = ("secondary", self.model) if name == "primary" else ("primary", model)
+                    info["loser_model"] = loser_model
+                    info["loser_usage"] = cancels[loser].usage(messages, loser_model)
+                return reply[0], reply[1], info
+            if not isinstance(exc, RequestCancelled):
+                error = error or exc
+            if name == "primary":
+                primary_failed = True
+                if not fired:
+                    fired = hedge(f"failed ({exc})")
+                    running += fired
+        raise error
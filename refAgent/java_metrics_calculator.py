@@ -1,7 +1,7 @@
 import javalang
 import os
 import glob
-import subprocess
+from refAgent.processes import run_process
 # import pandas as pd  # Temporarily disabled due to SSL certificate issues
 from collections import defaultdict
 
@@ -34,12 +34,12 @@ class JavaMetricsCalculator:
             "-i", self.input_path,
             "-o", self.output_path
         ]
-        try:
-            print("Executing DesigniteJava tool...")
-            subprocess.run(command, check=True)
+        print("Executing DesigniteJava tool...")
+        process = run_process(command, kind="designite")
+        if process.returncode == 0:
             print("DesigniteJava execution completed successfully.")
-        except subprocess.CalledProcessError as e:
-            print(f"Error executing DesigniteJava: {e}")
+        else:
+            print(f"Error executing DesigniteJava (return code {process.returncode}): {process.stderr[-1000:] or process.stdout[-1000:]}")
 
     def parse_metrics(self):
         """
@@ -0,0 +1,124 @@
+"""
+Content-addressed on-disk cache of LLM responses.
+
+Responses are keyed by a hash of provider, model, the full message list,
+temperature and max_tokens, and stored in a SQLite database so re-running a
+project does not pay again for identical planner/generator prompts. The
+database is bounded by `LLM_CACHE_MAX_MB`; the least recently used entries are
+evicted first.
+
+Configure with `LLM_CACHE_ENABLED`, `LLM_CACHE_PATH` and `LLM_CACHE_MAX_MB`.
+Agents that need fresh samples opt out with `use_cache=False`.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from settings import Settings
+
+
+class ResponseCache:
+    """SQLite-backed LRU cache of JSON responses with hit/miss counters."""
+
+    def __init__(self, path: str, max_bytes: int = 0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # one connection shared by all threads, serialised by `_lock`
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses(last_access)")
+        self._db.commit()
+
+    @staticmethod
+    def key(request: dict) -> str:
+        payload = json.dumps(request, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, request: dict) -> Optional[dict]:
+        """Return the cached response for `request` or None (counted as a miss)."""
+        key = self.key(request)
+        with self._lock:
+            row = self._db.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, request: dict, response: dict):
+        """Store `response` for `request` and evict LRU entries beyond the size limit."""
+        key = self.key(request)
+        data = json.dumps(response, ensure_ascii=False)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, data, len(data.encode("utf-8")), time.time()),
+            )
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        if not self.max_bytes:
+            return
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._db.execute("SELECT key, size FROM responses ORDER BY last_access ASC").fetchall()
+        evicted = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        self._db.executemany("DELETE FROM responses WHERE key = ?", evicted)
+        self.evictions += len(evicted)
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": size,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache(config: Optional[Settings] = None) -> Optional[ResponseCache]:
+    """Return the process-wide response cache, or None when `LLM_CACHE_ENABLED` is off."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            config = config or Settings()
+            if not config.LLM_CACHE_ENABLED:
+                return None
+            _cache = ResponseCache(config.LLM_CACHE_PATH, int(config.LLM_CACHE_MAX_MB * 1024 * 1024))
+        return _cache
@@ -0,0 +1,152 @@
+"""
+Minimal OpenAI-compatible chat completion server for tests and offline runs.
+
+Implements `GET /v1/models` and `POST /v1/chat/completions` (plain and
+`stream: true` server-sent events with a final usage chunk). The stub model
+answers a refactoring request with the Java class found in the last user
+message inside a fenced `java` block, a True/False question with "True" and
+anything else with an empty JSON plan.
+
+Usage:
+    python -m refAgent.local_stub_server --port 8080 --latency 0.2
+    LLM_PROVIDER=local LOCAL_LLM_BASE_URL=http://127.0.0.1:8080/v1 python refAgent/RefAgent_main.py <project>
+
+In-process (e.g. from a test or benchmark):
+    server = serve(port=0)
+    base_url = f"http://127.0.0.1:{server.server_port}/v1"
+    ...
+    server.shutdown()
+"""
+import sys
+import os
+
+# Add parent directory to path so relative imports work
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# from the first line starting a Java compilation unit to the last closing brace
+_JAVA_CLASS = re.compile(r"^((?:package|import|public|final|abstract|class|@)\b[\s\S]*?\bclass\s+\w+[\s\S]*\})", re.M)
+
+
+def stub_reply(messages):
+    """Deterministic reply for the last user message."""
+    last = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+    if "True or False" in last:
+        return "True"
+    match = _JAVA_CLASS.search(last)
+    if match:
+        return f"```java\n{match.group(1)}\n```"
+    return "{}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    server_version = "RefAgentStub/1.0"
+    latency = 0.0
+    model = "stub"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._json(200, {"object": "list", "data": [{"id": self.model, "object": "model", "owned_by": "stub"}]})
+        else:
+            self._json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._json(400, {"error": {"message": "Invalid JSON body"}})
+            return
+
+        messages = request.get("messages") or []
+        reply = stub_reply(messages)
+        model = request.get("model") or self.model
+        usage = {
+            "prompt_tokens": sum(len(m.get("content") or "") for m in messages) // 4,
+            "completion_tokens": len(reply) // 4,
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        if self.latency:
+            time.sleep(self.latency)
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        if not request.get("stream"):
+            self._json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        def event(choices, extra=None):
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model, "choices": choices}
+            chunk.update(extra or {})
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        try:
+            event([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])
+            for i in range(0, len(reply), 32):
+                event([{"index": 0, "delta": {"content": reply[i:i + 32]}, "finish_reason": None}])
+            event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+            event([], {"usage": usage})
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # the client aborted the stream
+            pass
+
+
+def serve(host="127.0.0.1", port=8080, latency=0.0, model="stub"):
+    """Start the stub server on a background thread and return it (`port=0` picks a free port)."""
+    handler = type("ConfiguredStubHandler", (StubHandler,), {"latency": latency, "model": model})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="local-stub-server", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub OpenAI-compatible server for the 'local' LLM provider")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before answering")
+    parser.add_argument("--model", default="stub", help="Model id reported by /v1/models")
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, args.latency, args.model)
+    print(f"Stub LLM server listening on http://{args.host}:{server.server_port}/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,242 @@
+"""
+Maven invocation.
+
+`MavenRunner` builds argument lists (no shell) for a project and returns
+`MavenResult`s: a `subprocess.CompletedProcess` that also carries the
+duration, the module the build was scoped to and the errors parsed from the
+output.
+
+When `MAVEN_SCOPE_TO_MODULE` is on and a changed file is given, the build is
+limited to the reactor module owning that file and the modules it depends on
+(`-pl <module> -am`), so a multi-module project such as jclouds does not
+compile dozens of unrelated modules per iteration. `MAVEN_THREADS` (`-T`),
+`MAVEN_OFFLINE` (`-o`) and `MAVEN_QUIET` (`-q`) are added to every build.
+
+Usage:
+    runner = MavenRunner("projects/after/jclouds")
+    result = runner.run("compile", ["clean", "compile"], changed_files=[path], properties={"skipTests": "true"})
+    if not result.ok:
+        print(result.error_text())
+"""
+import os
+import re
+import subprocess
+import threading
+import time
+import xml.etree.ElementTree as ET
+from typing import Callable, Dict, Iterable, List, Optional
+
+from refAgent.cassette import run_command
+from settings import Settings
+
+_config = Settings()
+
+# [ERROR] /path/to/Foo.java:[12,5] cannot find symbol (the prefix is missing in `error_text` and compile server output)
+_COMPILER_ERROR = re.compile(r"^(?:\[ERROR\] )?(?P<file>[^\s\[].*?\.java):\[(?P<line>\d+)(?:,(?P<column>\d+))?\] (?P<message>.*)$")
+# plain javac: /path/to/Foo.java:12: error: cannot find symbol
+_JAVAC_ERROR = re.compile(r"^(?P<file>[^\s\[].*?\.java):(?P<line>\d+): error: (?P<message>.*)$")
+# continuation lines of a compiler error (symbol:, location:, ...)
+_ERROR_DETAIL = re.compile(r"^(?:\[ERROR\])?\s{2,}(?P<detail>\S.*)$")
+_GOAL_FAILURE = re.compile(r"^(?:\[ERROR\] )?(?P<message>Failed to execute goal .*)$")
+
+_modules = {}
+_modules_lock = threading.Lock()
+
+
+def parse_errors(output: str) -> List[dict]:
+    """Compiler errors and goal failures found in Maven (or plain javac) output.
+
+    Each error is a dict with `file`, `line`, `column` (None for goal failures)
+    and `message`.
+    """
+    errors = []
+    for line in output.splitlines():
+        match = _COMPILER_ERROR.match(line) or _JAVAC_ERROR.match(line)
+        if match:
+            errors.append({
+                "file": match.group("file"),
+                "line": int(match.group("line")),
+                "column": int(match.group("column")) if match.groupdict().get("column") else None,
+                "message": match.group("message").strip(),
+            })
+            continue
+        match = _GOAL_FAILURE.match(line)
+        if match:
+            errors.append({"file": None, "line": None, "column": None, "message": match.group("message").strip()})
+            continue
+        match = _ERROR_DETAIL.match(line)
+        # javac's caret line under the echoed source carries no information
+        if match and errors and errors[-1]["file"] and match.group("detail") != "^":
+            errors[-1]["message"] += f"\n  {match.group('detail').strip()}"
+    return errors
+
+
+class MavenResult(subprocess.CompletedProcess):
+    """Outcome of one Maven invocation.
+
+    Attributes (besides `args`, `returncode`, `stdout`, `stderr`):
+        duration: Wall time in seconds.
+        module: Reactor module the build was scoped to, or None for the whole reactor.
+        errors: Parsed errors (see `parse_errors`).
+        collected: Whatever the `collect` callback of `MavenRunner.run` returned.
+        timed_out: Maven was killed after its `PROCESS_TIMEOUTS` limit.
+    """
+
+    def __init__(self, args, returncode, stdout, stderr, duration: float = 0.0, module: Optional[str] = None):
+        super().__init__(args, returncode, stdout, stderr)
+        self.duration = duration
+        self.module = module
+        self.errors = parse_errors(f"{stdout or ''}\n{stderr or ''}")
+        self.collected = None
+        self.timed_out = False
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0
+
+    def error_text(self, limit: int = 50) -> str:
+        """Parsed errors as text, or the tail of the output when none were recognised."""
+        if self.timed_out:
+            return f"Maven was killed after its timeout (a hung test or build step):\n{(self.stderr or '').strip()[-2000:]}"
+        if self.errors:
+            lines = []
+            for error in self.errors[:limit]:
+                column = f",{error['column']}" if error["column"] else ""
+                location = f"{error['file']}:[{error['line']}{column}] " if error["file"] else ""
+                lines.append(f"{location}{error['message']}")
+            return "\n".join(lines)
+        output = (self.stderr or "").strip() or (self.stdout or "").strip()
+        return "\n".join(output.splitlines()[-limit:])
+
+
+def _pom_modules(pom_path: str) -> List[str]:
+    """`<module>` entries of a pom.xml, including those declared in profiles."""
+    try:
+        root = ET.parse(pom_path).getroot()
+    except (ET.ParseError, OSError):
+        return []
+    # poms are usually namespaced; match on the local tag name
+    return [
+        element.text.strip()
+        for element in root.iter()
+        if element.tag.rsplit("}", 1)[-1] == "module" and element.text and element.text.strip()
+    ]
+
+
+def reactor_modules(project_dir: str) -> set:
+    """Relative directories of every module in the project's reactor (cached per root pom)."""
+    root_pom = os.path.join(project_dir, "pom.xml")
+    if not os.path.isfile(root_pom):
+        return set()
+    key = (os.path.abspath(project_dir), os.path.getmtime(root_pom))
+    with _modules_lock:
+        if key in _modules:
+            return _modules[key]
+
+    modules = set()
+    pending = [""]
+    while pending:
+        module = pending.pop()
+        for child in _pom_modules(os.path.join(project_dir, module, "pom.xml")):
+            # a module may point at a pom file instead of its directory
+            if child.endswith(".xml"):
+                child = os.path.dirname(child)
+            path = os.path.normpath(os.path.join(module, child))
+            if path not in modules and os.path.isfile(os.path.join(project_dir, path, "pom.xml")):
+                modules.add(path)
+                pending.append(path)
+
+    with _modules_lock:
+        _modules[key] = modules
+    return modules
+
+
+def module_for(project_dir: str, file_path: str) -> Optional[str]:
+    """Reactor module (relative to `project_dir`) owning `file_path`, or None for the root."""
+    project_dir = os.path.abspath(project_dir)
+    directory = os.path.dirname(os.path.abspath(file_path))
+    if os.path.commonpath([project_dir, directory]) != project_dir:
+        return None
+    modules = reactor_modules(project_dir)
+    while directory != project_dir:
+        relative = os.path.relpath(directory, project_dir)
+        if relative in modules:
+            return relative
+        directory = os.path.dirname(directory)
+    return None
+
+
+class MavenRunner:
+    """Runs Maven goals in one project directory.
+
+    Args:
+        project_dir: Directory with the root pom.xml.
+        config: Settings with the `MAVEN_*` options.
+    """
+
+    def __init__(self, project_dir: str = '.', config: Optional[Settings] = None):
+        self.project_dir = project_dir
+        self.config = config or _config
+
+    def modules_for(self, changed_files: Optional[Iterable[str]]) -> List[str]:
+        """Reactor modules to build for `changed_files`; empty means the whole reactor."""
+        if not self.config.MAVEN_SCOPE_TO_MODULE or not changed_files:
+            return []
+        modules = []
+        for path in changed_files:
+            module = module_for(self.project_dir, path)
+            if module is None:
+                # a file of the root module needs the whole reactor
+                return []
+            if module not in modules:
+                modules.append(module)
+        return modules
+
+    def command(self, goals: List[str], modules: Optional[List[str]] = None, properties: Optional[Dict[str, str]] = None,
+                quiet: Optional[bool] = None) -> List[str]:
+        cfg = self.config
+        command = [cfg.MAVEN_EXECUTABLE, "-B"]
+        if cfg.MAVEN_QUIET if quiet is None else quiet:
+            command.append("-q")
+        if cfg.MAVEN_OFFLINE:
+            command.append("-o")
+        if cfg.MAVEN_THREADS:
+            command += ["-T", str(cfg.MAVEN_THREADS)]
+        if modules:
+            command += ["-pl", ",".join(modules), "-am"]
+        if cfg.MAVEN_LOCAL_REPO:
+            command.append(f"-Dmaven.repo.local={os.path.abspath(cfg.MAVEN_LOCAL_REPO)}")
+        for name, value in (properties or {}).items():
+            command.append(f"-D{name}={value}")
+        return command + list(goals)
+
+    def run(self, kind: str, goals: List[str], changed_files: Optional[Iterable[str]] = None,
+            properties: Optional[Dict[str, str]] = None, quiet: Optional[bool] = None,
+            collect: Optional[Callable[[List[str]], object]] = None) -> MavenResult:
+        """Run `goals`, scoped to the modules owning `changed_files` when given.
+
+        Args:
+            kind: Cassette interaction type ('compile', 'test', 'build', ...).
+            goals: Maven phases/goals, e.g. ["clean", "compile"].
+            changed_files: Files whose modules (plus upstream modules) should be built.
+            properties: `-D` system properties.
+            quiet: Override `MAVEN_QUIET` (e.g. for goals whose INFO output is parsed).
+            collect: Called with every reactor module directory ("" for the root) after the
+                build to read its outputs (e.g. Surefire reports) into `result.collected`.
+        """
+        modules = self.modules_for(changed_files)
+        if properties and "test" in properties:
+            # most modules (and every upstream module built by -am) have none of the selected tests
+            properties = dict(properties)
+            properties.setdefault("surefire.failIfNoSpecifiedTests", "false")
+            properties.setdefault("failIfNoTests", "false")
+        command = self.command(goals, modules, properties, quiet)
+        started = time.monotonic()
+        # -am may build any upstream module too, so outputs are looked up in the whole reactor
+        built = [""] + sorted(reactor_modules(self.project_dir))
+        process = run_command(kind, command, self.project_dir, collect=(lambda: collect(built)) if collect else None)
+        result = MavenResult(command, process.returncode, process.stdout, process.stderr,
+                             duration=time.monotonic() - started, module=",".join(modules) or None)
+        result.collected = process.collected
+        result.timed_out = process.timed_out
+        return result
@@ -0,0 +1,119 @@
+"""
+Bounded conversation memory for agents that iterate on one class.
+
+The refinement loop appends the full generator query (which embeds the whole
+class), the full candidate and the compile/test feedback on every iteration,
+so an unbounded history resends one copy of the class per iteration. A
+`ConversationMemory` decides which part of `message_history` is actually sent:
+
+- pinned: the system prompt and the first user message (the original code)
+- recent: the latest candidate (last assistant reply) and everything after it,
+  i.e. the latest feedback and the new request, plus up to `window` earlier messages
+- dropped turns are replaced by a short digest of their feedback (optional)
+
+Repeats of the original request are sent as a short reference, and the result
+is trimmed oldest-first to `max_tokens`. The full history stays on the LLM
+wrapper; only the request is bounded.
+"""
+from typing import Callable, List, Optional
+
+from refAgent.prompt_budget import PromptBudget, count_tokens
+from settings import Settings
+
+REPEATED_REQUEST = "Repeat of the original request above: apply the same task to the original class."
+
+
+def digest_feedback(messages: List[dict], max_chars: int = 300) -> str:
+    """Condense dropped turns: superseded candidates are omitted, feedback is shortened."""
+    lines = []
+    for message in messages:
+        if message.get("role") != "user":
+            continue
+        content = " ".join((message.get("content") or "").split())
+        if not content or content == REPEATED_REQUEST:
+            continue
+        if len(content) > max_chars:
+            content = content[:max_chars] + " ..."
+        lines.append(f"- {content}")
+    if not lines:
+        return ""
+    return "Summary of feedback on earlier attempts:\n" + "\n".join(lines)
+
+
+class ConversationMemory:
+    """Selects a bounded subset of a conversation to send to the LLM.
+
+    Args:
+        max_tokens: Hard cap on the estimated prompt tokens of the selection (0 = no cap).
+        window: Extra messages kept before the latest candidate.
+        summarize: Callable turning the dropped messages into one summary string,
+            or None to drop them silently.
+        count_tokens: Token counter for one message content.
+    """
+
+    def __init__(self, max_tokens: int = 0, window: int = 2, summarize: Optional[Callable[[List[dict]], str]] = digest_feedback,
+                 count_tokens: Callable[[str], int] = count_tokens):
+        self.max_tokens = max_tokens
+        self.window = max(0, window)
+        self.summarize = summarize
+        self.count_tokens = count_tokens
+
+    @classmethod
+    def from_settings(cls, config: Optional[Settings] = None, model: Optional[str] = None) -> Optional["ConversationMemory"]:
+        """Build the memory policy configured in Settings (counting `model`'s tokens), or None when disabled."""
+        config = config or Settings()
+        if not config.LLM_MEMORY_ENABLED:
+            return None
+        # never select more than the model's window (which is often capped by its tokens/min)
+        limit = PromptBudget(model, config).limit
+        return cls(
+            max_tokens=min(config.LLM_MEMORY_MAX_TOKENS, limit) if config.LLM_MEMORY_MAX_TOKENS else limit,
+            window=config.LLM_MEMORY_WINDOW,
+            summarize=digest_feedback if config.LLM_MEMORY_SUMMARIZE else None,
+            count_tokens=lambda text: count_tokens(text, model),
+        )
+
+    def _tokens(self, messages: List[dict]) -> int:
+        return sum(self.count_tokens(m.get("content") or "") for m in messages)
+
+    def select(self, history: List[dict], max_tokens: Optional[int] = None) -> List[dict]:
+        """Return the messages of `history` to send for the next request.
+
+        Args:
+            history: The full conversation.
+            max_tokens: Tighter cap for this request, e.g. the window minus the reply's
+                `max_tokens`, so older turns are dropped instead of starving the reply.
+        """
+        system = [m for m in history if m.get("role") == "system"]
+        turns = [m for m in history if m.get("role") != "system"]
+        if not turns:
+            return list(system)
+
+        first = turns[0] if turns[0].get("role") == "user" else None
+        rest = turns[1:] if first is not None else turns
+
+        # the latest candidate and everything after it (feedback, new request)
+        last_reply = max((i for i, m in enumerate(rest) if m.get("role") == "assistant"), default=0)
+        start = max(0, last_reply - self.window)
+        dropped, recent = rest[:start], rest[start:]
+
+        if first is not None:
+            recent = [
+                {"role": m["role"], "content": REPEATED_REQUEST} if m.get("role") == "user" and m.get("content") == first.get("content") else m
+                for m in recent
+            ]
+
+        pinned = system + ([first] if first is not None else [])
+        summary = self.summarize(dropped) if (dropped and self.summarize) else ""
+        middle = [{"role": "user", "content": summary}] if summary else []
+
+        cap = min(c for c in (self.max_tokens, max_tokens) if c) if (self.max_tokens or max_tokens) else 0
+        if cap:
+            budget = cap - self._tokens(pinned)
+            # the newest message is always sent; older ones go first, then the summary
+            while len(recent) > 1 and self._tokens(middle + recent) > budget:
+                recent = recent[1:]
+            if middle and self._tokens(middle + recent) > budget:
+                middle = []
+
+        return pinned + middle + recent
@@ -0,0 +1,158 @@
+"""
+Static pre-flight validation of generated classes.
+
+Before a generator reply is written to disk and handed to Maven it is checked
+in-process:
+
+- a Java code block can be extracted (fenced or bare)
+- the code parses (truncated replies fail here)
+- the package and the top-level type name match the original class
+- every non-private method, constructor and field of the original class is
+  still declared with the same signature. Package-private members are
+  included because neighbouring classes of the same package call them.
+
+`validate_candidate` returns a `PreflightResult`; when it fails, `feedback()` is
+sent back to the generator instead of running a build.
+"""
+import re
+from typing import List, Optional, Set
+
+import javalang
+
+_FENCED_BLOCK = re.compile(r"```[ \t]*([\w+-]*)[^\n]*\n(.*?)(?:```|\Z)", re.S)
+_JAVA_START = re.compile(r"^\s*(?:package|import|public|final|abstract|class|interface|enum|record|@)\b", re.M)
+
+
+class PreflightResult:
+    """Outcome of `validate_candidate`.
+
+    Attributes:
+        code: The extracted Java source, or None when none was found.
+        problems: Human-readable reasons the candidate was rejected (empty when it passed).
+    """
+
+    def __init__(self, code: Optional[str], problems: List[str]):
+        self.code = code
+        self.problems = problems
+
+    @property
+    def ok(self) -> bool:
+        return not self.problems
+
+    def feedback(self) -> str:
+        """Message for the generator describing why its reply was rejected."""
+        lines = "\n".join(f"- {problem}" for problem in self.problems)
+        return (f"Your previous reply was rejected before compilation:\n{lines}\n"
+                "Return the complete refactored class in a single fenced `java` code block.")
+
+
+def extract_java_code(reply: str) -> Optional[str]:
+    """Java source from a reply: the largest fenced block declaring a type, else a bare class."""
+    if not isinstance(reply, str) or not reply.strip():
+        return None
+    blocks = [
+        body for tag, body in _FENCED_BLOCK.findall(reply)
+        if tag.lower() in ("", "java") and re.search(r"\b(?:class|interface|enum|record)\s+\w", body)
+    ]
+    if blocks:
+        return max(blocks, key=len).strip()
+    text = reply.strip()
+    if not text.startswith("```") and _JAVA_START.match(text) and re.search(r"\b(?:class|interface|enum|record)\s+\w", text):
+        return text
+    return None
+
+
+def _type_name(node) -> str:
+    """Erased simple type name with array dimensions, e.g. `List[]` for `java.util.List<String>[]`."""
+    if node is None:
+        return "void"
+    name = node.name
+    sub = getattr(node, "sub_type", None)
+    while sub is not None:
+        name = sub.name
+        sub = getattr(sub, "sub_type", None)
+    return name.rsplit(".", 1)[-1] + "[]" * len(node.dimensions or [])
+
+
+def _parameters(node) -> str:
+    params = []
+    for param in node.parameters:
+        name = _type_name(param.type)
+        params.append(name + ("..." if param.varargs else ""))
+    return ", ".join(params)
+
+
+def _target_type(tree, class_name: str):
+    for declaration in tree.types:
+        if declaration.name == class_name:
+            return declaration
+    return None
+
+
+def api_signatures(type_declaration) -> Set[str]:
+    """Non-private members of a type declaration as comparable signature strings."""
+    is_interface = isinstance(type_declaration, javalang.tree.InterfaceDeclaration)
+    signatures = set()
+    for member in type_declaration.body or []:
+        modifiers = getattr(member, "modifiers", None) or set()
+        if "private" in modifiers:
+            continue
+        static = "static " if "static" in modifiers else ""
+        if isinstance(member, javalang.tree.MethodDeclaration):
+            signatures.add(f"{static}{_type_name(member.return_type)} {member.name}({_parameters(member)})")
+        elif isinstance(member, javalang.tree.ConstructorDeclaration):
+            signatures.add(f"{member.name}({_parameters(member)})")
+        elif isinstance(member, javalang.tree.FieldDeclaration) or (is_interface and isinstance(member, javalang.tree.ConstantDeclaration)):
+            for declarator in member.declarators:
+                signatures.add(f"{static}{_type_name(member.type)} {declarator.name}")
+    return signatures
+
+
+def _parse(code: str):
+    try:
+        return javalang.parse.parse(code), None
+    except javalang.parser.JavaSyntaxError as e:
+        position = getattr(e.at, "position", None)
+        where = f" at line {position.line}" if position else ""
+        return None, f"{e.description or 'syntax error'}{where}"
+    except (javalang.tokenizer.LexerError, TypeError, IndexError, StopIteration) as e:
+        return None, str(e) or type(e).__name__
+
+
+def validate_candidate(reply: str, original_code: str, class_name: str, check_api: bool = True) -> PreflightResult:
+    """Check a generator reply against the original class.
+
+    Args:
+        reply: Raw generator reply.
+        original_code: Source of the class that was sent to the generator.
+        class_name: Name of the top-level class being refactored.
+        check_api: Also require the original non-private members to be preserved.
+    """
+    code = extract_java_code(reply)
+    if code is None:
+        return PreflightResult(None, ["the reply contains no Java class in a fenced code block"])
+
+    tree, error = _parse(code)
+    if tree is None:
+        hint = " (the reply looks truncated)" if code.count("{") > code.count("}") else ""
+        return PreflightResult(code, [f"the code does not parse: {error}{hint}"])
+
+    problems = []
+    original, _ = _parse(original_code)
+    if original is not None:
+        expected_package = original.package.name if original.package else None
+        actual_package = tree.package.name if tree.package else None
+        if expected_package != actual_package:
+            problems.append(f"package is {actual_package or '(default)'}, expected {expected_package or '(default)'}")
+
+    declared = _target_type(tree, class_name)
+    if declared is None:
+        names = ", ".join(t.name for t in tree.types) or "none"
+        problems.append(f"top-level type {class_name} is not declared (found: {names})")
+    elif check_api and original is not None:
+        expected = _target_type(original, class_name)
+        if expected is not None:
+            missing = sorted(api_signatures(expected) - api_signatures(declared))
+            for signature in missing:
+                problems.append(f"{class_name} no longer declares `{signature}`; keep the existing API unchanged")
+    return PreflightResult(code, problems)
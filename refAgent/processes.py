@@ -0,0 +1,235 @@
+"""
+Subprocess manager for the external tools (Maven, PMD, DesigniteJava, RefactoringMiner).
+
+`subprocess.run(..., capture_output=True)` waits forever on a hung test and
+keeps the whole Maven output in memory. `arun_process` (and its blocking
+wrapper `run_process`) run a command in its own process group and stream its
+output line by line:
+
+- every line goes to a rotating log file per kind of command,
+  `PROCESS_LOG_DIR/<kind>.log` (`PROCESS_LOG_MAX_BYTES`, `PROCESS_LOG_BACKUPS`);
+- only a bounded extract is kept in memory: the last `PROCESS_TAIL_LINES`
+  lines of each stream plus up to `PROCESS_ERROR_LINES` error lines (e.g.
+  Maven `[ERROR]` lines) from anywhere in the output. The number of lines is
+  bounded, not their length: kept lines are whole, so callers can parse them;
+- after `PROCESS_TIMEOUTS[kind]` (default `PROCESS_TIMEOUT_SECONDS`) seconds,
+  or when the awaiting task is cancelled, the whole process group gets SIGTERM
+  and then SIGKILL, so forked test JVMs die with Maven.
+
+The returned `ProcessResult` is a `subprocess.CompletedProcess` whose
+`stdout`/`stderr` hold the extract, so callers parsing the output keep working.
+"""
+import asyncio
+import logging
+import os
+import re
+import shlex
+import signal
+import subprocess
+import threading
+import time
+from collections import deque
+from logging.handlers import RotatingFileHandler
+from typing import Dict, List, Optional, Union
+
+from settings import Settings
+
+_config = Settings()
+
+# return code of a timed out command, as reported by coreutils `timeout`
+TIMEOUT_RETURNCODE = 124
+_ERROR_LINE = re.compile(r"\[ERROR\]|BUILD FAILURE|\berror:|Exception\b|Tests run:.*(?:Failures|Errors): [1-9]")
+_loggers: Dict[str, logging.Logger] = {}
+_loggers_lock = threading.Lock()
+
+
+class ProcessResult(subprocess.CompletedProcess):
+    """Outcome of `run_process`.
+
+    Attributes (besides `args`, `returncode`, `stdout`, `stderr`):
+        duration: Wall time in seconds.
+        timed_out: The command was killed after its timeout.
+        log_path: Log file holding the full output (None when logging is off).
+        lines: Number of output lines, including those not kept in `stdout`/`stderr`.
+    """
+
+    def __init__(self, args, returncode, stdout, stderr, duration: float = 0.0, timed_out: bool = False,
+                 log_path: Optional[str] = None, lines: int = 0):
+        super().__init__(args, returncode, stdout, stderr)
+        self.duration = duration
+        self.timed_out = timed_out
+        self.log_path = log_path
+        self.lines = lines
+
+
+def process_log(kind: str, config: Optional[Settings] = None) -> Optional[logging.Logger]:
+    """Logger writing to the rotating `PROCESS_LOG_DIR/<kind>.log`, or None when logging is off."""
+    config = config or _config
+    if not config.PROCESS_LOG_DIR:
+        return None
+    name = re.sub(r"[^\w.-]", "_", kind) or "process"
+    with _loggers_lock:
+        logger = _loggers.get(name)
+        if logger is None:
+            os.makedirs(config.PROCESS_LOG_DIR, exist_ok=True)
+            handler = RotatingFileHandler(os.path.join(config.PROCESS_LOG_DIR, f"{name}.log"),
+                                          maxBytes=config.PROCESS_LOG_MAX_BYTES, backupCount=config.PROCESS_LOG_BACKUPS,
+                                          encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            logger = logging.getLogger(f"refAgent.processes.{name}")
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            logger.addHandler(handler)
+            _loggers[name] = logger
+        return logger
+
+
+class _Capture:
+    """Bounded extract of one output stream: numbered error lines plus the tail."""
+
+    def __init__(self, tail_lines: int, error_lines: int):
+        self.tail = deque(maxlen=max(1, tail_lines))
+        self.errors: List[tuple] = []
+        self.max_errors = error_lines
+        self.count = 0
+
+    def add(self, line: str):
+        self.tail.append((self.count, line))
+        if len(self.errors) < self.max_errors and _ERROR_LINE.search(line):
+            self.errors.append((self.count, line))
+        self.count += 1
+
+    def text(self) -> str:
+        """Error lines and the tail in output order, with a marker where lines were dropped."""
+        kept = dict(self.errors)
+        kept.update(self.tail)
+        lines, previous = [], -1
+        for index in sorted(kept):
+            if index != previous + 1:
+                lines.append(f"... ({index - previous - 1} lines omitted)")
+            lines.append(kept[index])
+            previous = index
+        return "\n".join(lines)
+
+
+def _kill_group(process, sig):
+    try:
+        os.killpg(process.pid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+async def _pump(stream, capture: _Capture, logger, prefix: str):
+    pending = b""
+    while True:
+        chunk = await stream.read(65536)
+        if not chunk:
+            break
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for raw in lines:
+            line = raw.decode("utf-8", errors="replace").rstrip("\r")
+            capture.add(line)
+            if logger:
+                logger.info("%s %s", prefix, line)
+    if pending:
+        line = pending.decode("utf-8", errors="replace").rstrip("\r")
+        capture.add(line)
+        if logger:
+            logger.info("%s %s", prefix, line)
+
+
+async def arun_process(command: Union[str, List[str]], cwd: Optional[str] = None, kind: str = "process",
+                       timeout: Optional[float] = None, env: Optional[dict] = None,
+                       config: Optional[Settings] = None) -> ProcessResult:
+    """Run `command` (an argument list, or a shell string) with streamed, bounded output.
+
+    Args:
+        command: Argument list run without a shell, or a shell command string.
+        cwd: Working directory.
+        kind: Kind of command ('compile', 'test', 'pmd', ...): selects the log file and the timeout.
+        timeout: Seconds before the process group is killed (default `PROCESS_TIMEOUTS[kind]`
+            or `PROCESS_TIMEOUT_SECONDS`; 0 or None there means no limit).
+        env: Environment for the command (default: inherited).
+    """
+    config = config or _config
+    if timeout is None:
+        timeout = config.PROCESS_TIMEOUTS.get(kind, config.PROCESS_TIMEOUT_SECONDS)
+    logger = process_log(kind, config)
+    log_path = logger.handlers[0].baseFilename if logger else None
+    display = command if isinstance(command, str) else shlex.join(command)
+    started = time.monotonic()
+    try:
+        if isinstance(command, str):
+            process = await asyncio.create_subprocess_shell(command, cwd=cwd, env=env, stdout=asyncio.subprocess.PIPE,
+                                                            stderr=asyncio.subprocess.PIPE, start_new_session=True)
+        else:
+            process = await asyncio.create_subprocess_exec(*command, cwd=cwd, env=env, stdout=asyncio.subprocess.PIPE,
+                                                           stderr=asyncio.subprocess.PIPE, start_new_session=True)
+    except OSError as e:
+        # report a missing executable like the shell would instead of raising
+        return ProcessResult(command, 127, "", str(e), log_path=log_path)
+
+    prefix = f"[{process.pid}]"
+    if logger:
+        logger.info("%s $ %s (cwd=%s, timeout=%s)", prefix, display, cwd or ".", timeout or "none")
+    out, err = (_Capture(config.PROCESS_TAIL_LINES, config.PROCESS_ERROR_LINES) for _ in range(2))
+    pumps = asyncio.gather(_pump(process.stdout, out, logger, prefix), _pump(process.stderr, err, logger, f"{prefix} !"))
+    timed_out = False
+    try:
+        await asyncio.wait_for(asyncio.shield(pumps), timeout=timeout or None)
+        await process.wait()
+    except asyncio.TimeoutError:
+        timed_out = True
+    except asyncio.CancelledError:
+        _kill_group(process, signal.SIGKILL)
+        raise
+    finally:
+        if process.returncode is None:
+            _kill_group(process, signal.SIGTERM)
+            try:
+                await asyncio.wait_for(process.wait(), timeout=config.PROCESS_KILL_GRACE_SECONDS)
+            except asyncio.TimeoutError:
+                _kill_group(process, signal.SIGKILL)
+                await process.wait()
+            # grandchildren holding the pipes are gone with the group; drain what is left
+            try:
+                await asyncio.wait_for(pumps, timeout=config.PROCESS_KILL_GRACE_SECONDS)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                pumps.cancel()
+
+    duration = time.monotonic() - started
+    returncode = TIMEOUT_RETURNCODE if timed_out else process.returncode
+    stderr = err.text()
+    if timed_out:
+        stderr = f"{stderr}\nKilled after {timeout:.0f}s timeout: {display}".lstrip()
+    if logger:
+        logger.info("%s exit %s after %.1fs%s", prefix, returncode, duration, " (timed out)" if timed_out else "")
+    return ProcessResult(command, returncode, out.text(), stderr, duration=duration, timed_out=timed_out,
+                         log_path=log_path, lines=out.count + err.count)
+
+
+def run_process(command: Union[str, List[str]], cwd: Optional[str] = None, kind: str = "process",
+                timeout: Optional[float] = None, env: Optional[dict] = None,
+                config: Optional[Settings] = None) -> ProcessResult:
+    """Blocking `arun_process`, usable from worker threads and from inside a running event loop."""
+    coroutine = arun_process(command, cwd=cwd, kind=kind, timeout=timeout, env=env, config=config)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    # this thread already runs a loop: wait for a private one on another thread
+    result = {}
+
+    def _run():
+        try:
+            result["value"] = asyncio.run(coroutine)
+        except BaseException as e:
+            result["error"] = e
+
+    thread = threading.Thread(target=_run, name=f"process-{kind}", daemon=True)
+    thread.start()
+    thread.join()
+    if "error" in result:
+        raise result["error"]
+    return result["value"]
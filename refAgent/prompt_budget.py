@@ -0,0 +1,116 @@
+"""
+Token-accurate prompt budgeting.
+
+Counts tokens with the model's tokenizer (`tiktoken` when installed, otherwise
+about four characters per token) and fits every request into the model's usable
+window: the context length from `MODEL_CONTEXT_WINDOWS`, further capped by the
+model's tokens-per-minute limit (Groq rejects a request whose prompt plus
+`max_tokens` exceeds it).
+
+- `fits` tells whether a whole class, the candidate carried into the next
+  iteration and a full rewrite fit; classes that do not are never trimmed,
+  because the rewrite is written back over the whole file
+- `output_tokens_for` sizes the generator's `max_tokens` from the class size
+- `fit_max_tokens` clamps a call's `max_tokens` to what is left in the window
+  and raises `PromptTooLarge` when the prompt alone does not fit
+"""
+import functools
+from typing import List, Optional
+
+from refAgent.errors import PermanentLLMError
+from settings import Settings
+
+_config = Settings()
+
+# Tokens added by the chat format for every message (role and separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+CHARS_PER_TOKEN = 4
+
+
+class PromptTooLarge(PermanentLLMError):
+    """The prompt leaves no room for a useful reply in the model's window."""
+
+
+@functools.lru_cache(maxsize=None)
+def _encoding(model: str):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        # Llama 3 / Mixtral / Gemma tokenizers are not bundled; cl100k is a close approximation
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """Number of tokens of `text` for `model`."""
+    if not text:
+        return 0
+    encoding = _encoding(model or "")
+    if encoding is None:
+        return len(text) // CHARS_PER_TOKEN + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages: List[dict], model: Optional[str] = None) -> int:
+    """Prompt tokens of a chat request."""
+    return sum(count_tokens(m.get("content") or "", model) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+class PromptBudget:
+    """Token limits of one model.
+
+    Args:
+        model: Model name (keys of `MODEL_CONTEXT_WINDOWS` / `LLM_RATE_LIMITS`).
+        config: Settings to read the limits from.
+    """
+
+    def __init__(self, model: Optional[str], config: Optional[Settings] = None):
+        self.model = model
+        self.config = config or _config
+        window = self.config.MODEL_CONTEXT_WINDOWS.get(model or "", self.config.DEFAULT_CONTEXT_WINDOW)
+        tokens_per_minute = (self.config.LLM_RATE_LIMITS.get(model or "") or [0, 0])[1]
+        self.limit = min(window, tokens_per_minute) if tokens_per_minute else window
+
+    def count(self, text: str) -> int:
+        return count_tokens(text, self.model)
+
+    def count_messages(self, messages: List[dict]) -> int:
+        return count_message_tokens(messages, self.model)
+
+    def output_tokens_for(self, code: str, cap: Optional[int] = None) -> int:
+        """Expected reply size for a rewrite of `code` (a full class plus some slack)."""
+        expected = int(self.count(code) * self.config.PROMPT_OUTPUT_RATIO) + self.config.PROMPT_MIN_OUTPUT_TOKENS
+        return min(expected, cap) if cap else expected
+
+    def code_budget(self, overhead_tokens: int = 0, carried_candidates: int = 1) -> int:
+        """Largest class (in tokens) whose generator requests fit the window.
+
+        Args:
+            overhead_tokens: System prompt, plan and feedback sent alongside the code.
+            carried_candidates: Earlier candidates `ConversationMemory` keeps in later
+                iterations (the latest one by default); each is about as large as the reply.
+        """
+        available = self.limit - overhead_tokens - self.config.PROMPT_MIN_OUTPUT_TOKENS
+        # the query holds the class, each carried candidate and the reply repeat it
+        return int(available / (1 + (1 + carried_candidates) * self.config.PROMPT_OUTPUT_RATIO))
+
+    def fits(self, code: str, overhead_tokens: int = 0, carried_candidates: int = 1) -> bool:
+        """Whether `code` can be sent whole, with a carried candidate and room for a full rewrite."""
+        return self.count(code) <= self.code_budget(overhead_tokens, carried_candidates)
+
+    def fit_max_tokens(self, messages: List[dict], max_tokens: int) -> int:
+        """Clamp `max_tokens` to the room left after the prompt.
+
+        Raises:
+            PromptTooLarge: when fewer than `PROMPT_MIN_OUTPUT_TOKENS` would be left.
+        """
+        prompt_tokens = self.count_messages(messages)
+        room = self.limit - prompt_tokens
+        if room < min(max_tokens, self.config.PROMPT_MIN_OUTPUT_TOKENS):
+            raise PromptTooLarge(
+                f"Prompt of {prompt_tokens} tokens leaves {room} of {self.limit} tokens for {self.model}'s reply"
+            )
+        return min(max_tokens, room)
@@ -0,0 +1,143 @@
+"""
+Per provider/model rate limiting with adaptive backoff.
+
+Each (provider, model) pair gets a `RateLimiter` holding a requests-per-minute
+and a tokens-per-minute token bucket (limits from `Settings.LLM_RATE_LIMITS`).
+Callers reserve capacity before a request and sleep for the returned delay.
+`Retry-After` and `x-ratelimit-*` headers shrink the buckets or pause the model
+for every caller, and `backoff_delay` gives the jittered exponential delay used
+between retries of transient failures.
+"""
+import random
+import threading
+import time
+from typing import Optional
+
+from refAgent.errors import parse_duration
+from settings import Settings
+
+_config = Settings()
+
+
+class TokenBucket:
+    """Continuously refilling bucket of `per_minute` units.
+
+    `reserve` always succeeds and may leave the bucket in debt; the returned
+    value is how long the caller must wait before the reservation is covered.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        self._refill(now)
+        # a single request larger than the bucket would otherwise never fit
+        self.tokens -= min(float(amount), self.capacity)
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+    def refund(self, amount: float, now: float):
+        self._refill(now)
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def clamp(self, remaining: float, now: float):
+        """Align the bucket with the provider's view of the remaining capacity."""
+        self._refill(now)
+        self.tokens = min(self.tokens, float(remaining))
+
+
+class RateLimiter:
+    """Requests/tokens per minute limiter for one provider model (0 disables a limit)."""
+
+    def __init__(self, requests_per_minute: int = 0, tokens_per_minute: int = 0):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.blocked_until = 0.0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: int) -> float:
+        """Reserve one request and `tokens` prompt tokens; return the seconds to wait first."""
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self.blocked_until - now)
+            if self.requests is not None:
+                wait = max(wait, self.requests.reserve(1, now))
+            if self.tokens is not None:
+                wait = max(wait, self.tokens.reserve(tokens, now))
+            if wait > 0:
+                self.throttled += 1
+            return wait
+
+    def settle(self, reserved_tokens: int, usage: Optional[dict]):
+        """Correct the token bucket with the actual usage reported by the provider."""
+        if self.tokens is None or not usage:
+            return
+        actual = int(usage.get("prompt_tokens") or 0) + int(usage.get("completion_tokens") or 0)
+        with self._lock:
+            now = time.monotonic()
+            if actual > reserved_tokens:
+                self.tokens.reserve(actual - reserved_tokens, now)
+            else:
+                self.tokens.refund(reserved_tokens - actual, now)
+
+    def pause(self, seconds: Optional[float]):
+        """Block every caller of this model for `seconds` (e.g. from Retry-After)."""
+        if not seconds:
+            return
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def observe_headers(self, headers):
+        """Apply `retry-after` and OpenAI/Groq style `x-ratelimit-*` response headers."""
+        if not headers or not hasattr(headers, "get"):
+            return
+        self.pause(parse_duration(headers.get("retry-after")))
+
+        with self._lock:
+            now = time.monotonic()
+            for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                if remaining is None:
+                    continue
+                try:
+                    remaining = float(remaining)
+                except ValueError:
+                    continue
+                if bucket is not None:
+                    bucket.clamp(remaining, now)
+                if remaining <= 0:
+                    reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+                    if reset:
+                        self.blocked_until = max(self.blocked_until, now + reset)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider: str, model: str) -> RateLimiter:
+    """Return the process-wide limiter for `provider`/`model`."""
+    key = (provider, model)
+    with _limiters_lock:
+        if key not in _limiters:
+            limits = _config.LLM_RATE_LIMITS.get(model) or _config.LLM_RATE_LIMITS.get(provider) or [0, 0]
+            _limiters[key] = RateLimiter(limits[0], limits[1])
+        return _limiters[key]
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Jittered exponential backoff ("full jitter"), never shorter than `retry_after`."""
+    ceiling = min(_config.LLM_BACKOFF_MAX_SECONDS, _config.LLM_BACKOFF_BASE_SECONDS * (2 ** attempt))
+    delay = random.uniform(0, ceiling)
+    if retry_after:
+        delay = max(delay, retry_after)
+    return delay
@@ -0,0 +1,64 @@
+"""
+Task-based model routing.
+
+Every LLM call belongs to a task (`planner`, `decision`, `generator`,
+`compile_summary`, `test_summary`) and `MODEL_ROUTES` maps each task to a model
+tier. `MODEL_TIERS[provider]` maps tiers to model names; the `default` tier is
+always the provider's configured model (`GROQ_MODEL`, `MODEL_NAME`,
+`LOCAL_LLM_MODEL`) and a missing tier falls back to it.
+
+Cheap tasks (decisions, summaries) go to the fast tier; the generator moves one
+tier up after every `MODEL_ESCALATE_AFTER` failed iterations on a class.
+"""
+from typing import List, Optional
+
+from settings import Settings
+
+TIER_ORDER = ("fast", "default", "strong")
+
+
+class ModelRouter:
+    """Picks the model for a task on one provider.
+
+    Usage:
+        router = ModelRouter(config, provider)
+        planner = PlannerAgent(api_key, model=router.model_for("planner"), provider=provider)
+        generator.model = router.model_for("generator", failures=failed_iterations)
+    """
+
+    def __init__(self, config: Optional[Settings] = None, provider: Optional[str] = None):
+        self.config = config or Settings()
+        self.provider = provider or self.config.LLM_PROVIDER
+
+    def default_model(self) -> str:
+        if self.provider == 'groq':
+            return self.config.GROQ_MODEL
+        if self.provider == 'local':
+            return self.config.LOCAL_LLM_MODEL
+        return self.config.MODEL_NAME
+
+    def tier_for(self, task: str, failures: int = 0) -> str:
+        """Tier of `task`, escalated one step per `MODEL_ESCALATE_AFTER` failures."""
+        tier = self.config.MODEL_ROUTES.get(task, "default")
+        if tier not in TIER_ORDER:
+            tier = "default"
+        step = failures // self.config.MODEL_ESCALATE_AFTER if self.config.MODEL_ESCALATE_AFTER > 0 else 0
+        return TIER_ORDER[min(TIER_ORDER.index(tier) + step, len(TIER_ORDER) - 1)]
+
+    def model_for(self, task: str, failures: int = 0) -> str:
+        """Model name for `task` after `failures` failed iterations."""
+        tier = self.tier_for(task, failures)
+        if tier == "default":
+            return self.default_model()
+        tiers = self.config.MODEL_TIERS.get(self.provider) or {}
+        return tiers.get(tier) or self.default_model()
+
+    def escalation(self, task: str, failures: int = 0) -> List[str]:
+        """Models for `task` from its tier after `failures` failed iterations up to the strongest, without repeats."""
+        tier = self.tier_for(task, failures)
+        models = []
+        for step in TIER_ORDER[TIER_ORDER.index(tier):]:
+            model = self.default_model() if step == "default" else (self.config.MODEL_TIERS.get(self.provider) or {}).get(step) or self.default_model()
+            if model not in models:
+                models.append(model)
+        return models
@@ -0,0 +1,180 @@
+"""
+Incremental validators for streamed generator replies.
+
+A validator is fed the reply chunk by chunk and returns the reason as soon as
+the reply can no longer become a usable Java class, so the stream is aborted
+and re-requested instead of decoding the rest and handing it to Maven.
+
+`JavaClassStreamValidator` checks that the reply
+
+- opens a fenced code block tagged `java` after at most a short preamble
+  (`MAX_PREAMBLE_CHARS`, e.g. "Here is the refactored class:")
+- never closes more braces than it opened (comments and literals are skipped)
+- declares the target class as its first top-level type
+- has balanced braces at the closing fence
+
+Once the closing fence arrives the validator is `done`: the reply is complete
+and the rest of the stream (usually an explanation) is not read.
+"""
+import re
+from typing import Optional
+
+# "Here is the refactored class:" and similar lead-ins are tolerated, prose is not
+MAX_PREAMBLE_CHARS = 300
+_TYPE_DECLARATION = re.compile(r"(?<![\w$.@])(?:class|interface|enum|record)\s+([A-Za-z_$][\w$]*)(?=[^\w$])")
+
+
+class StreamValidator:
+    """Base class: `feed` each chunk, then `finish`; both return an abort reason or None.
+
+    `done` becomes True once the reply is complete and the stream can be closed.
+    """
+
+    done = False
+
+    def feed(self, chunk: str) -> Optional[str]:
+        return None
+
+    def finish(self) -> Optional[str]:
+        return None
+
+
+class JavaClassStreamValidator(StreamValidator):
+    """Validates a streamed "single fenced java block with one class" reply.
+
+    Args:
+        class_name: Expected name of the top-level class, or None to skip that check.
+        max_preamble: Characters of text allowed before the opening fence.
+    """
+
+    def __init__(self, class_name: Optional[str] = None, max_preamble: int = MAX_PREAMBLE_CHARS):
+        self.class_name = class_name
+        self.max_preamble = max_preamble
+        self.state = "preamble"  # preamble -> fence_info -> code -> closed
+        self.pending = ""
+        self.depth = 0
+        self.header = ""
+        self.declared = None
+        self.in_block_comment = False
+        self.in_text_block = False
+
+    def feed(self, chunk: str) -> Optional[str]:
+        if self.done:
+            return None
+        self.pending += chunk or ""
+        if self.state == "preamble":
+            fence = self.pending.find("```")
+            if fence < 0:
+                # keep two characters back: they may be the start of a split fence
+                if len(self.pending.strip()) - 2 > self.max_preamble:
+                    return f"no code block in the first {self.max_preamble} characters"
+                return None
+            if len(self.pending[:fence].strip()) > self.max_preamble:
+                return f"code block starts after more than {self.max_preamble} characters"
+            self.pending = self.pending[fence + 3:]
+            self.state = "fence_info"
+
+        while "\n" in self.pending and not self.done:
+            line, self.pending = self.pending.split("\n", 1)
+            reason = self._line(line)
+            if reason:
+                return reason
+        return None
+
+    def finish(self) -> Optional[str]:
+        if self.pending and not self.done:
+            line, self.pending = self.pending, ""
+            reason = self._line(line)
+            if reason:
+                return reason
+        if self.state in ("preamble", "fence_info"):
+            return "reply has no code block"
+        if self.state == "code":
+            return "reply ended inside the code block"
+        return None
+
+    def _line(self, line: str) -> Optional[str]:
+        if self.state == "fence_info":
+            language = line.strip().lower()
+            if language not in ("java", ""):
+                return f"code block is tagged '{language}', not 'java'"
+            self.state = "code"
+            return None
+
+        if not self.in_block_comment and not self.in_text_block and line.strip().startswith("```"):
+            self.state = "closed"
+            self.done = True
+            if self.depth != 0:
+                return f"unbalanced braces at the end of the class (depth {self.depth})"
+            if self.class_name and self.declared is None:
+                return "no class declaration in the code block"
+            return None
+
+        for ch in self._code(line):
+            if self.depth == 0 and self.declared is None:
+                self.header += ch
+            if ch == "{":
+                if self.depth == 0 and self.declared is None:
+                    reason = self._check_declaration()
+                    if reason:
+                        return reason
+                self.depth += 1
+            elif ch == "}":
+                self.depth -= 1
+                if self.depth < 0:
+                    return "closing brace without a matching opening brace"
+        if self.depth == 0 and self.declared is None:
+            self.header += "\n"
+            return self._check_declaration()
+        return None
+
+    def _check_declaration(self) -> Optional[str]:
+        match = _TYPE_DECLARATION.search(self.header + " ")
+        if not match:
+            return None
+        self.declared = match.group(1)
+        self.header = ""
+        if self.class_name and self.declared != self.class_name:
+            return f"declares '{self.declared}' instead of '{self.class_name}'"
+        return None
+
+    def _code(self, line: str) -> str:
+        """`line` without comments and string/char literals (literals become a space)."""
+        code = []
+        i, n = 0, len(line)
+        while i < n:
+            if self.in_block_comment:
+                end = line.find("*/", i)
+                if end < 0:
+                    break
+                self.in_block_comment = False
+                i = end + 2
+                continue
+            if self.in_text_block:
+                end = line.find('"""', i)
+                if end < 0:
+                    break
+                self.in_text_block = False
+                i = end + 3
+                continue
+            if line.startswith("//", i):
+                break
+            if line.startswith("/*", i):
+                self.in_block_comment = True
+                i += 2
+                continue
+            if line.startswith('"""', i):
+                self.in_text_block = True
+                i += 3
+                continue
+            ch = line[i]
+            if ch in "\"'":
+                j = i + 1
+                while j < n and line[j] != ch:
+                    j += 2 if line[j] == "\\" else 1
+                code.append(" ")
+                i = j + 1
+                continue
+            code.append(ch)
+            i += 1
+        return "".join(code)
@@ -0,0 +1,119 @@
+"""
+Surefire report parsing.
+
+Every test class run by Surefire leaves a `TEST-<class>.xml` report in its
+module's `target/surefire-reports`. `collect_reports` reads the reports
+written since a given time into per-test-method outcomes, so a batched
+`mvn -Dtest=A,B,C test` yields a precise list of failures instead of a wall of
+console output.
+
+Each outcome is a dict:
+    {"class": "org.example.FooTest", "name": "testBar", "status": "failed",
+     "type": "java.lang.AssertionError", "message": "...", "trace": "...", "time": 0.01}
+
+`status` is 'passed', 'failed', 'error', 'skipped' or 'flaky' (failed, then
+passed on a rerun).
+"""
+import os
+import xml.etree.ElementTree as ET
+from typing import Iterable, List, Optional
+
+REPORTS_DIR = os.path.join("target", "surefire-reports")
+TRACE_LINES = 15
+
+
+def simple_name(class_name: str) -> str:
+    """`org.example.FooTest#testBar` -> `FooTest`."""
+    return class_name.split("#", 1)[0].rsplit(".", 1)[-1]
+
+
+def _outcome(testcase) -> dict:
+    outcome = {
+        "class": testcase.get("classname") or "",
+        "name": testcase.get("name") or "",
+        "status": "passed",
+        "type": None,
+        "message": None,
+        "trace": None,
+        "time": float(testcase.get("time") or 0.0),
+    }
+    for child in testcase:
+        tag = child.tag.rsplit("}", 1)[-1]
+        if tag in ("failure", "error"):
+            status = "failed" if tag == "failure" else "error"
+        elif tag in ("flakyFailure", "flakyError"):
+            status = "flaky"
+        elif tag == "skipped":
+            status = "skipped"
+        else:
+            continue
+        # a real failure wins over skipped/flaky markers
+        if outcome["status"] in ("passed", "skipped", "flaky"):
+            outcome["status"] = status
+            outcome["type"] = child.get("type")
+            outcome["message"] = child.get("message")
+            trace = (child.text or "").strip()
+            outcome["trace"] = "\n".join(trace.splitlines()[:TRACE_LINES]) or None
+    return outcome
+
+
+def parse_report(path: str) -> List[dict]:
+    """Outcomes of every test case in one `TEST-*.xml` report."""
+    try:
+        root = ET.parse(path).getroot()
+    except (ET.ParseError, OSError):
+        return []
+    suites = [root] if root.tag.rsplit("}", 1)[-1] == "testsuite" else root.iter("testsuite")
+    outcomes = []
+    for suite in suites:
+        for testcase in suite.iter("testcase"):
+            outcome = _outcome(testcase)
+            outcome["class"] = outcome["class"] or suite.get("name") or ""
+            outcomes.append(outcome)
+    return outcomes
+
+
+def collect_reports(project_dir: str, modules: Iterable[str] = ("",), since: Optional[float] = None,
+                    classes: Optional[Iterable[str]] = None) -> List[dict]:
+    """Outcomes from the Surefire reports of `modules` written at or after `since`.
+
+    Args:
+        project_dir: Project root.
+        modules: Module directories relative to the root ("" for the root module).
+        since: `time.time()` before the run; older (stale) reports are ignored.
+        classes: Only keep these test classes (simple or qualified names).
+    """
+    wanted = {simple_name(c) for c in classes} if classes else None
+    outcomes = []
+    for module in modules:
+        directory = os.path.join(project_dir, module, REPORTS_DIR)
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            if not (name.startswith("TEST-") and name.endswith(".xml")):
+                continue
+            path = os.path.join(directory, name)
+            # mtime resolution can be coarse; allow a second of slack
+            if since is not None and os.path.getmtime(path) < since - 1:
+                continue
+            for outcome in parse_report(path):
+                if wanted is None or simple_name(outcome["class"]) in wanted:
+                    outcomes.append(outcome)
+    return outcomes
+
+
+def failures(outcomes: Optional[List[dict]]) -> List[dict]:
+    return [o for o in outcomes or [] if o["status"] in ("failed", "error")]
+
+
+def format_failure(outcome: dict) -> str:
+    """One failing test as text for a summary prompt or the generator's feedback."""
+    header = f"{simple_name(outcome['class'])}.{outcome['name']} {outcome['status']}"
+    if outcome["type"]:
+        header += f" ({outcome['type']})"
+    lines = [header]
+    if outcome["message"]:
+        lines.append(f"  {outcome['message'].strip()}")
+    if outcome["trace"]:
+        lines.extend(f"    {line.strip()}" for line in outcome["trace"].splitlines()[1:])
+    return "\n".join(lines)
@@ -0,0 +1,116 @@
+"""
+Baseline test health.
+
+A test that already fails, or is flaky, on the unmodified project is not a
+regression. Without this check the loop spent every iteration, with an LLM
+summary each time, trying to "fix" it. `TestHealth` records the status of each
+test method on the baseline tree:
+
+- 'passed', 'failed' or 'error';
+- 'skipped';
+- 'flaky': it failed and then passed on a Surefire rerun
+  (`TEST_HEALTH_RERUNS`), or its status differed between the
+  `TEST_HEALTH_RUNS` baseline runs.
+
+Statuses are stored per project commit in
+`TEST_HEALTH_DIR/<project>/<commit>.json`. Test classes are measured lazily
+the first time they are selected, before any candidate is written.
+`new_failures` then keeps only the failures of tests that passed on the
+baseline or were never measured.
+"""
+import json
+import os
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from refAgent import surefire
+from refAgent.coverage import project_commit
+from settings import Settings
+from utilities import run_maven_tests
+
+_config = Settings()
+
+
+def test_id(outcome: dict) -> str:
+    return f"{surefire.simple_name(outcome['class'])}.{outcome['name']}"
+
+
+class TestHealth:
+    """Baseline status of the tests of one project commit.
+
+    Args:
+        path: JSON file the statuses are persisted to (None keeps them in memory).
+        config: Settings with the `TEST_HEALTH_*` options.
+    """
+
+    def __init__(self, path: Optional[str] = None, config: Optional[Settings] = None):
+        self.path = path
+        self.config = config or _config
+        self.status: Dict[str, str] = {}
+        self.measured = set()
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                self.status = data.get("status", {})
+                self.measured = set(data.get("measured", []))
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable test health cache {path}: {e}")
+
+    @classmethod
+    def for_project(cls, project_name: str, config: Optional[Settings] = None) -> Optional["TestHealth"]:
+        """The health cache of `projects/before/<project>`'s commit, or None when disabled."""
+        config = config or _config
+        if not config.TEST_HEALTH_ENABLED:
+            return None
+        commit = project_commit(f"projects/before/{project_name}")
+        path = os.path.join(config.TEST_HEALTH_DIR, project_name, f"{commit}.json") if commit else None
+        return cls(path, config)
+
+    def unknown(self, classes: Iterable[str]) -> List[str]:
+        with self._lock:
+            return [c for c in classes if surefire.simple_name(c) not in self.measured]
+
+    def ensure(self, classes: Iterable[str], project_dir: str, test_files: Optional[List[str]] = None):
+        """Run the not yet measured `classes` on the unmodified `project_dir` and record their statuses."""
+        classes = self.unknown(classes)
+        if not classes:
+            return
+        runs = []
+        for _ in range(max(1, self.config.TEST_HEALTH_RUNS)):
+            process = run_maven_tests(classes, project_dir=project_dir, changed_files=test_files,
+                                      fork_count=self.config.TEST_FORK_COUNT, rerun_failing=self.config.TEST_HEALTH_RERUNS)
+            runs.append({test_id(o): o["status"] for o in process.collected})
+
+        statuses = {}
+        for run in runs:
+            for test, status in run.items():
+                previous = statuses.get(test)
+                statuses[test] = status if previous in (None, status) else "flaky"
+        # a test missing from some runs did not run reliably either
+        for test in statuses:
+            if any(test not in run for run in runs):
+                statuses[test] = "flaky"
+
+        with self._lock:
+            self.status.update(statuses)
+            self.measured.update(surefire.simple_name(c) for c in classes)
+            bad = {t: s for t, s in statuses.items() if s not in ("passed", "skipped")}
+            self._save()
+        if bad:
+            print(f"Baseline failures/flaky tests (ignored when refactoring): {bad}")
+
+    def new_failures(self, failures: List[dict]) -> List[dict]:
+        """Failures of tests that passed on the baseline (or were never measured)."""
+        with self._lock:
+            return [o for o in failures if self.status.get(test_id(o), "passed") in ("passed", "skipped")]
+
+    def _save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"status": self.status, "measured": sorted(self.measured)}, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.path)
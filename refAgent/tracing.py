@@ -0,0 +1,196 @@
+"""
+Lightweight span tracing for the RefAgent pipeline.
+
+Spans are recorded in memory by a process-wide `tracer` and can be exported as
+Chrome trace JSON (open in chrome://tracing or https://ui.perfetto.dev) or as a
+per-class timing breakdown. In batch mode spans are tagged with their project;
+a project's spans are exported and then dropped with `drain(project)`.
+
+Usage:
+    from refAgent.tracing import tracer, traced
+
+    with tracer.project_scope(project_name):
+        with tracer.span("graph.build", "graph", target=target_class):
+            ...
+
+    @traced("maven.compile", "maven")
+    def compile_project_with_maven(...):
+        ...
+"""
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+
+class Tracer:
+    """Collects complete ("X") trace events with microsecond timestamps.
+
+    Spans opened inside `project_scope(project)` / `class_scope(name, project)` are
+    tagged with the project and class so a per-class breakdown can be produced
+    even when classes of several projects run on worker threads or as concurrent
+    asyncio tasks (the scopes are context variables).
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.events = []
+        self.pid = os.getpid()
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._class_name = contextvars.ContextVar("trace_class_name", default=None)
+        self._project = contextvars.ContextVar("trace_project", default=None)
+
+    def _now_us(self) -> float:
+        return (time.perf_counter() - self._origin) * 1_000_000
+
+    @contextmanager
+    def project_scope(self, project: str):
+        """Tag every span opened by this thread with `project` until the block exits."""
+        token = self._project.set(project)
+        try:
+            with self.span(f"project {project}", "project"):
+                yield
+        finally:
+            self._project.reset(token)
+
+    @contextmanager
+    def class_scope(self, class_name: str, project: Optional[str] = None):
+        """Tag every span opened by this thread with `class_name` (and `project`) until the block exits.
+
+        Worker threads do not inherit the caller's `project_scope`, so pass `project` there.
+        """
+        class_token = self._class_name.set(class_name)
+        project_token = self._project.set(project) if project is not None else None
+        try:
+            with self.span(f"class {class_name}", "class"):
+                yield
+        finally:
+            if project_token is not None:
+                self._project.reset(project_token)
+            self._class_name.reset(class_token)
+
+    @contextmanager
+    def span(self, name: str, category: str = "pipeline", **args):
+        """Record the duration of the enclosed block as one trace event.
+
+        Yields the span's `args` dict so the block can attach results (e.g. token usage).
+        """
+        if not self.enabled:
+            yield args
+            return
+        start = self._now_us()
+        try:
+            yield args
+        finally:
+            duration = self._now_us() - start
+            class_name = self._class_name.get()
+            if class_name is not None:
+                args.setdefault("class", class_name)
+            project = self._project.get()
+            if project is not None:
+                args.setdefault("project", project)
+            event = {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": round(start, 3),
+                "dur": round(duration, 3),
+                "pid": self.pid,
+                "tid": threading.get_ident(),
+                "args": {k: _jsonable(v) for k, v in args.items()},
+            }
+            with self._lock:
+                self.events.append(event)
+
+    def clear(self):
+        with self._lock:
+            self.events = []
+
+    def drain(self, project: str) -> list:
+        """Remove and return the spans of `project`."""
+        with self._lock:
+            drained = [e for e in self.events if e["args"].get("project") == project]
+            self.events = [e for e in self.events if e["args"].get("project") != project]
+        return drained
+
+    def _events(self, project: Optional[str] = None) -> list:
+        with self._lock:
+            if project is None:
+                return list(self.events)
+            return [e for e in self.events if e["args"].get("project") == project]
+
+    def class_breakdown(self, class_name: str, project: Optional[str] = None) -> dict:
+        """Summarize time spent per category and per span name for one class (of `project`).
+
+        Returns:
+            dict with `total_seconds`, `by_category` and `by_span`; each entry of
+            the last two maps to {"count": int, "seconds": float}.
+        """
+        events = [e for e in self._events(project) if e["args"].get("class") == class_name]
+
+        by_category = {}
+        by_span = {}
+        total = 0.0
+        for e in events:
+            seconds = e["dur"] / 1_000_000
+            if e["cat"] == "class":
+                total += seconds
+                continue
+            for bucket, key in ((by_category, e["cat"]), (by_span, e["name"])):
+                entry = bucket.setdefault(key, {"count": 0, "seconds": 0.0})
+                entry["count"] += 1
+                entry["seconds"] = round(entry["seconds"] + seconds, 6)
+        return {"class": class_name, "project": project, "total_seconds": round(total, 6), "by_category": by_category, "by_span": by_span}
+
+    def export_chrome_trace(self, file_path: str, project: Optional[str] = None):
+        """Write the recorded spans (of `project`, or all) as a Chrome trace (`traceEvents`) JSON file."""
+        events = self._events(project)
+        directory = os.path.dirname(file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(file_path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    def export_class_timings(self, class_name: str, file_path: str, project: Optional[str] = None):
+        """Write the `class_breakdown` for one class as JSON."""
+        directory = os.path.dirname(file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(file_path, "w", encoding="utf-8") as f:
+            json.dump(self.class_breakdown(class_name, project), f, indent=4)
+
+
+def _jsonable(value):
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
+
+
+def _enabled_from_settings() -> bool:
+    try:
+        from settings import Settings
+        return Settings().TRACE_ENABLED
+    except Exception:
+        return True
+
+
+# Process-wide tracer shared by the pipeline, agents and utilities
+tracer = Tracer(enabled=_enabled_from_settings())
+
+
+def traced(name: Optional[str] = None, category: str = "pipeline"):
+    """Decorator recording each call of the wrapped function as a span."""
+    def decorator(fn):
+        span_name = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with tracer.span(span_name, category):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
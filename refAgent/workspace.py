@@ -0,0 +1,274 @@
+"""
+Build workspaces.
+
+A workspace is a directory tree in which a candidate class is written,
+compiled and tested. `create_workspace` tries, in order (or only the one
+named by `WORKSPACE_STRATEGY`):
+
+- `overlay`: an overlayfs mount over the source tree. Creation is O(1), and
+  writes (including Maven's `target/`) go to an upper directory, so only
+  changed files cost anything. Needs mount privileges (root under `auto`).
+- `worktree`: `git worktree add` of the source checkout's HEAD. git writes
+  every tracked file but shares the object store, so `.git` is not copied.
+  The source's `target/` directories are copied in. `auto` only uses it for
+  a checkout without local changes or untracked files, which it would drop.
+- `hardlink`: every file is walked and hardlinked, so creation is O(files)
+  but copies no source bytes. `.git` and `target/` are copied, because git
+  and Maven (javac) rewrite files there in place.
+- `copy`: a plain `shutil.copytree`.
+
+Without mount privileges a workspace therefore costs O(files) plus a copy of
+the build outputs (and of `.git` for `hardlink`), not O(changed files).
+
+Hardlinked files are shared with the source tree, so they must never be
+modified in place. `Workspace.write` (and `atomic_write`) write a temporary
+file and `os.replace` it, which gives the workspace its own inode. The first
+write of a path keeps the original bytes, so `rollback` restores the file
+exactly, even when the generator only saw a trimmed version of the class.
+
+Usage:
+    workspace = create_workspace("projects/after/jclouds", "projects/workspaces/jclouds/Foo")
+    path = workspace.path_for("projects/after/jclouds/core/src/main/java/Foo.java")
+    workspace.write(path, code)
+    ...
+    workspace.rollback()
+    workspace.remove()
+
+CLI (used by run_refAgent.sh to create `projects/after/<repo>`):
+    python -m refAgent.workspace projects/before/jclouds projects/after/jclouds
+"""
+import sys
+import os
+
+# Add parent directory to path so relative imports work
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import shutil
+import subprocess
+import tempfile
+from typing import Dict, Optional, Union
+
+from settings import Settings
+
+_config = Settings()
+
+STRATEGIES = ("overlay", "worktree", "hardlink", "copy")
+# directories rewritten in place by git or Maven: copied, never hardlinked
+COPIED_DIRS = (".git", "target")
+_LAYERS = ".refagent-layers"
+
+
+def atomic_write(path: str, data: Union[str, bytes]):
+    """Replace `path` with `data` (text or bytes) via a temporary file and `os.replace`.
+
+    This never modifies the existing inode, which may be hardlinked into another tree.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=".refagent-", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data.encode("utf-8") if isinstance(data, str) else data)
+        if os.path.exists(path):
+            shutil.copymode(path, tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def _copy_build_dirs(source: str, dest: str):
+    """Copy every `target/` directory of `source` to the same place under `dest`."""
+    for root, dirs, _ in os.walk(source):
+        dirs[:] = [d for d in dirs if d != ".git"]
+        if "target" in dirs:
+            relative = os.path.relpath(os.path.join(root, "target"), source)
+            shutil.copytree(os.path.join(source, relative), os.path.join(dest, relative), symlinks=True, dirs_exist_ok=True)
+            dirs.remove("target")
+
+
+def _hardlink_tree(source: str, dest: str):
+    for root, dirs, files in os.walk(source):
+        relative = os.path.relpath(root, source)
+        target_root = os.path.normpath(os.path.join(dest, relative))
+        os.makedirs(target_root, exist_ok=True)
+        for name in list(dirs):
+            path = os.path.join(root, name)
+            if name in COPIED_DIRS or os.path.islink(path):
+                if os.path.islink(path):
+                    os.symlink(os.readlink(path), os.path.join(target_root, name))
+                else:
+                    shutil.copytree(path, os.path.join(target_root, name), symlinks=True)
+                dirs.remove(name)
+        for name in files:
+            path = os.path.join(root, name)
+            target = os.path.join(target_root, name)
+            if os.path.islink(path):
+                os.symlink(os.readlink(path), target)
+                continue
+            try:
+                os.link(path, target)
+            except OSError:
+                # other filesystem or link limit reached
+                shutil.copy2(path, target)
+
+
+def _overlay(source: str, dest: str) -> bool:
+    layers = os.path.join(os.path.dirname(os.path.abspath(dest)), _LAYERS, os.path.basename(dest))
+    upper, work = os.path.join(layers, "upper"), os.path.join(layers, "work")
+    for directory in (upper, work, dest):
+        os.makedirs(directory, exist_ok=True)
+    options = f"lowerdir={os.path.abspath(source)},upperdir={upper},workdir={work}"
+    try:
+        process = subprocess.run(["mount", "-t", "overlay", "overlay", "-o", options, dest], capture_output=True, text=True)
+    except OSError:
+        process = None
+    if process is not None and process.returncode == 0:
+        return True
+    shutil.rmtree(layers, ignore_errors=True)
+    os.rmdir(dest)
+    return False
+
+
+def _clean_checkout(source: str) -> bool:
+    """True if `source` is a git checkout that `git worktree add` reproduces (no changes, no untracked files)."""
+    if not os.path.exists(os.path.join(source, ".git")):
+        return False
+    try:
+        process = subprocess.run(["git", "-C", source, "status", "--porcelain"], capture_output=True, text=True)
+    except OSError:
+        return False
+    return process.returncode == 0 and not process.stdout.strip()
+
+
+def _worktree(source: str, dest: str) -> bool:
+    if not os.path.exists(os.path.join(source, ".git")):
+        return False
+    try:
+        process = subprocess.run(["git", "-C", source, "worktree", "add", "--detach", os.path.abspath(dest)],
+                                 capture_output=True, text=True)
+    except OSError:
+        return False
+    if process.returncode != 0:
+        return False
+    _copy_build_dirs(source, dest)
+    return True
+
+
+class Workspace:
+    """A tree to write candidates into, with exact per-file rollback.
+
+    Args:
+        path: Root of the workspace.
+        source: Tree it was created from (None for a workspace used in place).
+        strategy: How it was created ('in-place', 'overlay', 'worktree', 'hardlink' or 'copy').
+    """
+
+    def __init__(self, path: str, source: Optional[str] = None, strategy: str = "in-place"):
+        self.path = path
+        self.source = source
+        self.strategy = strategy
+        self._originals: Dict[str, Optional[bytes]] = {}
+
+    def path_for(self, path: Optional[str]) -> Optional[str]:
+        """The workspace path of `path` (a path in the source tree); other paths are returned unchanged."""
+        if not path or not self.source:
+            return path
+        source = os.path.abspath(self.source)
+        absolute = os.path.abspath(path)
+        if os.path.commonpath([source, absolute]) != source:
+            return path
+        return os.path.join(self.path, os.path.relpath(absolute, source))
+
+    def write(self, path: str, text: str):
+        """Atomically replace `path`, remembering its original content for `rollback`."""
+        if path not in self._originals:
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    self._originals[path] = f.read()
+            else:
+                self._originals[path] = None
+        atomic_write(path, text)
+
+    def rollback(self, path: Optional[str] = None):
+        """Restore `path` (or every written file) to its content before the first `write`."""
+        paths = [path] if path else list(self._originals)
+        for p in paths:
+            if p not in self._originals:
+                continue
+            original = self._originals.pop(p)
+            if original is None:
+                if os.path.exists(p):
+                    os.unlink(p)
+            else:
+                atomic_write(p, original)
+
+    def remove(self):
+        """Delete a created workspace; a workspace used in place is only rolled back."""
+        if self.source is None:
+            self.rollback()
+            return
+        remove_workspace(self.path)
+
+
+def remove_workspace(path: str):
+    """Remove a workspace whatever strategy created it (unmount, drop the worktree or delete)."""
+    if not os.path.lexists(path):
+        return
+    if os.path.ismount(path):
+        subprocess.run(["umount", path], capture_output=True)
+        shutil.rmtree(os.path.join(os.path.dirname(os.path.abspath(path)), _LAYERS, os.path.basename(path)), ignore_errors=True)
+    elif os.path.isfile(os.path.join(path, ".git")):
+        # a worktree's .git is a file pointing back at the main checkout
+        subprocess.run(["git", "-C", path, "worktree", "remove", "--force", os.path.abspath(path)], capture_output=True)
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def create_workspace(source: str, dest: str, strategy: Optional[str] = None, config: Optional[Settings] = None) -> Workspace:
+    """Create `dest` from `source` with the first strategy that works.
+
+    Args:
+        source: Existing project tree.
+        dest: Workspace directory; an existing one is removed first.
+        strategy: 'auto' or one of `STRATEGIES` (default `WORKSPACE_STRATEGY`).
+    """
+    config = config or _config
+    strategy = strategy or config.WORKSPACE_STRATEGY
+    candidates = STRATEGIES if strategy == "auto" else (strategy,)
+    if strategy == "auto":
+        # overlay needs mount privileges; a git worktree drops local changes and untracked files
+        clean = _clean_checkout(source)
+        candidates = tuple(s for s in candidates if (s != "worktree" or clean) and (s != "overlay" or os.geteuid() == 0))
+
+    remove_workspace(dest)
+    os.makedirs(os.path.dirname(os.path.abspath(dest)), exist_ok=True)
+    for candidate in candidates:
+        if candidate == "overlay" and _overlay(source, dest):
+            return Workspace(dest, source, "overlay")
+        if candidate == "worktree" and _worktree(source, dest):
+            return Workspace(dest, source, "worktree")
+        if candidate == "hardlink":
+            try:
+                _hardlink_tree(source, dest)
+                return Workspace(dest, source, "hardlink")
+            except OSError as e:
+                print(f"Hardlinked workspace failed ({e}), copying {source}")
+                shutil.rmtree(dest, ignore_errors=True)
+        if candidate == "copy":
+            shutil.copytree(source, dest, symlinks=True)
+            return Workspace(dest, source, "copy")
+    raise RuntimeError(f"Could not create workspace {dest} from {source} with strategy '{strategy}'")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create a build workspace from a project tree")
+    parser.add_argument("source", help="Existing project tree, e.g. projects/before/<repo>")
+    parser.add_argument("dest", help="Workspace to (re)create, e.g. projects/after/<repo>")
+    # the after tree outlives this process, so it is not an overlay mount by default
+    parser.add_argument("--strategy", default="hardlink", choices=("auto",) + STRATEGIES)
+    args = parser.parse_args()
+
+    workspace = create_workspace(args.source, args.dest, args.strategy)
+    print(f"Created {workspace.path} from {args.source} ({workspace.strategy})")
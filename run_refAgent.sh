@@ -32,16 +32,17 @@ else
     }
 fi
 
-# === STEP 2: Copy to 'after' directory ===
-echo "📄 Copying project to $AFTER_PATH..."
-rm -rf "$AFTER_PATH"
-mkdir -p "$(dirname "$AFTER_PATH")"
-cp -r "$BEFORE_PATH" "$AFTER_PATH"
+# === STEP 2: Create the 'after' workspace ===
+# Files are hardlinked (.git is copied); RefAgent replaces files atomically, so
+# projects/before is never modified through the links
+echo "📄 Creating workspace $AFTER_PATH..."
+python3 -m refAgent.workspace "$BEFORE_PATH" "$AFTER_PATH"
 
 # === STEP 3: Build using Maven ===
+# Cold build (go-offline + install) once per commit; later runs restore the
+# cached target/ directories from data/build_cache
 echo "🔧 Building project in $AFTER_PATH..."
-cd "$AFTER_PATH"
-if ! mvn clean install -DskipTests; then
+if ! python3 -m refAgent.baseline "$REPO"; then
     echo "❌ Maven build failed in $AFTER_PATH"
     exit 1
 fi
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Dict, List, Optional
 try:
     from pydantic_settings import BaseSettings
 except Exception:
@@ -15,12 +15,46 @@ class Settings(BaseSettings):
     GITHUB_API_KEY: str = ""
     MODEL_NAME: str = "gpt-4"
 
-    # LLM Provider: 'openai' or 'groq' (recommended for cost savings)
+    # LLM Provider: 'openai', 'groq' (recommended for cost savings) or 'local'
     LLM_PROVIDER: str = 'groq'
     
     # Groq model options: 'mixtral-8x7b-32768', 'llama-3.1-8b-instant', 'llama-3.1-70b-versatile', 'gemma-7b-it'
     GROQ_MODEL: str = 'llama-3.1-8b-instant'
 
+    # Local OpenAI-compatible server (llama.cpp server, vLLM, Ollama) for LLM_PROVIDER='local'.
+    # Requests beyond the server's parallel slots would only queue there, so they wait here.
+    LOCAL_LLM_BASE_URL: str = "http://127.0.0.1:8080/v1"
+    LOCAL_LLM_MODEL: str = "qwen2.5-coder-7b-instruct"
+    LOCAL_LLM_API_KEY: str = "local"
+    LOCAL_LLM_PARALLEL_SLOTS: int = 4
+
+    # Model routing (refAgent.routing): task -> tier ('fast', 'default', 'strong').
+    # 'default' is the provider's model above; missing tiers fall back to it.
+    MODEL_ROUTES: Dict[str, str] = {
+        'planner': 'default',
+        'decision': 'fast',
+        'generator': 'default',
+        'compile_summary': 'fast',
+        'test_summary': 'fast',
+    }
+    MODEL_TIERS: Dict[str, Dict[str, str]] = {
+        'groq': {'fast': 'llama-3.1-8b-instant', 'strong': 'llama-3.1-70b-versatile'},
+        'openai': {'fast': 'gpt-4o-mini', 'strong': 'gpt-4'},
+        'local': {},
+    }
+    # The generator moves one tier up after this many failed iterations (0 = never)
+    MODEL_ESCALATE_AFTER: int = 3
+
+    # Hedged requests (refAgent.hedging): agents (tasks as in MODEL_ROUTES) whose replies are
+    # raced against LLM_HEDGE_PROVIDER/LLM_HEDGE_MODEL when the first token is late
+    LLM_HEDGE_AGENTS: List[str] = []
+    LLM_HEDGE_PROVIDER: str = 'openai'
+    LLM_HEDGE_MODEL: str = 'gpt-4o-mini'
+    # Deadline = this percentile of the primary model's recent time-to-first-token
+    LLM_HEDGE_PERCENTILE: float = 95.0
+    LLM_HEDGE_MIN_SAMPLES: int = 20
+    LLM_HEDGE_INITIAL_DEADLINE_SECONDS: float = 20.0
+
     # Per-agent token limits (defaults can be overridden via .env)
     # Reduced for llama-3.1-8b to maximize RPM
     DEFAULT_MAX_TOKENS: int = 8192
@@ -28,6 +62,11 @@ class Settings(BaseSettings):
     PLANNER_MAX_TOKENS: int = 4096
     COMPILER_MAX_TOKENS: int = 4096
     TEST_MAX_TOKENS: int = 4096
+    # Compile/test failures are fed back as parsed, structured text (refAgent.feedback). The LLM
+    # summarizes them 'off' = never, 'fallback' = only when nothing could be parsed, or 'always'
+    LLM_FAILURE_SUMMARY: str = "fallback"
+    FAILURE_FEEDBACK_MAX_ITEMS: int = 10
+    FAILURE_FEEDBACK_FRAMES: int = 3
 
     # Detector configuration: which external tool to use to pick god classes
     # Supported values: 'pmd', 'deodorant', 'findbugs', 'heuristic'
@@ -36,5 +75,172 @@ class Settings(BaseSettings):
     DEODORANT_PATH: Optional[str] = None
     DETECTOR_TOP_N: int = 5
 
+    # Run budget (0 disables a limit). Classes are processed cheapest-first and
+    # iterations left unused by finished classes go to classes that already compile.
+    BUDGET_MAX_TOKENS: int = 0
+    BUDGET_MAX_COST_USD: float = 0.0
+    BUDGET_MAX_WALL_SECONDS: int = 0
+    BUDGET_BASE_ITERATIONS: int = 20
+    BUDGET_MAX_ITERATIONS_PER_CLASS: int = 30
+    # Stop a class after this many iterations without a compiling candidate (0 = never)
+    BUDGET_STALL_ITERATIONS: int = 0
+    BUDGET_DEFAULT_BUILD_SECONDS: float = 60.0
+    BUDGET_BUILD_TIMES_PATH: str = "data/build_times.json"
+    # USD per 1M tokens as [input, output]
+    MODEL_PRICES: Dict[str, List[float]] = {
+        'llama-3.1-8b-instant': [0.05, 0.08],
+        'llama-3.1-70b-versatile': [0.59, 0.79],
+        'mixtral-8x7b-32768': [0.24, 0.24],
+        'gemma-7b-it': [0.07, 0.07],
+        'gpt-4': [30.0, 60.0],
+        'gpt-4o-mini': [0.15, 0.6],
+    }
+
+    # Batch mode (refAgent.batch): many projects from one long-lived process
+    REPOSITORIES_FILE: str = "data/repositories.txt"
+    BATCH_MAX_PROJECTS: int = 2
+    BATCH_MAX_WORKERS: int = 4
+    # Classes of one project share projects/after/<project>, so keep this at 1
+    # unless each class gets its own workspace (WORKSPACE_PER_CLASS)
+    BATCH_PER_PROJECT_CONCURRENCY: int = 1
+    # Build workspaces (refAgent.workspace): 'auto', 'overlay', 'worktree', 'hardlink' or 'copy'
+    WORKSPACE_STRATEGY: str = "auto"
+    # Give every class its own workspace under WORKSPACE_DIR instead of editing projects/after in place
+    WORKSPACE_PER_CLASS: bool = False
+    WORKSPACE_DIR: str = "projects/workspaces"
+    # Shared Maven local repository for every build (None = ~/.m2/repository)
+    MAVEN_LOCAL_REPO: Optional[str] = None
+
+    # Maven invocation (refAgent.maven)
+    MAVEN_EXECUTABLE: str = "mvn"
+    # Build only the modules owning the changed files and their upstream modules (-pl ... -am)
+    MAVEN_SCOPE_TO_MODULE: bool = True
+    # Parallel reactor builds, e.g. "1C" for one thread per core (None = sequential)
+    MAVEN_THREADS: Optional[str] = None
+    MAVEN_OFFLINE: bool = False
+    MAVEN_QUIET: bool = True
+    # 'clean' before every iteration compile; off reuses the baseline build's target/ directories
+    MAVEN_CLEAN_COMPILE: bool = False
+    # Baseline build outputs (target/ of every module) per project commit (refAgent.baseline)
+    BUILD_CACHE_DIR: str = "data/build_cache"
+    # Run the selected test classes in one 'mvn -Dtest=A,B,C test' and read Surefire reports
+    TEST_BATCH_ENABLED: bool = True
+    # Surefire forkCount for batched runs, e.g. "1C" (None = Surefire's default single fork)
+    TEST_FORK_COUNT: Optional[str] = None
+    # Baseline test health (refAgent.test_health): tests failing or flaky before refactoring are
+    # not counted as regressions. Statuses are cached per project commit under TEST_HEALTH_DIR.
+    TEST_HEALTH_ENABLED: bool = True
+    TEST_HEALTH_DIR: str = "data/test_health"
+    # baseline runs per test class; a test whose status differs between runs is flaky
+    TEST_HEALTH_RUNS: int = 1
+    # Surefire reruns of failing baseline tests (rerunFailingTestsCount); pass-on-rerun = flaky
+    TEST_HEALTH_RERUNS: int = 2
+    # Static checks of generator replies before they are written and built (refAgent.preflight)
+    PREFLIGHT_ENABLED: bool = True
+    # also require every non-private member of the original class to keep its signature
+    PREFLIGHT_CHECK_API: bool = True
+    # Coverage-based test selection (refAgent.coverage): JaCoCo map built once per project commit
+    COVERAGE_SELECTION_ENABLED: bool = True
+    COVERAGE_CACHE_DIR: str = "data/coverage"
+    COVERAGE_MAX_TEST_CLASSES: int = 500
+    # give up on coverage when none of the first N test classes produced a JaCoCo report
+    COVERAGE_PROBE_TESTS: int = 3
+    JACOCO_VERSION: str = "0.8.12"
+
+    # Warm compile server (compile_server/CompileServer.java, needs a JDK 11+): compiles only
+    # the rewritten file against target/classes instead of 'mvn clean compile'
+    COMPILE_SERVER_ENABLED: bool = True
+    COMPILE_SERVER_JAVA: str = "java"
+    COMPILE_SERVER_JAVAC_OPTIONS: List[str] = ["-encoding", "UTF-8", "-nowarn", "-g"]
+    COMPILE_SERVER_TIMEOUT_SECONDS: float = 120.0
+    # file managers (open jars of one classpath) kept warm; the least recently used is closed
+    COMPILE_SERVER_MAX_FILE_MANAGERS: int = 8
+
+    # External commands (refAgent.processes): Maven, PMD, DesigniteJava and RefactoringMiner run in
+    # their own process group, killed after the timeout of their kind (0 = no limit)
+    PROCESS_TIMEOUT_SECONDS: float = 3600.0
+    PROCESS_TIMEOUTS: Dict[str, float] = {
+        'compile': 900.0, 'test': 1800.0, 'build': 3600.0, 'coverage': 1800.0,
+        'pmd': 900.0, 'designite': 1800.0, 'refactoringminer': 1800.0,
+    }
+    PROCESS_KILL_GRACE_SECONDS: float = 10.0
+    # Full output goes to rotating PROCESS_LOG_DIR/<kind>.log files ('' = no logs); callers only
+    # keep the last PROCESS_TAIL_LINES lines of each stream plus up to PROCESS_ERROR_LINES error lines
+    PROCESS_LOG_DIR: str = "logs/processes"
+    PROCESS_LOG_MAX_BYTES: int = 10_000_000
+    PROCESS_LOG_BACKUPS: int = 3
+    PROCESS_TAIL_LINES: int = 200
+    PROCESS_ERROR_LINES: int = 200
+
+    # Span tracing (refAgent.tracing): Chrome trace per project, timings per class
+    TRACE_ENABLED: bool = True
+
+    # Record/replay of LLM and build interactions: 'off', 'record' or 'replay'
+    CASSETTE_MODE: str = 'off'
+    CASSETTE_PATH: str = "data/cassettes/run.jsonl"
+
+    # Pooled provider clients shared by all agents (refAgent.clients)
+    LLM_POOL_MAX_CONNECTIONS: int = 20
+    LLM_POOL_MAX_KEEPALIVE: int = 10
+    LLM_POOL_KEEPALIVE_EXPIRY: float = 60.0
+    LLM_TIMEOUT_SECONDS: float = 120.0
+    LLM_CONNECT_TIMEOUT_SECONDS: float = 10.0
+    # SDK-level retries are off: refAgent.rate_limit retries with its own backoff
+    LLM_CLIENT_MAX_RETRIES: int = 0
+
+    # Max in-flight async requests per provider on one event loop (aquery_llm / asend)
+    LLM_MAX_CONCURRENCY: Dict[str, int] = {'groq': 16, 'openai': 32}
+    LLM_DEFAULT_MAX_CONCURRENCY: int = 8
+
+    # Rate limits per model (or provider) as [requests/min, tokens/min]; 0 disables a limit
+    LLM_RATE_LIMITS: Dict[str, List[int]] = {
+        'llama-3.1-8b-instant': [30, 6000],
+        'llama-3.1-70b-versatile': [30, 6000],
+        'mixtral-8x7b-32768': [30, 5000],
+        'gemma-7b-it': [30, 15000],
+    }
+    # Retries of rate-limited/transient failures with jittered exponential backoff
+    LLM_MAX_RETRIES: int = 5
+    LLM_BACKOFF_BASE_SECONDS: float = 1.0
+    LLM_BACKOFF_MAX_SECONDS: float = 60.0
+
+    # On-disk LLM response cache (refAgent.llm_cache), LRU-evicted beyond LLM_CACHE_MAX_MB
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_PATH: str = "data/cache/llm_responses.sqlite"
+    LLM_CACHE_MAX_MB: float = 512.0
+
+    # Bounded conversation memory (refAgent.memory): system prompt and original request
+    # are pinned, then the latest candidate onwards plus LLM_MEMORY_WINDOW earlier messages
+    LLM_MEMORY_ENABLED: bool = True
+    LLM_MEMORY_WINDOW: int = 2
+    # Hard cap on estimated prompt tokens per request (0 = no cap); never more than the model's
+    # window, and each request also leaves room for its reply
+    LLM_MEMORY_MAX_TOKENS: int = 24000
+    # Replace dropped turns with a short digest of their feedback
+    LLM_MEMORY_SUMMARIZE: bool = True
+
+    # Prompt budgeting (refAgent.prompt_budget): context length per model in tokens.
+    # The usable window is further capped by the model's tokens/min in LLM_RATE_LIMITS.
+    MODEL_CONTEXT_WINDOWS: Dict[str, int] = {
+        'llama-3.1-8b-instant': 131072,
+        'llama-3.1-70b-versatile': 131072,
+        'mixtral-8x7b-32768': 32768,
+        'gemma-7b-it': 8192,
+        'gpt-4': 8192,
+        'gpt-4o-mini': 128000,
+    }
+    DEFAULT_CONTEXT_WINDOW: int = 8192
+    # Generator reply size relative to the class it rewrites
+    PROMPT_OUTPUT_RATIO: float = 1.2
+    # Smallest reply worth requesting; less room than this rejects the prompt
+    PROMPT_MIN_OUTPUT_TOKENS: int = 256
+    # Tokens kept free for the plan and feedback when checking that a class fits a generator model
+    PROMPT_RESERVE_TOKENS: int = 1024
+
+    # Stream generator replies and abort them as soon as they cannot be a valid class
+    # (refAgent.stream_validators); aborted replies are re-requested up to this many times
+    LLM_STREAM_GENERATOR: bool = True
+    LLM_STREAM_MAX_RESTARTS: int = 2
+
     class Config:
         env_file = ".env"
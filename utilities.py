@@ -7,8 +7,14 @@ import subprocess
 # import numpy as np  # Temporarily disabled due to SSL certificate issues
 # from mlxtend.frequent_patterns import apriori, association_rules  # Temporarily disabled due to SSL certificate issues
 import shutil
+import time
 import os
 import git
+from refAgent.tracing import tracer, traced
+from refAgent.maven import MavenRunner
+from refAgent import surefire
+from refAgent.workspace import atomic_write
+
 
 def parse_java_code(file_path):
     try:
@@ -20,6 +26,7 @@ def parse_java_code(file_path):
             java_code = f.read()
     return java_code
 
+@traced("io.scan", "io")
 def get_all_java_files(repo_path):
     java_files = []
     for root, dirs, files in os.walk(repo_path):
@@ -33,38 +40,95 @@ def export_java_files_to_json(repo_path, output_file):
     with open(output_file, 'w') as json_file:
         json.dump(java_files, json_file, indent=4)
 
-def run_maven_test(class_name, method_name=None, project_dir='.', verify=False):
-    # Construct the Maven command
-    if verify:
-        command = f'mvn test'
-    elif method_name:
-        command = f'mvn -Dtest={class_name}#{method_name} test'        
-    else:
-        command = f'mvn -Dtest={class_name} test'
-    
-    # Execute the command in the project directory
-    process = subprocess.run(command, shell=True, cwd=project_dir, capture_output=True, text=True)
-    
-    # Print the output of the command
-    print("STDOUT:", process.stdout)
-    print("STDERR:", process.stderr)
-    
-    # Return the exit code
+def run_maven_test(class_name, method_name=None, project_dir='.', verify=False, changed_files=None):
+    """Run `mvn test` for one test class (or method, or every test with `verify`).
+
+    `changed_files` (e.g. the test's source file) scopes the build to their
+    reactor modules. Returns a `refAgent.maven.MavenResult` whose `collected`
+    holds the Surefire outcomes of the run.
+    """
+    properties = {}
+    if not verify:
+        properties["test"] = f"{class_name}#{method_name}" if method_name else class_name
+
+    since = time.time()
+
+    def collect(modules):
+        return surefire.collect_reports(project_dir, modules, since=since, classes=None if verify else [class_name])
+
+    with tracer.span("maven.test", "maven", test=class_name, method=method_name):
+        process = MavenRunner(project_dir).run("test", ["test"], changed_files=changed_files, properties=properties,
+                                               collect=collect)
+    process.collected = process.collected or []
+
+    # the full output is in PROCESS_LOG_DIR/test.log
+    print(f"Tests finished with return code {process.returncode} in {process.duration:.1f}s")
     return process
 
-def compile_project_with_maven(project_dir='.'):
-    command = 'mvn clean compile -DskipTests'    
-    process = subprocess.run(command, shell=True, cwd=project_dir, capture_output=True, text=True)
-    
-    print("STDOUT:", process.stdout)
-    print("STDERR:", process.stderr)
-    
-    if process.returncode == 0:
-        print("Compilation successful!")
+def run_maven_tests(class_names, project_dir='.', changed_files=None, fork_count=None, rerun_failing=0):
+    """Run several test classes in one `mvn test` and read their outcomes from the Surefire reports.
+
+    Args:
+        class_names: Test classes (simple or qualified names, `Class#method` allowed).
+        project_dir: Project root.
+        changed_files: Files (e.g. the tests' sources) whose modules the build is scoped to.
+        fork_count: Surefire `forkCount` (e.g. "1C") to run test classes in parallel JVMs.
+        rerun_failing: Surefire `rerunFailingTestsCount`; a test passing on a rerun is reported as flaky.
+
+    Returns:
+        A `refAgent.maven.MavenResult` whose `collected` is the list of per-test outcomes
+        (see `refAgent.surefire`).
+    """
+    properties = {"test": ",".join(class_names)}
+    if fork_count:
+        properties["forkCount"] = str(fork_count)
+        properties["reuseForks"] = "true"
+    if rerun_failing:
+        properties["surefire.rerunFailingTestsCount"] = str(rerun_failing)
+    since = time.time()
+
+    def collect(modules):
+        return surefire.collect_reports(project_dir, modules, since=since, classes=class_names)
+
+    with tracer.span("maven.test_batch", "maven", tests=len(class_names)):
+        process = MavenRunner(project_dir).run("test", ["test"], changed_files=changed_files, properties=properties,
+                                               collect=collect)
+    process.collected = process.collected or []
+
+    failed = surefire.failures(process.collected)
+    print(f"Ran {len(process.collected)} tests from {len(class_names)} classes in {process.duration:.1f}s: "
+          f"{len(failed)} failed (return code {process.returncode})")
+    return process
+
+@traced("maven.compile", "maven")
+def compile_project_with_maven(project_dir='.', changed_files=None):
+    """Compile the project, scoped to the modules of `changed_files` when given.
+
+    Returns:
+        (is_compiled: bool, errors: str) with the parsed compiler errors on failure.
+    """
+    runner = MavenRunner(project_dir)
+    # without 'clean' only modules with changed sources are recompiled
+    goals = ["clean", "compile"] if runner.config.MAVEN_CLEAN_COMPILE else ["compile"]
+    process = runner.run("compile", goals, changed_files=changed_files, properties={"skipTests": "true"})
+
+    if process.ok:
+        print(f"Compilation successful in {process.duration:.1f}s ({process.module or 'whole reactor'})")
+        return True, " "
+    else:
+        print(f"Compilation failed with return code {process.returncode} (full output in {os.path.join(runner.config.PROCESS_LOG_DIR, 'compile.log')})")
+        return False, process.error_text()
+
+@traced("maven.build", "maven")
+def build_project_with_maven(project_dir='.'):
+    process = MavenRunner(project_dir).run("build", ["clean", "install"], properties={"skipTests": "true"})
+
+    if process.ok:
+        print(f"Maven build succeeded in {project_dir} ({process.duration:.1f}s)")
         return True, " "
     else:
-        print("Compilation failed with return code:", process.returncode)
-        return False, process.stderr
+        print(f"Maven build failed in {project_dir} with return code:", process.returncode)
+        return False, process.error_text()
 
 def create_directory_if_not_exists(directory_path):
     try:
@@ -91,6 +155,7 @@ def read_json_file(file_path):
     except Exception as e:
         return f"An error occurred: {str(e)}"
 
+@traced("io.write", "io")
 def write_to_java_file(file_path, java_code):
     """
     Writes the provided string (Java code) to a .java file.
@@ -104,9 +169,8 @@ def write_to_java_file(file_path, java_code):
         if directory and not os.path.exists(directory):
             os.makedirs(directory)
 
-        # Write the Java code to the file with UTF-8 encoding
-        with open(file_path, 'w', encoding='utf-8') as file:
-            file.write(java_code)
+        # Replace the file atomically: working copies hardlink unchanged files to projects/before
+        atomic_write(file_path, java_code)
         print(f"Java code successfully written to {file_path}")
     except Exception as e:
         print(f"An error occurred while writing to the file: {str(e)}")
@@ -157,6 +221,7 @@ def extract_class_name(java_file_path):
 
     return class_name
 
+@traced("io.write_json", "io")
 def export_dict_to_json(data_dict, file_path):
     try:
         with open(file_path, 'w') as json_file: